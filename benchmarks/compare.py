@@ -0,0 +1,47 @@
+"""
+Compare two benchmark reports produced by benchmarks.endpoints.
+
+    python -m benchmarks.compare base.json head.json
+"""
+import json
+import sys
+
+
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def change(base: float, head: float) -> str:
+    if not base:
+        return "n/a"
+
+    return f"{(head - base) / base * 100:+.1f}%"
+
+
+def compare(base: dict, head: dict) -> list[str]:
+    lines = [f"{'flow':>14}  " + "  ".join(f"{metric:>22}" for metric in METRICS)]
+    for name, head_flow in head["flows"].items():
+        base_flow = base["flows"].get(name)
+        if base_flow is None:
+            continue
+        cells = [f"{base_flow[m]:>8} -> {head_flow[m]:<8} {change(base_flow[m], head_flow[m]):>7}" for m in METRICS]
+        lines.append(f"{name:>14}  " + "  ".join(cells))
+
+    if base.get("startup") and head.get("startup"):
+        for key in ("import_ms", "ready_ms", "process_ms"):
+            before, after = base["startup"][key]["median"], head["startup"][key]["median"]
+            lines.append(f"{'startup ' + key:>22}  {before:>8} -> {after:<8} {change(before, after):>7}")
+
+    return lines
+
+
+def main(argv=None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        sys.exit("usage: python -m benchmarks.compare BASE.json HEAD.json")
+
+    with open(argv[0]) as base_file, open(argv[1]) as head_file:
+        print("\n".join(compare(json.load(base_file), json.load(head_file))))
+
+
+if __name__ == "__main__":
+    main()
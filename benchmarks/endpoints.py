@@ -0,0 +1,268 @@
+"""
+Endpoint benchmark suite.
+
+Boots the FastAPI app from main.py in process against a seeded local database
+and an offline storage stand-in, drives the main flows with concurrency and
+writes p50/p95/p99 latency and requests per second to a JSON file.
+
+    python -m benchmarks.endpoints --requests 200 --concurrency 10 --output bench_output.json
+    python -m benchmarks.compare base.json head.json
+
+Cold start is measured in fresh interpreters: time to import main and build the
+app, and time until the lifespan startup has finished.
+
+SQLALCHEMY_DATABASE_URL may point to a disposable Postgres database, otherwise a
+temporary SQLite file is used. The database is dropped and seeded on every run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the main API flows.")
+    parser.add_argument("--requests", type=int, default=200, help="requests per flow")
+    # async routes check out connections on the event loop thread, so more requests in flight
+    # than the pool holds (5 + 10 overflow by default) stall until the pool timeout
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight per flow")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--images", type=int, default=2000)
+    parser.add_argument("--comments", type=int, default=10000)
+    parser.add_argument("--tags", type=int, default=100)
+    parser.add_argument("--flows", nargs="*", default=None, help="subset of flows to run")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--startup-runs", type=int, default=5, help="fresh interpreters to time startup in, 0 to skip")
+
+    return parser.parse_args(argv)
+
+
+def configure_environment() -> None:
+    # must run before the application modules are imported, settings are read at import time
+    if "SQLALCHEMY_DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.sqlite3")
+        os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    # every simulated client shares one address, the limiter would turn most requests into 429
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+
+def seed(engine, args) -> None:
+    from src.dependencies.db import Base
+    from src.models.user import User, Role
+    from src.models.image import Image, Tag, image_m2m_tag
+    from src.models.comment import Comment
+    from src.services.hash_handler import hash_password
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    rnd = random.Random(args.seed)
+    start = datetime(2024, 1, 1)
+    password = hash_password("password")
+
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "username": f"bench{i}", "email": f"bench{i}@example.com", "password": password,
+             "role": Role.admin if i == 1 else Role.user, "confirmed": True, "ban": False,
+             "created_at": start, "updated_at": start}
+            for i in range(1, args.users + 1)
+        ])
+        conn.execute(Tag.__table__.insert(), [
+            {"id": i, "name": f"tag{i}", "created_at": start} for i in range(1, args.tags + 1)
+        ])
+        conn.execute(Image.__table__.insert(), [
+            {"id": i, "user_id": rnd.randint(1, args.users), "url": f"https://media.invalid/{i}.png",
+             "identifier": f"bench{i:08d}", "description": f"benchmark image {i}",
+             "created_at": start + timedelta(minutes=i), "updated_at": start + timedelta(minutes=i)}
+            for i in range(1, args.images + 1)
+        ])
+        conn.execute(image_m2m_tag.insert(), [
+            {"image_id": i, "tag_id": tag_id}
+            for i in range(1, args.images + 1)
+            for tag_id in rnd.sample(range(1, args.tags + 1), k=min(3, args.tags))
+        ])
+        conn.execute(Comment.__table__.insert(), [
+            {"body": f"comment {i}", "image_id": rnd.randint(1, args.images), "user_id": rnd.randint(1, args.users),
+             "created_at": start + timedelta(seconds=i), "updated_at": start + timedelta(seconds=i)}
+            for i in range(1, args.comments + 1)
+        ])
+
+
+STARTUP_PROBE = """
+import asyncio, json, os, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(boot())
+print(json.dumps({"import_ms": (imported - start) * 1000, "ready_ms": (ready - start) * 1000}), flush=True)
+# background probes may still be waiting on the network, they are not part of startup
+os._exit(0)
+"""
+
+
+def measure_startup(runs: int) -> dict:
+    """
+    The measure_startup function times application startup in fresh interpreters,
+    which is what an autoscaled instance or a test run pays.
+
+    :param runs: int: Number of interpreters to start
+    :return: Median and best timings in milliseconds
+    """
+    samples = {"process_ms": [], "import_ms": [], "ready_ms": []}
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", STARTUP_PROBE], capture_output=True,
+                                text=True, check=True).stdout
+        samples["process_ms"].append((time.perf_counter() - start) * 1000)
+        for key, value in json.loads(output.strip().splitlines()[-1]).items():
+            samples[key].append(value)
+
+    return {
+        key: {"median": round(statistics.median(values), 3), "min": round(min(values), 3)}
+        for key, values in samples.items()
+    }
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+
+    return ordered[index]
+
+
+async def run_flow(name: str, request, total: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await request(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / wall, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from benchmarks.fakes import install_fake_storage, tiny_png
+
+    from main import app
+    from src.dependencies.db import engine
+    from src.services.container import get_services
+
+    install_fake_storage(get_services().storage)
+    seed(engine, args)
+
+    rnd = random.Random(args.seed)
+    png = tiny_png()
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tokens = []
+        for i in range(1, min(args.users, args.concurrency) + 1):
+            response = await client.post("/auth/signin", data={"username": f"bench{i}", "password": "password"})
+            response.raise_for_status()
+            tokens.append({"Authorization": f"Bearer {response.json()['access_token']}"})
+
+        def auth(i: int) -> dict:
+            return tokens[i % len(tokens)]
+
+        def image_id() -> int:
+            return rnd.randint(1, args.images)
+
+        flows = {
+            "signin": lambda i: client.post("/auth/signin",
+                                            data={"username": f"bench{i % args.users + 1}", "password": "password"}),
+            "list_images": lambda i: client.get("/images/", params={"limit": 20, "order_by": "created_at desc"},
+                                                headers=auth(i)),
+            "search_images": lambda i: client.get("/images/", params={"keyword": f"tag{i % args.tags + 1}", "limit": 20},
+                                                  headers=auth(i)),
+            "get_image": lambda i: client.get(f"/images/{image_id()}", headers=auth(i)),
+            "create_image": lambda i: client.post("/images/", headers=auth(i),
+                                                  files={"file": ("bench.png", png, "image/png")},
+                                                  data={"description": f"uploaded {i}", "tags": "bench,upload"}),
+            "comment": lambda i: client.post(f"/images/{image_id()}/comments/", headers=auth(i),
+                                             json=f"benchmark comment {i}"),
+            "share_qr": lambda i: client.get(f"/images/{image_id()}/share", headers=auth(i)),
+        }
+
+        selected = args.flows or list(flows)
+        results = {}
+        for name in selected:
+            results[name] = await run_flow(name, flows[name], args.requests, args.concurrency)
+            print(f"{name:>14}: {results[name]['rps']:>9} rps  p50 {results[name]['p50_ms']:>8} ms  "
+                  f"p95 {results[name]['p95_ms']:>8} ms  p99 {results[name]['p99_ms']:>8} ms  "
+                  f"errors {results[name]['errors']}")
+
+    startup = measure_startup(args.startup_runs) if args.startup_runs else None
+    if startup:
+        print(f"{'startup':>14}: import {startup['import_ms']['median']} ms  "
+              f"ready {startup['ready_ms']['median']} ms  process {startup['process_ms']['median']} ms")
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "dataset": {"users": args.users, "images": args.images, "comments": args.comments, "tags": args.tags},
+        },
+        "startup": startup,
+        "flows": results,
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    configure_environment()
+    report = asyncio.run(run(args))
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import struct
+import zlib
+from types import SimpleNamespace
+
+from src.services.media_storage import MediaCloud
+
+
+def tiny_png(width: int=16, height: int=16) -> bytes:
+    """
+    The tiny_png function builds a valid gradient PNG without any imaging library.
+
+    :param width: int: Image width in pixels
+    :param height: int: Image height in pixels
+    :return: PNG file contents
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    # every scanline starts with filter type 0 followed by RGB triples
+    rows = b"".join(b"\x00" + bytes(c for x in range(width) for c in (x * 16 % 256, y * 16 % 256, 128))
+                    for y in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+class FakeStorage(MediaCloud):
+    """
+    Offline stand-in for MediaCloud: uploads are not sent anywhere and return
+    deterministic urls, removals succeed immediately.
+    """
+    BASE_URL = "https://media.invalid"
+
+    def _uploaded(self, public_id: str):
+        return SimpleNamespace(url=f"{self.BASE_URL}/{public_id}.png", public_id=public_id, metadata={})
+
+    async def avatar_upload(self, file, identifier):
+        return self._uploaded(f'{self.folder}/avatar/{identifier}')
+
+    async def user_image_upload(self, file, public_id: str, transformations: dict=None):
+        return self._uploaded(public_id)
+
+    async def image_transform(self, url: str, transformations: dict, new_public_id: str=None):
+        return self._uploaded(new_public_id)
+
+    async def remove_media(self, public_id: str):
+        return {"result": "ok"}
+
+    async def remove_media_many(self, public_ids: list[str]) -> list[dict]:
+        return [{"deleted": {public_id: "deleted" for public_id in public_ids}}]
+
+    async def remove_media_by_prefix(self, prefix: str) -> dict:
+        return {"deleted": {}}
+
+    async def ping(self) -> dict:
+        return {"status": "ok"}
+
+
+def install_fake_storage(storage: MediaCloud) -> None:
+    """
+    The install_fake_storage function replaces the network calls of the shared
+    storage instance, so every module holding a reference to it uses the fake.
+
+    :param storage: MediaCloud: The application storage instance
+    :return: Nothing
+    """
+    fake = FakeStorage()
+    for name in ("avatar_upload", "user_image_upload", "image_transform",
+                 "remove_media", "remove_media_many", "remove_media_by_prefix", "ping"):
+        setattr(storage, name, getattr(fake, name))
@@ -0,0 +1,148 @@
+"""
+Serialization microbenchmark for the list endpoints.
+
+Compares, on an in-memory SQLite database, what a list endpoint costs per
+request with entities validated by the response model and encoded by FastAPI,
+against column-projected rows encoded by FastJSONResponse.
+
+    python -m benchmarks.serialization --items 100 --repeat 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare list endpoint serialization paths.")
+    parser.add_argument("--items", type=int, default=100, help="rows per page")
+    parser.add_argument("--tags", type=int, default=3, help="tags per image")
+    parser.add_argument("--comments", type=int, default=5, help="comments per image")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+
+    return parser.parse_args(argv)
+
+
+def seed(session, args) -> None:
+    from src.models.user import User, Role
+    from src.models.image import Image, Tag
+    from src.models.comment import Comment
+
+    start = datetime(2024, 1, 1)
+    users = [User(username=f"user{i}", email=f"user{i}@example.com", password="password", role=Role.user)
+             for i in range(args.items)]
+    tags = [Tag(name=f"tag{i}") for i in range(args.tags * 4)]
+    session.add_all(users + tags)
+    for i in range(args.items):
+        stamp = start + timedelta(minutes=i)
+        image = Image(user=users[i % len(users)], url=f"https://media.invalid/{i}.png", identifier=f"image{i:06d}",
+                      description=f"image {i}", tags=[tags[(i + k) % len(tags)] for k in range(args.tags)],
+                      created_at=stamp, updated_at=stamp)
+        session.add(image)
+        session.add_all([Comment(body=f"comment {k}", image=image, user=users[k % len(users)],
+                                 created_at=stamp + timedelta(seconds=k), updated_at=stamp)
+                         for k in range(args.comments)])
+    # a full page of comments for the comment listing
+    session.add_all([Comment(body=f"reply {k}", image_id=1, user=users[k % len(users)],
+                             created_at=start + timedelta(hours=1, seconds=k), updated_at=start)
+                     for k in range(args.items)])
+    session.commit()
+
+
+def model_path(response_model, rows) -> bytes:
+    # what FastAPI does with a returned value: validate against the response model,
+    # dump it to JSON compatible data and encode it with JSONResponse
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+
+    adapter = TypeAdapter(list[response_model])
+    return JSONResponse(adapter.dump_python(adapter.validate_python(rows), mode="json")).body
+
+
+def fast_path(payload) -> bytes:
+    from src.services.serialization import FastJSONResponse
+
+    return FastJSONResponse(payload).body
+
+
+def timed(func, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+
+    return {"median_ms": round(statistics.median(samples) * 1000, 3), "min_ms": round(min(samples) * 1000, 3)}
+
+
+def run(args) -> dict:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from src.dependencies.db import Base
+    from src.repository.images import Images
+    from src.repository.comments import CommentsRepo
+    from src.repository.users import UserRepository
+    from src.schemas.image import ImageResponseModel
+    from src.schemas.comment_example import Comment
+    from src.schemas.user import UserResponse
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    seed(session, args)
+
+    def fresh(call):
+        # every request starts with an empty identity map
+        session.expunge_all()
+        return asyncio.run(call)
+
+    async def images_page(repo, limit):
+        return await repo.load_comments(await repo.get_many(0, limit, None, None, projection=True))
+
+    cases = {
+        "images": (
+            lambda: model_path(ImageResponseModel, fresh(Images(None, session).get_many(0, args.items, None, None))),
+            lambda: fast_path(fresh(images_page(Images(None, session), args.items))),
+        ),
+        "comments": (
+            lambda: model_path(Comment, fresh(CommentsRepo(None, session).get_many(1, args.items))[0]),
+            lambda: fast_path(fresh(CommentsRepo(None, session).get_many(1, args.items, projection=True))[0]),
+        ),
+        "users": (
+            lambda: model_path(UserResponse, fresh(UserRepository(session).get_many("user", limit=args.items))[0]),
+            lambda: fast_path(fresh(UserRepository(session).get_many("user", limit=args.items, projection=True))[0]),
+        ),
+    }
+
+    results = {}
+    for name, (model, fast) in cases.items():
+        if json.loads(model()) != json.loads(fast()):
+            sys.exit(f"{name}: the fast path payload differs from the response model payload")
+        results[name] = {"model": timed(model, args.repeat), "fast": timed(fast, args.repeat)}
+        speedup = results[name]["model"]["median_ms"] / results[name]["fast"]["median_ms"]
+        print(f"{name:>9}: model {results[name]['model']['median_ms']:>8} ms  "
+              f"fast {results[name]['fast']['median_ms']:>8} ms  x{speedup:.2f}")
+
+    return results
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite://")
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    results = run(args)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
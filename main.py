@@ -1,43 +1,100 @@
-import uvicorn
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from fastapi import FastAPI, HTTPException
 
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from src.conf.config import Settings, get_settings, use_settings
+from src.dependencies.db import get_engine
+from src.routes import images, users, comment, auth, metrics, health, tags
+from src.services.container import build_services, get_services, use_services
+from src.services.metrics import MetricsMiddleware
+from src.services.query_inspector import QueryInspector, QueryInspectorMiddleware
 
-from src.dependencies.db import get_db
-from src.routes import images, users, comment, auth
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.services.start()
+    yield
+    await app.state.services.stop()
 
-app = FastAPI()
 
-app.include_router(users.router)
-app.include_router(images.router)
-app.include_router(comment.router)
-app.include_router(auth.router)
-
-
-
-@app.post("/halthchecker")
-async def halthchecker(db: Session=Depends(get_db)):
+async def halthchecker():
     """
     The halthchecker function is used to check if the database connection is working.
-    It will return a message with the status code 200 if everything works fine, otherwise it 
-    will return an HTTPException 500.
-    
-    :param db: Session: Inject the database session into the function
+    It answers from the result of the last background check, so probes do not
+    open connections. It will return a message with the status code 200 if everything
+    works fine, otherwise it will return an HTTPException 500 with the cause.
+
     :return: A dict with a message
     :doc-author: Trelent
     """
-    try:
-        result = db.execute(text('SELECT 1')).fetchone()
-
-        if result is None:
-            raise HTTPException(status_code=500, detail="Database is not configured correctly")
-        
-    except Exception as err:
-        raise HTTPException(status_code=500, detail="Error connecting to the database")
-    
+    monitor = get_services().monitor
+    if not monitor.db.ok:
+        raise HTTPException(status_code=500, detail=f"Error connecting to the database: {monitor.db.error}")
+
     return {"message": "Wellcome to ImageShare"}
 
+
+def create_app(settings: Settings=None) -> FastAPI:
+    """
+    The create_app function builds the application. The settings are installed as the
+    process settings and the storage client and the background services are built from
+    them, the database engine is created on first use and the workers are started in
+    the lifespan, so building the app is cheap.
+
+        uvicorn main:create_app --factory
+
+    :param settings: Settings: Application settings, read from the environment when omitted
+    :return: The application
+    """
+    settings = settings or get_settings()
+    use_settings(settings)
+    services = build_services(settings)
+    use_services(services)
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+    app.state.services = services
+
+    app.add_middleware(MetricsMiddleware)
+
+    if settings.query_inspector.enabled:
+        inspector = QueryInspector(slow_ms=settings.query_inspector.slow_ms,
+                                   repeat_threshold=settings.query_inspector.repeat_threshold)
+        inspector.install(get_engine())
+        app.add_middleware(QueryInspectorMiddleware, inspector=inspector)
+
+    app.include_router(users.router)
+    app.include_router(images.router)
+    app.include_router(comment.router)
+    app.include_router(auth.router)
+    app.include_router(metrics.router)
+    app.include_router(health.router)
+    app.include_router(tags.router)
+
+    app.post("/halthchecker")(halthchecker)
+
+    return app
+
+
+@lru_cache
+def get_app() -> FastAPI:
+    """
+    The get_app function builds the application from the environment on first use,
+    so importing this module neither touches the environment nor fails without it.
+
+    :return: The application
+    """
+    return create_app()
+
+
+def __getattr__(name: str):
+    # keeps `uvicorn main:app` and `from main import app` working
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000)
\ No newline at end of file
+    import uvicorn
+
+    uvicorn.run("main:app", host="0.0.0.0", port=8000)
@@ -0,0 +1,31 @@
+"""tags name prefix index
+
+Revision ID: 5d7e1f3a9b64
+Revises: 9c2e4b7f1a08
+Create Date: 2026-10-19 16:02:41.218730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7e1f3a9b64'
+down_revision: Union[str, None] = '9c2e4b7f1a08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # text_pattern_ops lets LIKE 'prefix%' use the index under any collation
+    with op.get_context().autocommit_block():
+        op.create_index('ix_tags_name_lower_pattern', 'tags', [sa.text('lower(name) text_pattern_ops')], 
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_tags_name_lower_pattern', table_name='tags', 
+                      postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,43 @@
+"""users search indexes
+
+Revision ID: 7a4c2e9d1b35
+Revises: 5d7e1f3a9b64
+Create Date: 2026-10-19 17:48:12.604318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4c2e9d1b35'
+down_revision: Union[str, None] = '5d7e1f3a9b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = (
+    # exact and prefix matches, text_pattern_ops lets LIKE 'prefix%' use them under any collation
+    ('ix_users_username_lower_pattern', 'lower(username) text_pattern_ops', None),
+    ('ix_users_email_lower_pattern', 'lower(email) text_pattern_ops', None),
+    # substring matches
+    ('ix_users_username_lower_trgm', 'lower(username) gin_trgm_ops', 'gin'),
+    ('ix_users_email_lower_trgm', 'lower(email) gin_trgm_ops', 'gin'),
+)
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        for name, expression, using in INDEXES:
+            op.create_index(name, 'users', [sa.text(expression)], unique=False, postgresql_using=using,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    # the pg_trgm extension is kept, other objects may depend on it
+    with op.get_context().autocommit_block():
+        for name, _, _ in INDEXES:
+            op.drop_index(name, table_name='users', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,41 @@
+"""foreign key and sort indexes
+
+Revision ID: 9c2e4b7f1a08
+Revises: 3f8a6d1c5e27
+Create Date: 2026-10-19 11:48:07.635214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2e4b7f1a08'
+down_revision: Union[str, None] = '3f8a6d1c5e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_comments_user_id', 'comments', ['user_id']),
+    ('ix_images_user_id', 'images', ['user_id']),
+    ('ix_images_created_at', 'images', ['created_at']),
+    ('ix_image_m2m_tag_tag_id', 'image_m2m_tag', ['tag_id']),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY does not lock writes but cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, 
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, 
+                          postgresql_concurrently=True, if_exists=True)
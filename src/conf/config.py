@@ -1,6 +1,10 @@
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from dotenv import load_dotenv, find_dotenv
-load_dotenv(find_dotenv())
+
+
+# .env is read by pydantic-settings itself, values from the environment take precedence
+ENV_FILE = '.env'
 
 
 class MailSettings(BaseSettings):
@@ -12,7 +16,7 @@ class MailSettings(BaseSettings):
 
     # in .env file all constants for mailing wil be 
     # like MAIL_USERNAME, MAIL_PASSWORD and so on
-    model_config = SettingsConfigDict(env_prefix='mail_')
+    model_config = SettingsConfigDict(env_prefix='mail_', env_file=ENV_FILE, extra='ignore')
 
 
 class CloudinarySettings(BaseSettings):
@@ -23,13 +27,200 @@ class CloudinarySettings(BaseSettings):
 
     # in .env file all constants for Cloudinary wil be 
     # like CLOUDINARY_CLOUD_NAME CLOUDINARY_API_KEY and so on
-    model_config = SettingsConfigDict(env_prefix='cloudinary_')
+    model_config = SettingsConfigDict(env_prefix='cloudinary_', env_file=ENV_FILE, extra='ignore')
+
+
+class OutboxSettings(BaseSettings):
+    poll_interval: float=2.0
+    batch_size: int=100
+    max_attempts: int=8
+    backoff_base: float=5.0
+    backoff_max: float=3600.0
+    # seconds an upload may take before its reservation is treated as a leaked asset
+    upload_grace: int=900
+
+    # in .env file all constants for storage outbox wil be 
+    # like OUTBOX_POLL_INTERVAL, OUTBOX_BATCH_SIZE and so on
+    model_config = SettingsConfigDict(env_prefix='outbox_', env_file=ENV_FILE, extra='ignore')
+
+
+class PaginationSettings(BaseSettings):
+    comments_default: int=50
+    comments_max: int=100
+    users_default: int=50
+    users_max: int=100
+
+    # in .env file all constants for pagination wil be 
+    # like PAGINATION_COMMENTS_DEFAULT, PAGINATION_COMMENTS_MAX and so on
+    model_config = SettingsConfigDict(env_prefix='pagination_', env_file=ENV_FILE, extra='ignore')
+
+
+class QueryInspectorSettings(BaseSettings):
+    enabled: bool=False
+    slow_ms: float=100
+    repeat_threshold: int=5
+
+    # in .env file all constants for the query inspector wil be 
+    # like QUERY_INSPECTOR_ENABLED, QUERY_INSPECTOR_SLOW_MS and so on
+    model_config = SettingsConfigDict(env_prefix='query_inspector_', env_file=ENV_FILE, extra='ignore')
+
+
+class HealthSettings(BaseSettings):
+    interval: float=5.0
+    timeout: float=2.0
+    # share of the connection pool in use at which the worker reports not ready
+    pool_saturation: float=0.9
+    # whether a storage outage takes the worker out of rotation, storage is probed when it does
+    storage_required: bool=False
+    # probe storage although it is not required, the probe uses the Cloudinary Admin API quota
+    storage_probe: bool=False
+    # seconds between storage probes of a worker
+    storage_interval: float=600.0
+
+    # in .env file all constants for health checks wil be 
+    # like HEALTH_INTERVAL, HEALTH_TIMEOUT and so on
+    model_config = SettingsConfigDict(env_prefix='health_', env_file=ENV_FILE, extra='ignore')
+
+
+class TagIndexSettings(BaseSettings):
+    enabled: bool=True
+    # seconds between reloads picking up tags of other workers and usage counts
+    refresh_interval: float=300.0
+    suggest_default: int=10
+    suggest_max: int=50
+
+    # in .env file all constants for the tag index wil be 
+    # like TAG_INDEX_ENABLED, TAG_INDEX_REFRESH_INTERVAL and so on
+    model_config = SettingsConfigDict(env_prefix='tag_index_', env_file=ENV_FILE, extra='ignore')
+
+
+class RateLimitSettings(BaseSettings):
+    enabled: bool=True
+    # memory keeps buckets per worker, redis shares them between workers
+    backend: str="memory"
+    redis_url: str="redis://localhost:6379/0"
+    key_prefix: str="rate_limit"
+    # buckets kept by the memory backend, the least recently used are dropped first
+    max_keys: int=100000
+    # take the client address from X-Forwarded-For, only behind a trusted proxy
+    trust_forwarded: bool=False
+    # per route buckets as "capacity/seconds": a burst of capacity requests,
+    # refilled at capacity tokens per seconds
+    signin: str="10/60"
+    upload: str="30/60"
+    transform: str="20/60"
+    share: str="30/60"
+    shared: str="120/60"
+
+    # in .env file all constants for rate limiting wil be 
+    # like RATE_LIMIT_BACKEND, RATE_LIMIT_SIGNIN and so on
+    model_config = SettingsConfigDict(env_prefix='rate_limit_', env_file=ENV_FILE, extra='ignore')
+
+
+class AuthSettings(BaseSettings):
+    access_token_expire_minutes: int=30
+    # memory keeps revocations per worker and still checks every token against the database,
+    # redis shares them between workers and lets tokens skip the database
+    revocation_backend: str="memory"
+    redis_url: str="redis://localhost:6379/0"
+    key_prefix: str="token_version"
+
+    # in .env file all constants for authentication wil be 
+    # like AUTH_ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_REVOCATION_BACKEND and so on
+    model_config = SettingsConfigDict(env_prefix='auth_', env_file=ENV_FILE, extra='ignore')
+
+
+class IngestSettings(BaseSettings):
+    # processes decoding uploads for their metadata
+    workers: int=2
+
+    # in .env file all constants for image ingest wil be 
+    # like INGEST_WORKERS
+    model_config = SettingsConfigDict(env_prefix='ingest_', env_file=ENV_FILE, extra='ignore')
+
+
+class DerivativeSettings(BaseSettings):
+    # widths generated for every upload, pictures are never enlarged
+    widths: list[int]=[160, 480, 1080]
+    # generate a WebP copy of each width besides the original format
+    webp: bool=True
+
+    # in .env file all constants for image derivatives wil be 
+    # like DERIVATIVES_WIDTHS=[160,480,1080], DERIVATIVES_WEBP and so on
+    model_config = SettingsConfigDict(env_prefix='derivatives_', env_file=ENV_FILE, extra='ignore')
+
+
+class DuplicatesSettings(BaseSettings):
+    enabled: bool=True
+    # seconds between reloads picking up images of other workers
+    refresh_interval: float=600.0
+    # Hamming distances between 64 bit dHashes, re-encoded or resized copies
+    # of a picture usually stay within a few bits
+    distance_default: int=6
+    distance_max: int=16
+    # refuse uploads within reject_distance of an existing image
+    reject_on_upload: bool=False
+    reject_distance: int=4
+
+    # in .env file all constants for near duplicate detection wil be 
+    # like DUPLICATES_ENABLED, DUPLICATES_REJECT_ON_UPLOAD and so on
+    model_config = SettingsConfigDict(env_prefix='duplicates_', env_file=ENV_FILE, extra='ignore')
+
+
+class PurgeSettings(BaseSettings):
+    enabled: bool=True
+    poll_interval: float=10.0
+    # rows deleted per transaction
+    batch_size: int=200
+
+    # in .env file all constants for the account purge wil be 
+    # like PURGE_ENABLED, PURGE_POLL_INTERVAL and so on
+    model_config = SettingsConfigDict(env_prefix='purge_', env_file=ENV_FILE, extra='ignore')
+
+
+class CacheSettings(BaseSettings):
+    enabled: bool=True
+    # memory keeps entries per worker, redis shares them between workers
+    backend: str="memory"
+    redis_url: str="redis://localhost:6379/0"
+    key_prefix: str="cache"
+    # entries kept by the memory backend, the least recently used are dropped first
+    max_keys: int=10000
+    # seconds an entry is served, bounds staleness when an invalidation is lost
+    ttl: float=60.0
+    # seconds an entry of the memory backend is served: invalidations only reach the worker
+    # making the change, the other workers serve deleted or unshared rows until it expires
+    memory_ttl: float=5.0
+
+    # in .env file all constants for the read cache wil be 
+    # like CACHE_BACKEND, CACHE_TTL and so on
+    model_config = SettingsConfigDict(env_prefix='cache_', env_file=ENV_FILE, extra='ignore')
+
+
+class CommentStreamSettings(BaseSettings):
+    # listen for the comment events of the other workers, PostgreSQL only
+    enabled: bool=True
+    channel: str="comment_events"
+    # seconds between keepalive comments on an idle stream
+    keepalive: float=15.0
+    # events buffered per client, a client falling further behind is disconnected and resumes
+    queue_size: int=100
+    # seconds events are kept for clients resuming with Last-Event-ID
+    retention: float=86400.0
+    prune_interval: float=3600.0
+    reconnect_delay: float=5.0
+
+    # in .env file all constants for the comment stream wil be 
+    # like COMMENT_STREAM_KEEPALIVE, COMMENT_STREAM_RETENTION and so on
+    model_config = SettingsConfigDict(env_prefix='comment_stream_', env_file=ENV_FILE, extra='ignore')
 
 
 class Settings(BaseSettings):
     sqlalchemy_database_url: str
     secret_key: str
     algorithm: str
+
+    model_config = SettingsConfigDict(env_file=ENV_FILE, extra='ignore')
     
     # to access mail settings user setting.mail
     mail: MailSettings
@@ -37,5 +228,120 @@ class Settings(BaseSettings):
     # to access Cloudinary settings user settings.cloudinary
     cloudinary: CloudinarySettings
 
+    # to access storage outbox settings user settings.outbox
+    outbox: OutboxSettings
+
+    # to access page size limits user settings.pagination
+    pagination: PaginationSettings
+
+    # to access development query inspector settings user settings.query_inspector
+    query_inspector: QueryInspectorSettings
+
+    # to access health check settings user settings.health
+    health: HealthSettings
+
+    # to access tag suggestion index settings user settings.tag_index
+    tag_index: TagIndexSettings
+
+    # to access rate limiting settings user settings.rate_limit
+    rate_limit: RateLimitSettings
+
+    # to access token settings user settings.auth
+    auth: AuthSettings
+
+    # to access image ingest settings user settings.ingest
+    ingest: IngestSettings
+
+    # to access responsive derivative settings user settings.derivatives
+    derivatives: DerivativeSettings
+
+    # to access near duplicate detection settings user settings.duplicates
+    duplicates: DuplicatesSettings
+
+    # to access account purge settings user settings.purge
+    purge: PurgeSettings
+
+    # to access read cache settings user settings.cache
+    cache: CacheSettings
+
+    # to access comment stream settings user settings.comment_stream
+    comment_stream: CommentStreamSettings
+
+
+_settings: Settings | None = None
+# factories of objects built from the settings, cleared when other settings are installed
+_settings_caches = []
+
+
+def settings_cache(factory):
+    """
+    The settings_cache decorator caches the object a factory builds from the settings,
+    like lru_cache, until use_settings installs other settings.
+
+    :param factory: The factory reading get_settings
+    :return: The cached factory
+    """
+    cached = lru_cache(factory)
+    _settings_caches.append(cached)
+    return cached
+
+
+def get_settings() -> Settings:
+    """
+    The get_settings function returns the settings installed by use_settings, or reads
+    them on first use and caches them, so importing this module neither touches the
+    environment nor fails without it.
+
+    :return: The application settings
+    """
+    global _settings
+    if _settings is None:
+        _settings = read_settings()
+    return _settings
+
+
+def use_settings(settings: Settings) -> None:
+    """
+    The use_settings function installs the settings get_settings returns from now on.
+    create_app calls it, so the engine, the storage and the services built after it
+    read the settings the application was created with. The engine and the backends
+    built from the previous settings are dropped.
+
+    :param settings: Settings: The application settings
+    :return: None
+    """
+    global _settings
+    if settings is not _settings:
+        for cached in _settings_caches:
+            cached.cache_clear()
+    _settings = settings
+
+
+def read_settings() -> Settings:
+    """
+    The read_settings function reads the settings from the environment and the .env file.
+
+    :return: The application settings
+    """
+    return Settings(mail=MailSettings(), 
+                    cloudinary=CloudinarySettings(), 
+                    outbox=OutboxSettings(), 
+                    pagination=PaginationSettings(),
+                    query_inspector=QueryInspectorSettings(),
+                    health=HealthSettings(),
+                    tag_index=TagIndexSettings(),
+                    rate_limit=RateLimitSettings(),
+                    auth=AuthSettings(),
+                    ingest=IngestSettings(),
+                    derivatives=DerivativeSettings(),
+                    duplicates=DuplicatesSettings(),
+                    purge=PurgeSettings(),
+                    cache=CacheSettings(),
+                    comment_stream=CommentStreamSettings())
+
 
-settings = Settings(mail=MailSettings(), cloudinary=CloudinarySettings())
\ No newline at end of file
+def __getattr__(name: str):
+    # keeps `from src.conf.config import settings` working
+    if name == 'settings':
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
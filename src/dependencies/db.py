@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import declarative_base
 from contextlib import contextmanager
@@ -8,29 +9,79 @@ from ..models.base import Base
 from ..models.user import User
 from ..models.image import Image
 from ..models.comment import Comment
+from ..models.outbox import StorageTask
+from ..models.version import CollectionVersion
 
 
-from ..conf.config import settings
+from ..conf.config import get_settings, settings_cache
+from ..services.metrics import instrument_engine
 
 
-SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+@settings_cache
+def get_engine() -> Engine:
+    """
+    The get_engine function creates the application engine on first use,
+    so importing the application does not load the database driver.
+
+    :return: The engine
+    """
+    url = get_settings().sqlalchemy_database_url
+    # connections are used from the event loop and from worker threads (health checks, tag index)
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args)
+    instrument_engine(engine)
+
+    return engine
+
+
+class LazySessionMaker(sessionmaker):
+    """
+    Session factory bound to the application engine when the first session is opened,
+    and bound again when settings installed later create another engine.
+    """
+
+    def __call__(self, **local_kw):
+        engine = get_engine()
+        if self.kw.get("bind") is not engine:
+            self.configure(bind=engine)
+
+        return super().__call__(**local_kw)
+
+
+SessionLocal = LazySessionMaker(autocommit=False, autoflush=False)
+
+
+def __getattr__(name: str):
+    # keeps `from src.dependencies.db import engine` working
+    if name == "engine":
+        return get_engine()
+    if name == "SQLALCHEMY_DATABASE_URL":
+        return get_settings().sqlalchemy_database_url
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Dependency
 @contextmanager
 def session():
-    session = SessionLocal()
+    """
+    The session context manager is the transaction of a request: repositories only flush,
+    the changes are committed once when the block succeeds. Any exception, HTTPException 
+    included, rolls the whole transaction back and is raised again.
+
+    :return: The session
+    """
+    db = SessionLocal()
     try:
-        yield session
-    except Exception as err:
-        print(err)
-        session.rollback()
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
-        session.close()
+        db.close()
 
-def get_db():
+async def get_db():
+    # an async dependency exits on the event loop: the commit runs in line with the 
+    # request statements instead of racing the other requests from the threadpool
     with session() as db:
         yield db
-
@@ -0,0 +1,58 @@
+import math
+from functools import lru_cache
+
+from fastapi import Depends, HTTPException, Request, status
+
+from ..conf.config import get_settings
+from ..models.user import User
+from ..services.auth import get_current_user
+from ..services.rate_limit import Bucket, get_buckets
+
+
+@lru_cache
+def _bucket(value: str) -> Bucket:
+    return Bucket.parse(value)
+
+
+def client_address(request: Request) -> str:
+    if get_settings().rate_limit.trust_forwarded:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimit:
+    """
+    Limits a route per client address with the token bucket named like the route
+    in settings.rate_limit, answers 429 with Retry-After when the bucket is empty.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+    async def check(self, client: str) -> None:
+        config = get_settings().rate_limit
+        if not config.enabled:
+            return
+
+        wait = await get_buckets().take(f"{self.name}:{client}", _bucket(getattr(config, self.name)))
+        if wait > 0:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail="Too many requests",
+                                headers={"Retry-After": str(math.ceil(wait))})
+
+
+    async def __call__(self, request: Request) -> None:
+        await self.check(f"ip:{client_address(request)}")
+
+
+class UserRateLimit(RateLimit):
+    """
+    Limits a route per authenticated user, wherever the requests come from.
+    """
+
+    async def __call__(self, user: User=Depends(get_current_user)) -> None:
+        await self.check(f"user:{user.id}")
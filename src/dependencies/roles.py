@@ -1,8 +1,7 @@
 from fastapi import Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
 
 from ..repository.base_repository import AbstractRepository
-from ..dependencies.db import get_db
+from ..dependencies.uow import UnitOfWork, get_uow
 from ..services.auth import get_current_user
 from ..models.user import User, Role
 
@@ -23,24 +22,19 @@ class OwnerRoleAccess:
         self.permited_roles = permited_roles
         
 
-    async def __call__(self, request: Request, 
-                       user: User = Depends(get_current_user), 
-                       db: Session=Depends(get_db)) -> User:
+    async def __call__(self, request: Request, uow: UnitOfWork=Depends(get_uow)) -> User:
         
-        permited = user.role in self.permited_roles
+        permited = uow.user.role in self.permited_roles
         if not permited:
             try:
-                pk = request.path_params.get(self.param_name)
-                record = await self.repo(user, db).get_single(pk)
-                permited = record is None or record.user_id == user.id
-            except Exception as err:
-                print(err)
+                pk = int(request.path_params[self.param_name])
+            except (KeyError, TypeError, ValueError):
+                pk = None
+            # an EXISTS query, the record itself is loaded once by the handler
+            permited = pk is not None and await uow.is_owner(self.repo.model, pk)
         
         if not permited:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, 
                                 detail='Current user not authorized for this action')
         
         return True
-
-        
-
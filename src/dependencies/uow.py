@@ -0,0 +1,39 @@
+from fastapi import Depends
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+
+from .db import get_db
+from ..models.user import User
+from ..services.auth import get_current_user
+
+
+class UnitOfWork:
+    """
+    Request scoped access to the database shared by the dependencies and the handler.
+    FastAPI resolves get_uow once per request, so everything that depends on it uses
+    the same session and transaction. Ownership is checked without loading the entity,
+    the handler loads it once through its repository.
+    """
+
+    def __init__(self, db: Session, user: User) -> None:
+        self.db = db
+        self.user = user
+
+
+    async def is_owner(self, model, pk: int) -> bool:
+        """
+        The is_owner method checks with a single EXISTS query, without loading the row,
+        that no other user owns the record. A missing record passes, the handler reports it.
+
+        :param self: Represent the instance of the class
+        :param model: Mapped class with a user_id column
+        :param pk: int: Primary key of the record
+        :return: True when the current user owns the record or it does not exist
+        """
+        foreign = exists().where(model.id == pk, model.user_id != self.user.id)
+
+        return not self.db.execute(select(foreign)).scalar()
+
+
+def get_uow(db: Session=Depends(get_db), user: User=Depends(get_current_user)) -> UnitOfWork:
+    return UnitOfWork(db, user)
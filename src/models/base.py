@@ -1,3 +1,49 @@
+from sqlalchemy import JSON
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.sql import functions
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+
+@compiles(functions.now, "sqlite")
+def sqlite_now(element, compiler, **kw):
+    # CURRENT_TIMESTAMP has no fractional part on SQLite, while bound DateTime values
+    # are stored as '%Y-%m-%d %H:%M:%S.%f', so values would not compare as strings
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+class json_array_agg(functions.FunctionElement):
+    """
+    Aggregates values into a JSON array: json_agg on PostgreSQL, json_group_array on SQLite.
+    """
+    type = JSON()
+    inherit_cache = True
+
+
+@compiles(json_array_agg)
+def default_json_array_agg(element, compiler, **kw):
+    return "json_agg(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(json_array_agg, "sqlite")
+def sqlite_json_array_agg(element, compiler, **kw):
+    return "json_group_array(%s)" % compiler.process(element.clauses, **kw)
+
+
+class json_object(functions.FunctionElement):
+    """
+    Builds a JSON object from key, value pairs: json_build_object on PostgreSQL, json_object on SQLite.
+    """
+    type = JSON()
+    inherit_cache = True
+
+
+@compiles(json_object)
+def default_json_object(element, compiler, **kw):
+    return "json_build_object(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(json_object, "sqlite")
+def sqlite_json_object(element, compiler, **kw):
+    return "json_object(%s)" % compiler.process(element.clauses, **kw)
@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, DateTime, func, ForeignKey, Text
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, DateTime, func, ForeignKey, Text, Index, String, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from .base import Base
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        # keyset pagination of an image's comments
+        Index("ix_comments_image_id_created_at_id", "image_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
 
@@ -13,8 +18,30 @@ class Comment(Base):
 
     body = Column(Text, nullable=False)
 
-    image_id = Column(Integer, ForeignKey('images.id'))  
+    # indexed by the leading column of ix_comments_image_id_created_at_id
+    image_id = Column(Integer, ForeignKey('images.id'))
     image = relationship("Image", back_populates="comments")
 
-    user_id = Column("user_id", ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    user = relationship("User", back_populates="comments")
\ No newline at end of file
+    user_id = Column("user_id", ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user = relationship("User", back_populates="comments")
+
+
+class CommentEvent(Base):
+    __tablename__ = "comment_events"
+    __table_args__ = (
+        # events of an image after the last one a client received
+        UniqueConstraint("image_id", "version"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    # compared with the clock of the application when events are pruned
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    # no foreign key, the events of a deleted image stay until they are pruned
+    image_id = Column(Integer, nullable=False)
+    # version of the comments of the image the change produced, the id of the event in the stream
+    version = Column(BigInteger, nullable=False)
+    # created, updated, deleted or reset
+    kind = Column(String(10), nullable=False)
+    # serialized JSON sent as the data of the event
+    payload = Column(Text, nullable=False)
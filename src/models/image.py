@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, func, ForeignKey, String, Table
+from sqlalchemy import BigInteger, Column, Integer, DateTime, func, ForeignKey, String, Table, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from .base import Base
@@ -8,7 +8,7 @@ image_m2m_tag = Table(
     "image_m2m_tag",
     Base.metadata,
     Column("image_id", Integer, ForeignKey("images.id", ondelete="CASCADE"), primary_key=True),
-    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True, index=True),
 )
 
 
@@ -17,20 +17,72 @@ class Image(Base):
 
     #required fields for each table
     id = Column(Integer, primary_key=True)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=func.now(), index=True)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
-    user_id = Column("user_id", ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column("user_id", ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     user = relationship("User", back_populates="images")
 
     url = Column(String(200))
     identifier = Column(String(40), unique=True)
     description = Column(String(250))
 
+    # filled at ingest, unknown for pictures that could not be decoded
+    width = Column(Integer)
+    height = Column(Integer)
+    format = Column(String(10))
+    byte_size = Column(Integer)
+    orientation = Column(String(10))
+    placeholder = Column(String(7))
+    # 64 bit difference hash, stored signed, near duplicates differ in a few bits
+    dhash = Column(BigInteger)
+
     tags = relationship("Tag", secondary=image_m2m_tag, back_populates="images")
 
     comments = relationship("Comment", back_populates="image")
-    
+
+    derivatives = relationship("ImageDerivative", back_populates="image", order_by="ImageDerivative.width",
+                               cascade="all, delete-orphan")
+
+    @property
+    def srcset(self) -> dict[str, str]:
+        return build_srcset((derivative.format, derivative.width, derivative.url) for derivative in self.derivatives)
+
+
+class ImageDerivative(Base):
+    """
+    Downscaled copy of an image generated by the storage at upload.
+    """
+    __tablename__ = "image_derivatives"
+    __table_args__ = (UniqueConstraint("image_id", "format", "width"),)
+
+    id = Column(Integer, primary_key=True)
+    image_id = Column(ForeignKey("images.id", ondelete="CASCADE"), nullable=False)
+    image = relationship("Image", back_populates="derivatives")
+
+    width = Column(Integer, nullable=False)
+    height = Column(Integer)
+    format = Column(String(10), nullable=False)
+    byte_size = Column(Integer)
+    url = Column(String(300), nullable=False)
+
+
+def build_srcset(derivatives) -> dict[str, str]:
+    """
+    The build_srcset function groups derivatives by format into values for the srcset attribute
+    of <img> and <source> elements, narrowest first.
+
+    :param derivatives: Iterable of (format, width, url)
+    :return: A dict like {"webp": "https://.../a.webp 160w, https://.../b.webp 480w"}
+    """
+    candidates = {}
+    for format, width, url in sorted(derivatives, key=lambda derivative: derivative[1]):
+        candidates.setdefault(format, {}).setdefault(width, url)
+
+    return {format: ", ".join(f"{url} {width}w" for width, url in widths.items())
+            for format, widths in candidates.items()}
+
+
 class Tag(Base):
     __tablename__ = "tags"
 
@@ -40,3 +92,8 @@ class Tag(Base):
     name = Column(String(25), nullable=False, unique=True)
 
     images = relationship("Image", secondary=image_m2m_tag, back_populates="tags")
+
+
+# serves case insensitive prefix search (lower(name) LIKE 'pre%') whatever the collation
+Index("ix_tags_name_lower_pattern", func.lower(Tag.name).label("name_lower"),
+      postgresql_ops={"name_lower": "text_pattern_ops"})
@@ -0,0 +1,26 @@
+import enum
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, func, String, Text, Boolean, Enum
+
+from .base import Base
+
+
+class StorageAction(enum.Enum):
+    remove = 'remove'
+    remove_prefix = 'remove_prefix'
+
+
+class StorageTask(Base):
+    __tablename__ = "storage_outbox"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=func.now())
+
+    action = Column(Enum(StorageAction), nullable=False)
+    # public id or public id prefix the action is applied to
+    target = Column(String(255), nullable=False)
+
+    attempts = Column(Integer, default=0, nullable=False)
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_error = Column(Text, nullable=True)
+    failed = Column(Boolean, default=False, nullable=False)
@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, DateTime, func, String, Boolean, Enum
+from sqlalchemy import Column, Integer, DateTime, func, String, Boolean, Enum, Index, DDL, event
 from sqlalchemy.orm import relationship
 
 from .base import Base
@@ -28,4 +28,23 @@ class User(Base):
     images = relationship("Image", back_populates="user")
     comments = relationship("Comment", back_populates="user")
     role = Column(Enum(Role), default=Role.user, nullable=True)
+    # bumped to revoke the access tokens issued so far, carried by tokens as the ver claim
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # set when the account is deleted, the rows are removed later by the account purge
+    deleted_at = Column(DateTime, nullable=True, index=True)
     
+
+
+# lower() expression indexes behind UserRepository.get_many: the text_pattern_ops ones 
+# serve exact and prefix matches, the trigram ones serve substring matches
+Index("ix_users_username_lower_pattern", func.lower(User.username).label("username_lower"),
+      postgresql_ops={"username_lower": "text_pattern_ops"})
+Index("ix_users_email_lower_pattern", func.lower(User.email).label("email_lower"),
+      postgresql_ops={"email_lower": "text_pattern_ops"})
+Index("ix_users_username_lower_trgm", func.lower(User.username).label("username_lower"),
+      postgresql_using="gin", postgresql_ops={"username_lower": "gin_trgm_ops"}).ddl_if(dialect="postgresql")
+Index("ix_users_email_lower_trgm", func.lower(User.email).label("email_lower"),
+      postgresql_using="gin", postgresql_ops={"email_lower": "gin_trgm_ops"}).ddl_if(dialect="postgresql")
+
+event.listen(User.__table__, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, BigInteger
+
+from .base import Base
+
+
+class CollectionVersion(Base):
+    __tablename__ = "collection_versions"
+
+    # images, images:user:<id> or comments:image:<id>, see repository.versions
+    key = Column(String(64), primary_key=True)
+    version = Column(BigInteger, default=0, nullable=False)
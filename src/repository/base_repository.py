@@ -1,13 +1,43 @@
+import asyncio
 from abc import ABC, abstractmethod
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
 
 class AbstractRepository(ABC):
+    """
+    Repositories stage their changes and flush them, the transaction is committed
+    once per request by get_db. Side effects outside the database that must not
+    happen for a rolled back transaction are registered with on_commit.
+    """
     model = None
 
     def __init__(self, db: Session) -> None:
         self.db = db
 
+    def on_commit(self, callback) -> None:
+        """
+        The on_commit method runs callback after the current transaction commits,
+        it is dropped if the transaction is rolled back. A coroutine function is
+        scheduled as a task on the event loop rather than awaited: get_db commits on the loop
+        when the request dependency exits, background workers commit from worker threads
+        with run_in_thread.
+
+        :param self: Represent the instance of the class
+        :param callback: Callable or coroutine function without arguments
+        :return: Nothing
+        """
+        loop = self.db.info.get("loop")
+        if asyncio.iscoroutinefunction(callback):
+            loop, coroutine_function = loop or asyncio.get_running_loop(), callback
+            callback = lambda: asyncio.run_coroutine_threadsafe(coroutine_function(), loop)
+        elif loop is not None:
+            # the in-process state belongs to the loop, not to the worker thread committing
+            function = callback
+            callback = lambda: loop.call_soon_threadsafe(function)
+
+        self.db.info.setdefault("on_commit", []).append(callback)
+
     @abstractmethod
     async def create(self, **kwargs):
         raise NotImplementedError
@@ -22,4 +52,30 @@ class AbstractRepository(ABC):
 
     @abstractmethod
     async def get_single(self, **kwargs):
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+
+async def run_in_thread(db: Session, coroutine):
+    """
+    The run_in_thread function runs repository work of a background worker in a worker thread,
+    the event loop keeps serving requests while its queries and commit block. Callbacks
+    registered with on_commit are handed back to the event loop.
+
+    :param db: Session: Session used by the work, from one thread at a time
+    :param coroutine: Coroutine of the work, it never waits on the event loop
+    :return: The result of the work
+    """
+    db.info["loop"] = asyncio.get_running_loop()
+
+    return await asyncio.to_thread(asyncio.run, coroutine)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_on_commit(db: Session) -> None:
+    for callback in db.info.pop("on_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_commit(db: Session) -> None:
+    db.info.pop("on_commit", None)
@@ -0,0 +1,54 @@
+from functools import partial
+from sqlalchemy import func, select
+
+from .base_repository import AbstractRepository
+from ..conf.config import get_settings
+from ..models.comment import CommentEvent
+from ..services.container import get_services
+
+
+class CommentEvents(AbstractRepository):
+    """
+    Log of the changes to the comments of each image, read by the comment stream.
+    An event is written in the transaction of the change, with the version of the comments
+    of the image that change produced, and the streams are notified when it commits.
+    """
+    model = CommentEvent
+
+    async def create(self, image_id: int, version: int, kind: str, payload: str) -> CommentEvent:
+        """
+        The create method stages an event and the notification of the streams of the image.
+        On PostgreSQL the notification is a NOTIFY of the transaction, delivered to every worker
+        on commit. Elsewhere only the streams of this worker are notified, after the commit.
+
+        :param self: Represent the instance of the class
+        :param image_id: int: Image whose comments changed
+        :param version: int: Version of the comments of the image after the change
+        :param kind: str: created, updated, deleted or reset
+        :param payload: str: Serialized JSON data of the event
+        :return: An event object
+        """
+        event = self.model(image_id=image_id, version=version, kind=kind, payload=payload)
+        self.db.add(event)
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            self.db.execute(select(func.pg_notify(get_settings().comment_stream.channel, str(image_id))))
+        else:
+            self.on_commit(partial(get_services().comment_stream.publish, image_id))
+
+        return event
+
+
+    async def get_single(self, image_id: int, version: int) -> CommentEvent | None:
+        return self.db.scalar(select(self.model).where(self.model.image_id == image_id,
+                                                       self.model.version == version))
+
+
+    async def update(self, **kwargs):
+        """Not implemented method in case events are never changed"""
+        raise NotImplementedError
+
+
+    async def delete(self, **kwargs):
+        """Not implemented method in case events are only pruned"""
+        raise NotImplementedError
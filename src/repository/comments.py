@@ -1,13 +1,24 @@
+from datetime import datetime
+from functools import partial
 from sqlalchemy.orm import Session
+from sqlalchemy import select, tuple_
 from ..schemas.comment_example import CommentCreate, Comment
 
 from .base_repository import AbstractRepository
+from .versions import CollectionVersions, comments_key, images_keys
+from .comment_events import CommentEvents
 from ..models.comment import Comment
+from ..models.image import Image
 from ..models.user import User, Role
+from ..services.pagination import encode_cursor, decode_cursor
+from ..services.cache import get_cache, comments_entry, image_entry
+from ..services.serialization import dumps
 
 
 class CommentsRepo(AbstractRepository):
     model = Comment
+    # columns of the Comment response schema, in its field order
+    COLUMNS = (Comment.body, Comment.id, Comment.image_id, Comment.user_id, Comment.created_at, Comment.updated_at)
 
     def __init__(self, user: User, db: Session) -> None:
         self.user = user
@@ -35,8 +46,8 @@ class CommentsRepo(AbstractRepository):
             user_id=user_id
         )
         self.db.add(new_comment)
-        self.db.commit()
-        self.db.refresh(new_comment)
+        self.db.flush()
+        await self._changed(image_id, "created", new_comment)
         return new_comment
     
     async def get_single(self, image_id: int, comment_id: int):
@@ -54,17 +65,57 @@ class CommentsRepo(AbstractRepository):
         if comment is not None:
             return comment
 
-    async def get_many(self, image_id: int):
+    async def get_many(self, image_id: int, limit: int, cursor: str=None, newest_first: bool=False, 
+                       projection: bool=False):
         """
-        The get_many function returns all comments associated with a given image_id.
+        The get_many function returns one page of comments associated with a given image_id.
+        Pages are walked with a keyset on (created_at, id), which is served 
+        by the (image_id, created_at, id) index regardless of the page depth.
+        Projected pages are served from the read cache.
             
         
         :param self: Represent the instance of the class
         :param image_id: int: Filter the comments by image_id
-        :return: A list of comments that are associated with the image_id
-        :doc-author: Trelent
+        :param limit: int: Maximum number of comments in the page
+        :param cursor: str: Cursor returned with the previous page
+        :param newest_first: bool: Return the most recent comments first
+        :param projection: bool: Return dicts built from selected columns instead of entities
+        :return: A tuple of the comments and the cursor of the next page or None
         """
-        return self.db.query(Comment).filter(Comment.image_id == image_id).all()
+        if not projection:
+            return await self._get_page(image_id, limit, cursor, newest_first, projection)
+
+        page = f"{limit}:{cursor or ''}:{int(newest_first)}"
+        comments, next_cursor = await get_cache().get_or_load(comments_entry(image_id), page, 
+                                                              partial(self._get_page, image_id, limit, 
+                                                                      cursor, newest_first, projection))
+        return comments, next_cursor
+
+    async def _get_page(self, image_id: int, limit: int, cursor: str, newest_first: bool, projection: bool):
+        key = tuple_(Comment.created_at, Comment.id)
+        columns = self.COLUMNS if projection else (Comment,)
+        comments = self.db.query(*columns).filter(Comment.image_id == image_id)
+        
+        if cursor:
+            last_key = tuple_(*decode_cursor(cursor, datetime, int))
+            comments = comments.filter(key < last_key if newest_first else key > last_key)
+
+        if newest_first:
+            comments = comments.order_by(Comment.created_at.desc(), Comment.id.desc())
+        else:
+            comments = comments.order_by(Comment.created_at, Comment.id)
+
+        comments = comments.limit(limit + 1).all()
+        
+        next_cursor = None
+        if len(comments) > limit:
+            comments = comments[:limit]
+            next_cursor = encode_cursor(comments[-1].created_at, comments[-1].id)
+
+        if projection:
+            comments = [comment._asdict() for comment in comments]
+        
+        return comments, next_cursor
 
     async def update(self, image_id: int, comment_id: int, new_body: str):
         """
@@ -81,8 +132,8 @@ class CommentsRepo(AbstractRepository):
         comment = self.db.query(Comment).filter(Comment.id == comment_id, Comment.image_id == image_id).first()
         if comment is not None:
             comment.body = new_body
-            self.db.commit()
-            self.db.refresh(comment)
+            self.db.flush()
+            await self._changed(image_id, "updated", comment)
             return comment
         return None
 
@@ -100,10 +151,38 @@ class CommentsRepo(AbstractRepository):
         comment = self.db.query(Comment).filter(Comment.id == comment_id, Comment.image_id == image_id).first()
         if comment:
             self.db.delete(comment)
-            self.db.commit()
+            self.db.flush()
+            await self._changed(image_id, "deleted", comment)
             return True
         return False
 
+    async def _changed(self, image_id: int, kind: str, comment: Comment):
+        """
+        The _changed method bumps the versions of the collections showing the comments of the image:
+        its comment list, and the image lists, which embed the comments of every image.
+        The change is logged for the comment streams under the new version of the comment list.
+        The cached comment pages and the cached image are dropped once the transaction commits.
+        
+        :param self: Represent the instance of the class
+        :param image_id: int: Image whose comments changed
+        :param kind: str: created, updated or deleted
+        :param comment: Comment: Changed comment
+        :return: Nothing
+        """
+        owner_id = self.db.scalar(select(Image.user_id).where(Image.id == image_id))
+        keys = [comments_key(image_id)]
+        if owner_id is not None:
+            keys.extend(images_keys(owner_id))
+        versions = await CollectionVersions(self.db).bump(*keys)
+
+        if kind == "deleted":
+            payload = {"id": comment.id, "image_id": image_id}
+        else:
+            payload = {column.key: getattr(comment, column.key) for column in self.COLUMNS}
+        await CommentEvents(self.db).create(image_id, versions.get(comments_key(image_id)), kind, 
+                                            dumps(payload).decode())
+        self.on_commit(partial(get_cache().invalidate, comments_entry(image_id), image_entry(image_id)))
+
     async def can_edit_comment(self, user: User, comment: Comment) -> bool:
         """
         The can_edit_comment function determines whether a user can edit a comment.
@@ -1,14 +1,63 @@
+from dataclasses import asdict, dataclass
+from functools import partial
+from datetime import datetime
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, or_
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import desc, or_, delete, select
 from uuid import uuid4
 
 from .base_repository import AbstractRepository
 from .tags import Tags
-from ..models.image import Image, Tag
+from .comments import CommentsRepo
+from .outbox import StorageOutbox
+from .versions import CollectionVersions, comments_key, images_keys
+from ..models.image import Image, ImageDerivative, Tag, build_srcset, image_m2m_tag
+from ..models.comment import Comment
 from ..models.user import User
-from ..schemas.image import ImageUpdate, ImageTransfornModel, OrderBy
-from ..services.media_storage import storage
+from ..models.outbox import StorageAction
+from ..models.base import json_array_agg, json_object
+from ..conf.config import get_settings
+from ..schemas.image import ImageUpdate, ImageTransfornModel, OrderBy, ImageResponseModel
+from ..services.container import get_services
+from ..services.image_metadata import ImageMetadata
+from ..services.cache import get_cache, image_entry, shared_entry, comments_entry
+
+
+@dataclass
+class ImageRow:
+    """
+    Image as selected by Images.get_many in projection mode, fields follow ImageResponseModel.
+    """
+    __slots__ = ("id", "identifier", "description", "url", "width", "height", "format", "byte_size",
+                 "orientation", "placeholder", "srcset", "tags", "created_at", "updated_at", "comments")
+    id: int
+    identifier: str
+    description: str
+    url: str
+    width: int | None
+    height: int | None
+    format: str | None
+    byte_size: int | None
+    orientation: str | None
+    placeholder: str | None
+    srcset: dict
+    tags: list
+    created_at: datetime
+    updated_at: datetime
+    comments: list
+
+    def __post_init__(self) -> None:
+        # json_agg gives NULL for an image without tags
+        if self.tags is None:
+            self.tags = []
+        # selected as a JSON array of derivatives, grouped like Image.srcset
+        self.srcset = build_srcset((derivative["format"], derivative["width"], derivative["url"])
+                                   for derivative in self.srcset or [])
+
+
+def _upload_result(img) -> dict:
+    # CloudinaryImage keeps the upload response as its metadata
+    return img.metadata if isinstance(img.metadata, dict) else {}
 
 
 class Images(AbstractRepository):
@@ -19,30 +68,103 @@ class Images(AbstractRepository):
         super().__init__(db)
         
 
-    async def create(self, file: str, description: str, tags: [Tag]) -> Image:
+    async def create(self, file: str, description: str, tags: [str]) -> Image:
         """
         The create function creates a new image for the user.
+        Dimensions, format, byte size, orientation and placeholder color are extracted 
+        in a worker process before the upload and stored with the image, 
+        along with the perceptual hash and the derivatives the storage generated with the upload.
+        With duplicates.reject_on_upload set, near duplicates of existing images are refused.
+        Tags are created after the upload, the request transaction writes nothing
+        (and holds no locks) before the reservation is committed and the upload is done.
         
         :param self: Represent the instance of the class
-        :param file: str: Get the file from the request
+        :param file: str: Binary file object of the upload
         :param description: str: Add a description to the image
+        :param tags: [str]: Names of the image tags, missing tags are created
         :return: An image object
         """
         
+        services = get_services()
+        metadata = await services.extract_metadata(file)
+        self._reject_duplicate(metadata.dhash)
         identifier = uuid4().hex
-        public_id = storage.get_public_id(self.user.username, identifier)
-        img = await storage.user_image_upload(file, public_id)
-        image = self.model(user=self.user, 
+        public_id = services.storage.get_public_id(self.user.username, identifier)
+        reservation = await self._reserve(public_id)
+        img = await services.storage.user_image_upload(file, public_id)
+        tags = await Tags(self.db).get_or_create_many(tags)
+        image = self.model(user_id=self.user.id, 
                            url=img.url, 
                            identifier=identifier, 
                            description=description, 
-                           tags=tags)
+                           tags=tags,
+                           derivatives=self._derivatives(img),
+                           **asdict(metadata))
 
         self.db.add(image)
-        self.db.commit()
-        self.db.refresh(image)
+        await StorageOutbox(self.db).delete(reservation)
+        self.db.flush()
+        await CollectionVersions(self.db).bump(*images_keys(self.user.id))
+        if image.dhash is not None:
+            self.on_commit(partial(services.duplicate_index.add, image.dhash, image.id))
 
         return image
+
+
+    def _reject_duplicate(self, dhash: int | None) -> None:
+        """
+        The _reject_duplicate method refuses an upload within duplicates.reject_distance 
+        of an image in the duplicate index, when the policy is enabled.
+        
+        :param self: Represent the instance of the class
+        :param dhash: int | None: Perceptual hash of the upload
+        :return: Nothing
+        """
+        config = get_settings().duplicates
+        duplicate_index = get_services().duplicate_index
+        if not config.reject_on_upload or dhash is None or not duplicate_index.ready:
+            return
+
+        if duplicate_index.search(dhash, config.reject_distance):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, 
+                                detail="A near duplicate of this image already exists")
+
+
+    def _derivatives(self, img) -> list[ImageDerivative]:
+        """
+        The _derivatives method builds the derivative records of an upload. Widths the picture 
+        is narrower than give copies of the same size, only one of them is kept.
+        
+        :param self: Represent the instance of the class
+        :param img: CloudinaryImage: Result of the upload
+        :return: A list of unsaved derivatives
+        """
+        derivatives = {}
+        for derivative in get_services().storage.derivatives_of(_upload_result(img)):
+            derivatives.setdefault((derivative["format"], derivative["width"]), ImageDerivative(**derivative))
+
+        return list(derivatives.values())
+
+
+    async def _reserve(self, public_id: str):
+        """
+        The _reserve method commits a delayed removal of public_id before the upload starts. 
+        It is cancelled in the same transaction that stores the image, so an asset 
+        uploaded for a transaction that never commits is removed by the outbox dispatcher.
+        The reservation is committed in a session of its own, the request transaction
+        is left untouched.
+        
+        :param self: Represent the instance of the class
+        :param public_id: str: Public id of the asset about to be uploaded
+        :return: The reservation task, detached
+        """
+        with Session(self.db.get_bind(), expire_on_commit=False) as db:
+            reservation = await StorageOutbox(db).create(StorageAction.remove, 
+                                                         public_id, 
+                                                         delay=get_settings().outbox.upload_grace)
+            db.commit()
+
+        return reservation
     
 
     async def update(self, pk: int, image_model: ImageUpdate):
@@ -62,7 +184,9 @@ class Images(AbstractRepository):
         tags = image.tags
         image.description = image_model.description
         image.tags = image_model.tags
-        self.db.commit()
+        self.db.flush()
+        await CollectionVersions(self.db).bump(*images_keys(image.user_id))
+        self.on_commit(partial(get_cache().invalidate, image_entry(image.id), shared_entry(image.identifier)))
 
         await Tags(self.db).delete_unused(tags)
         
@@ -72,6 +196,7 @@ class Images(AbstractRepository):
     async def delete(self, pk: int) -> Image:
         """
         The delete mathod deletes an image from the database and from storage.
+        Storage removal is staged in the outbox within the same transaction.
         
         :param self: Reference the class itself
         :param pk: int: Specify the primary key of the image to be deleted
@@ -85,16 +210,73 @@ class Images(AbstractRepository):
             return None
         
         tags = image.tags
+        public_id = get_services().storage.get_public_id(image.user.username, image.identifier)
         self.db.delete(image)
-        self.db.commit()
+        await StorageOutbox(self.db).create(StorageAction.remove, public_id)
+        self.db.flush()
+        await CollectionVersions(self.db).bump(*images_keys(image.user_id), comments_key(image.id))
+        self.on_commit(partial(get_cache().invalidate, image_entry(image.id), shared_entry(image.identifier), 
+                               comments_entry(image.id)))
+        if image.dhash is not None:
+            self.on_commit(partial(get_services().duplicate_index.remove, image.dhash, image.id))
 
-        public_id = storage.get_public_id(self.user.username, image.identifier)
-        await storage.remove_media(public_id)
         await Tags(self.db).delete_unused(tags)
 
         return image
 
 
+    async def delete_many(self, pks: list[int], any_owner: bool=False) -> list[int]:
+        """
+        The delete_many method deletes a set of images from the database and from storage.
+        Ownership of the whole set is checked with one query and the rows are removed 
+        with a single statement. Storage removals are staged in the outbox, which 
+        purges them in batches, and unused tags are cleaned once at the end.
+        
+        :param self: Reference the class itself
+        :param pks: list[int]: Primary keys of the images to be deleted
+        :param any_owner: bool: Allow deleting images owned by other users
+        :return: Ids of the deleted images, unknown ids are skipped
+        """
+        
+        rows = (self.db.query(self.model.id, self.model.user_id, self.model.identifier, self.model.dhash, User.username)
+                .join(User, User.id == self.model.user_id)
+                .filter(self.model.id.in_(pks))
+                .all())
+        
+        if not any_owner and any(row.user_id != self.user.id for row in rows):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, 
+                                detail='Current user not authorized for this action')
+        
+        ids = [row.id for row in rows]
+        if not ids:
+            return []
+        
+        tag_ids = [tag_id for tag_id, in (self.db.query(image_m2m_tag.c.tag_id)
+                                           .filter(image_m2m_tag.c.image_id.in_(ids))
+                                           .distinct())]
+        
+        self.db.execute(delete(image_m2m_tag).where(image_m2m_tag.c.image_id.in_(ids)))
+        self.db.execute(delete(ImageDerivative).where(ImageDerivative.image_id.in_(ids)))
+        self.db.query(Comment).filter(Comment.image_id.in_(ids)).update({Comment.image_id: None}, 
+                                                                         synchronize_session=False)
+        self.db.execute(delete(self.model).where(self.model.id.in_(ids)))
+        public_ids = [get_services().storage.get_public_id(row.username, row.identifier) for row in rows]
+        await StorageOutbox(self.db).create_many(StorageAction.remove, public_ids)
+        self.db.flush()
+        await CollectionVersions(self.db).bump(*(key for row in rows for key in images_keys(row.user_id)),
+                                               *(comments_key(row.id) for row in rows))
+        self.on_commit(partial(get_cache().invalidate, *(key for row in rows for key in (image_entry(row.id), 
+                                                                                        shared_entry(row.identifier), 
+                                                                                        comments_entry(row.id)))))
+        for row in rows:
+            if row.dhash is not None:
+                self.on_commit(partial(get_services().duplicate_index.remove, row.dhash, row.id))
+
+        await Tags(self.db).delete_unused_by_ids(tag_ids)
+
+        return ids
+
+
     async def get_single(self, pk: int) -> Image:
         """
         This method is used to retrieve a single image from the database.
@@ -110,7 +292,57 @@ class Images(AbstractRepository):
         return image
 
 
-    async def get_many(self, offset: int, limit: int, order_by: str, keyword: str, **filters):
+    async def read(self, pk: int) -> dict | None:
+        """
+        The read method returns the image as served by the API, from the read cache.
+        Write paths keep using get_single, which returns the entity.
+        
+        :param self: Represent the instance of the class
+        :param pk: int: Primary key of the image
+        :return: The ImageResponseModel payload, None if the image does not exist
+        """
+        return await get_cache().get_or_load(image_entry(pk), "", partial(self._read, pk))
+
+
+    async def _read(self, pk: int) -> dict | None:
+        image = await self.get_single(pk)
+        if image is None:
+            return None
+
+        return ImageResponseModel.model_validate(image).model_dump()
+
+
+    async def get_duplicates(self, pk: int, max_distance: int) -> list[dict] | None:
+        """
+        The get_duplicates method finds the near duplicates of an image in the duplicate index,
+        the images whose perceptual hash is within max_distance bits of its own.
+        
+        :param self: Represent the instance of the class
+        :param pk: int: Primary key of the image
+        :param max_distance: int: Largest Hamming distance of a near duplicate
+        :return: A list of dicts with id, identifier, url, user_id and distance, closest first. 
+            None if the image does not exist
+        """
+        image = await self.get_single(pk)
+        if image is None:
+            return None
+        if image.dhash is None:
+            return []
+
+        matches = get_services().duplicate_index.search(image.dhash, max_distance)
+        distances = {image_id: distance for distance, image_id in matches if image_id != pk}
+        if not distances:
+            return []
+
+        # images removed by other workers may still be indexed, only existing ones are returned
+        rows = (self.db.query(self.model.id, self.model.identifier, self.model.url, self.model.user_id)
+                .filter(self.model.id.in_(distances)))
+        duplicates = [{**row._asdict(), "distance": distances[row.id]} for row in rows]
+
+        return sorted(duplicates, key=lambda duplicate: (duplicate["distance"], duplicate["id"]))
+
+
+    async def get_many(self, offset: int, limit: int, order_by: str, keyword: str, projection: bool=False, **filters):
         """
         The get_many function is used to retrieve a list of images from the database.
         The function takes in an offset, limit, order_by and keyword as parameters.
@@ -123,16 +355,25 @@ class Images(AbstractRepository):
         :param limit: int: Limit the number of results returned
         :param order_by: str: Sort the images by a certain field
         :param keyword: str: Search for images by description or tag name
+        :param projection: bool: Return lightweight ImageRow objects, tags included, with a single query
         :param filters: Filter the images by tag
         :return: A list of images from the database
         :doc-author: Trelent
         """
-        images = self.db.query(self.model)
+        if projection:
+            images = self.db.query(self.model.id, self.model.identifier, self.model.description, self.model.url,
+                                   self.model.width, self.model.height, self.model.format, self.model.byte_size,
+                                   self.model.orientation, self.model.placeholder, self._derivatives_column(),
+                                   self._tags_column(), self.model.created_at, self.model.updated_at)
+        else:
+            images = self.db.query(self.model)
         if filters:
             images = images.filter_by(**filters)
         if keyword:
+            # the tag join repeats images, group them back so the limit counts images
             images = images.join(Tag, self.model.tags, isouter=True)
             images = images.filter(or_(self.model.description.like(f'%{keyword}%'), Tag.name.like(f'%{keyword}%')))
+            images = images.group_by(self.model.id)
         if order_by:
             field, order = order_by.split()
             if order=="desc":
@@ -140,7 +381,70 @@ class Images(AbstractRepository):
             else:
                 images = images.order_by(getattr(self.model, field))
 
-        images = images.group_by(self.model.id).offset(offset).limit(limit).all()
+        images = images.offset(offset).limit(limit).all()
+
+        if projection:
+            return [ImageRow(*row, []) for row in images]
+
+        return images
+
+
+    def _tags_column(self):
+        """
+        The _tags_column method builds a correlated subquery aggregating the tags 
+        of each image into a JSON array of {"name", "id"} objects, ordered by id.
+        It does not depend on the keyword join, which only keeps matching tags.
+
+        :param self: Represent the instance of the class
+        :return: A labeled column expression
+        """
+        tag = aliased(Tag)
+        ordered = (select(tag.name, tag.id)
+                   .join(image_m2m_tag, image_m2m_tag.c.tag_id == tag.id)
+                   .where(image_m2m_tag.c.image_id == self.model.id)
+                   .order_by(tag.id)
+                   .correlate(self.model)
+                   .subquery())
+        tags = select(json_array_agg(json_object("name", ordered.c.name, "id", ordered.c.id)))
+
+        return tags.scalar_subquery().label("tags")
+
+
+    def _derivatives_column(self):
+        """
+        The _derivatives_column method builds a correlated subquery aggregating the derivatives 
+        of each image into a JSON array of {"format", "width", "url"} objects.
+
+        :param self: Represent the instance of the class
+        :return: A labeled column expression
+        """
+        derivatives = (select(json_array_agg(json_object("format", ImageDerivative.format, 
+                                                         "width", ImageDerivative.width, 
+                                                         "url", ImageDerivative.url)))
+                       .where(ImageDerivative.image_id == self.model.id)
+                       .correlate(self.model))
+
+        return derivatives.scalar_subquery().label("srcset")
+
+
+    async def load_comments(self, images: list["ImageRow"]) -> list["ImageRow"]:
+        """
+        The load_comments method fills the comments of projected images,
+        the whole page is loaded with one query instead of one per image.
+
+        :param self: Represent the instance of the class
+        :param images: list[ImageRow]: Images returned by get_many in projection mode
+        :return: The same images
+        """
+        by_id = {image.id: image for image in images}
+        if not by_id:
+            return images
+
+        comments = (self.db.query(*CommentsRepo.COLUMNS)
+                    .filter(Comment.image_id.in_(by_id))
+                    .order_by(Comment.created_at, Comment.id))
+        for comment in comments:
+            by_id[comment.image_id].comments.append(comment._asdict())
 
         return images
     
@@ -160,18 +464,25 @@ class Images(AbstractRepository):
         if not image:
             return None
         
+        storage = get_services().storage
         identifier = uuid4().hex
         public_id = storage.get_public_id(self.user.username, identifier)
+        reservation = await self._reserve(public_id)
         
         try:
             img = await storage.image_transform(image.url, transform_model.model_dump(), public_id)
-            transformed_image = self.model(user=self.user, 
+            # the derived picture only exists in storage, its upload response describes it
+            metadata = ImageMetadata.from_storage(_upload_result(img))
+            transformed_image = self.model(user_id=self.user.id, 
                                        url=img.url, 
                                        identifier=identifier, 
-                                       description=image.description)
+                                       description=image.description,
+                                       derivatives=self._derivatives(img),
+                                       **asdict(metadata))
             self.db.add(transformed_image)
-            self.db.commit()
-            self.db.refresh(transformed_image)
+            await StorageOutbox(self.db).delete(reservation)
+            self.db.flush()
+            await CollectionVersions(self.db).bump(*images_keys(self.user.id))
         
         except Exception as err:
             raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(err))
@@ -192,6 +503,25 @@ class Images(AbstractRepository):
 
         return image
 
+
+    async def read_shared(self, identifier: str) -> dict | None:
+        """
+        The read_shared method returns the shared view of the image, from the read cache.
+        
+        :param self: Represent the instance of the class
+        :param identifier: str: Identify the image
+        :return: The ImageShareResponseModel payload, None if no image is found
+        """
+        return await get_cache().get_or_load(shared_entry(identifier), "", partial(self._read_shared, identifier))
+
+
+    async def _read_shared(self, identifier: str) -> dict | None:
+        image = await self.identify(identifier)
+        if image is None:
+            return None
+
+        return {"url": image.url, "description": image.description}
+
         
         
 
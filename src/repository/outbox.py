@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+
+from .base_repository import AbstractRepository
+from ..models.outbox import StorageTask, StorageAction
+
+
+class StorageOutbox(AbstractRepository):
+    """
+    Storage side effects are written to the outbox table in the same transaction
+    as the rows they belong to, and performed later by the outbox dispatcher.
+    None of the methods commit, the caller owns the transaction.
+    """
+    model = StorageTask
+
+    async def create(self, action: StorageAction, target: str, delay: float=0) -> StorageTask:
+        """
+        The create method stages a new storage task.
+
+        :param self: Represent the instance of the class
+        :param action: StorageAction: Storage operation to perform
+        :param target: str: Public id (or public id prefix) the operation is applied to
+        :param delay: float: Seconds to wait before the task becomes available
+        :return: A storage task object
+        """
+        task = self.model(action=action,
+                          target=target,
+                          available_at=datetime.utcnow() + timedelta(seconds=delay))
+        self.db.add(task)
+
+        return task
+
+
+    async def create_many(self, action: StorageAction, targets: [str]) -> [StorageTask]:
+        """
+        The create_many method stages one storage task per target.
+
+        :param self: Represent the instance of the class
+        :param action: StorageAction: Storage operation to perform
+        :param targets: [str]: Public ids (or prefixes) the operation is applied to
+        :return: A list of storage task objects
+        """
+        now = datetime.utcnow()
+        tasks = [self.model(action=action, target=target, available_at=now) for target in targets]
+        self.db.add_all(tasks)
+
+        return tasks
+
+
+    async def update(self, **kwargs):
+        """Not implemented method in case tasks are only completed or retried"""
+        raise NotImplementedError
+
+
+    async def delete(self, task: StorageTask) -> StorageTask:
+        """
+        The delete method removes a staged or completed task.
+
+        :param self: Represent the instance of the class
+        :param task: StorageTask: Task to remove
+        :return: The removed task
+        """
+        self.db.delete(task)
+
+        return task
+
+
+    async def get_single(self, pk: int) -> StorageTask:
+        """
+        The get_single method returns a task by its primary key.
+
+        :param self: Represent the instance of the class
+        :param pk: int: Primary key of the task
+        :return: A storage task object or None
+        """
+        return self.db.get(self.model, pk)
+
+
+    async def get_due(self, limit: int) -> [StorageTask]:
+        """
+        The get_due method returns tasks that are ready to run, oldest first.
+        Rows are locked so that several dispatchers never pick the same task.
+
+        :param self: Represent the instance of the class
+        :param limit: int: Maximum number of tasks to return
+        :return: A list of storage task objects
+        """
+        tasks = (self.db.query(self.model)
+                 .filter(self.model.failed.is_(False),
+                         self.model.available_at <= datetime.utcnow())
+                 .order_by(self.model.available_at, self.model.id)
+                 .limit(limit)
+                 .with_for_update(skip_locked=True)
+                 .all())
+
+        return tasks
+
+
+    async def retry(self, tasks: [StorageTask], error: str,
+                    max_attempts: int, backoff_base: float, backoff_max: float) -> None:
+        """
+        The retry method reschedules failed tasks with exponential backoff.
+        Tasks that ran out of attempts are marked as failed and kept for inspection.
+
+        :param self: Represent the instance of the class
+        :param tasks: [StorageTask]: Tasks that failed
+        :param error: str: Error message to keep with the tasks
+        :param max_attempts: int: Attempts after which a task is given up
+        :param backoff_base: float: Delay in seconds after the first failure
+        :param backoff_max: float: Upper bound of the delay in seconds
+        :return: Nothing
+        """
+        now = datetime.utcnow()
+        for task in tasks:
+            task.attempts += 1
+            task.last_error = error
+            if task.attempts >= max_attempts:
+                task.failed = True
+                continue
+
+            delay = min(backoff_max, backoff_base * 2 ** (task.attempts - 1))
+            task.available_at = now + timedelta(seconds=delay)
@@ -1,6 +1,9 @@
+from functools import partial
 from sqlalchemy.orm import Session
+from sqlalchemy import delete, exists, func
 
-from ..models.image import Tag, Image
+from ..models.image import Tag, Image, image_m2m_tag
+from ..services.container import get_services
 from .base_repository import AbstractRepository
 
 
@@ -25,8 +28,8 @@ class Tags(AbstractRepository):
         
         tag = self.model(name=name)
         self.db.add(tag)
-        self.db.commit()
-        self.db.refresh(tag)
+        self.db.flush()
+        self.on_commit(partial(get_services().tag_index.add, tag.name))
 
         return tag
     
@@ -48,7 +51,8 @@ class Tags(AbstractRepository):
             return None
         
         self.db.delete(tag)
-        self.db.commit()
+        self.db.flush()
+        self.on_commit(partial(get_services().tag_index.remove, tag.name))
 
         return tag
     
@@ -135,4 +139,52 @@ class Tags(AbstractRepository):
             if tag.images:
                 continue
             
-            await self.delete(tag.name)
\ No newline at end of file
+            await self.delete(tag.name)
+
+
+    async def delete_unused_by_ids(self, tag_ids: [int]) -> None:
+        """
+        The delete_unused_by_ids function deletes, with a single statement, those of the 
+        given tags that are no longer used by any images.
+        
+        :param self: Access the current instance of the class
+        :param tag_ids: [int]: Ids of the tags to check
+        :return: Nothing
+        """
+        if not tag_ids:
+            return
+        
+        unused = ~exists().where(image_m2m_tag.c.tag_id == self.model.id)
+        deleted = self.db.execute(delete(self.model)
+                                  .where(self.model.id.in_(tag_ids), unused)
+                                  .returning(self.model.name)).scalars().all()
+        for name in deleted:
+            self.on_commit(partial(get_services().tag_index.remove, name))
+
+
+    async def suggest(self, prefix: str, limit: int) -> list[dict]:
+        """
+        The suggest function returns the most used tags whose name starts with the prefix.
+        It is served by the in-process tag index and falls back to the database while
+        the index is not loaded, using the lower(name) text_pattern_ops index.
+        
+        :param self: Represent the instance of the class
+        :param prefix: str: Beginning of the tag name, case insensitive
+        :param limit: int: Maximal number of suggestions
+        :return: A list of dicts with name and count
+        """
+        tag_index = get_services().tag_index
+        if tag_index.ready:
+            return tag_index.suggest(prefix, limit)
+
+        pattern = prefix.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        count = func.count(image_m2m_tag.c.image_id)
+        rows = (self.db.query(self.model.name, count)
+                .outerjoin(image_m2m_tag, image_m2m_tag.c.tag_id == self.model.id)
+                .filter(func.lower(self.model.name).like(pattern, escape="\\"))
+                .group_by(self.model.id, self.model.name)
+                .order_by(count.desc(), func.lower(self.model.name))
+                .limit(limit)
+                .all())
+
+        return [{"name": name, "count": count} for name, count in rows]
@@ -1,11 +1,18 @@
+from datetime import datetime
 from sqlalchemy.orm import Session
 from ..models.user import User, Role, Enum
 from ..schemas.user import UserCreate, UserUpdate
 from .base_repository import AbstractRepository
 from typing import Optional, List
-from sqlalchemy import inspect, or_, func
+from sqlalchemy import or_, func
+from functools import partial
 from fastapi import HTTPException
-from ..services.media_storage import storage
+from ..services.container import get_services
+from ..services.pagination import encode_cursor, decode_cursor
+from ..services.revocation import get_revocations
+
+# pg_trgm indexes need at least this many characters to narrow a substring match
+TRIGRAM_LENGTH = 3
 
 
 class UserRepository(AbstractRepository):
@@ -36,8 +43,7 @@ class UserRepository(AbstractRepository):
         if existing_users_count == 0:
             user.role = Role.admin.value
         self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
+        self.db.flush()
         return user
 
     async def update(self, user: User, **kwargs) -> User:
@@ -53,7 +59,7 @@ class UserRepository(AbstractRepository):
         for key, value in kwargs.items():
             if key=='avatar':
                 try:
-                    avatar = await storage.avatar_upload(value,user.username)
+                    avatar = await get_services().storage.avatar_upload(value,user.username)
                     print(avatar.url)
                 except Exception as err:
                     raise HTTPException(status_code=500, detail= str(err))
@@ -63,26 +69,28 @@ class UserRepository(AbstractRepository):
                 continue
 
             setattr(user, key, value)
-        insp = inspect(user)
-        with self.db.begin_nested():
-            if insp.pending:
-                self.db.flush()
-            self.db.commit()
+        self.db.flush()
         return user
 
 
     async def delete(self, user: User):
         """
-    The delete function deletes a user from the database.
-
+    The delete function marks a user as deleted and revokes its tokens. The account
+    is hidden from lookups at once, its rows and storage objects are removed
+    in the background by the account purge.
 
     :param self: Represent the instance of the class
     :param user: User: Pass in the user object to be deleted
-    :return: The number of rows deleted
+    :return: The marked user
     :doc-author: Trelent
     """
-        self.db.delete(user)
-        self.db.commit()
+        # claims of the user are not trusted from here on, even if the revocation is lost
+        await get_revocations().suspend(user.id)
+        user.deleted_at = datetime.utcnow()
+        user.token_version = (user.token_version or 0) + 1
+        self.db.flush()
+        self.on_commit(partial(get_revocations().revoke, user.id, user.token_version))
+        return user
 
 
     async def get_single(self, user_id: int) -> Optional[User]:
@@ -96,54 +104,96 @@ class UserRepository(AbstractRepository):
     :return: The first user with the given id
     :doc-author: Trelent
     """
-        return self.db.query(User).filter(User.id == user_id).first()
+        return self.db.query(User).filter(User.id == user_id, User.deleted_at.is_(None)).first()
 
 
-    async def get_username(self, user_name: str) -> Optional[User]:
+    async def get_username(self, user_name: str, include_deleted: bool=False) -> Optional[User]:
         """
     The get_username function takes in a user_name and returns the first User object that matches
     the username. If no such user exists, it returns None.
 
     :param self: Refer to the class instance itself
     :param user_name: str: Specify the type of data that will be passed into the function
+    :param include_deleted: bool: Also match accounts marked as deleted and not purged yet
     :return: The first user in the database whose username matches the one provided as an argument
     :doc-author: Trelent
     """
-        return self.db.query(User).filter(User.username == user_name).first()
+        conditions = [User.username == user_name]
+        if not include_deleted:
+            conditions.append(User.deleted_at.is_(None))
+        return self.db.query(User).filter(*conditions).first()
 
 
-    async def get_email(self, user_email: str) -> Optional[User]:
+    async def get_email(self, user_email: str, include_deleted: bool=False) -> Optional[User]:
         """
     The get_email function takes in a user_email string and returns the first User object that matches
     the email. If no such user exists, it returns None.
 
     :param self: Refer to the class instance itself, and is always required in a method
     :param user_email: str: Specify the type of data that is being passed in to the function
+    :param include_deleted: bool: Also match accounts marked as deleted and not purged yet
     :return: The first user object in the database with a matching email address
     :doc-author: Trelent
     """
-        return self.db.query(User).filter(User.email == user_email).first()
+        conditions = [User.email == user_email]
+        if not include_deleted:
+            conditions.append(User.deleted_at.is_(None))
+        return self.db.query(User).filter(*conditions).first()
 
 
 
-    async def get_many(self, query: str) -> List[User]:
+    async def get_many(self, query: str, limit: int, cursor: str=None, projection: bool=False):
         """
-    The get_many function is used to search for users by username or email.
-    It returns a list of User objects that match the query.
+    The get_many function is used to search for users by username or email, case insensitive.
+    A query equal to a username or an email returns that user alone. Queries shorter than
+    a trigram match the beginning of the username or email, longer ones match anywhere
+    and are served by the pg_trgm indexes. Pages are walked with a keyset on id.
 
     :param self: Represent the instance of a class
     :param query: str: Filter the results of the query
-    :return: A list of user objects that match the query
+    :param limit: int: Maximum number of users in the page
+    :param cursor: str: Cursor returned with the previous page
+    :param projection: bool: Return UserResponse shaped dicts built from selected columns instead of entities
+    :return: A tuple of the users that match the query and the cursor of the next page or None
     :doc-author: Trelent
     """
         query = query.lower()
-        users = self.db.query(User).filter(
-            or_(
-                User.username.ilike(f'%{query}%'),
-                User.email.ilike(f'%{query}%'),
-            )
-        ).all()
-        return users
+        username, email = func.lower(User.username), func.lower(User.email)
+        columns = (User.id, User.username, User.email, User.role) if projection else (User,)
+
+        users = []
+        if not cursor:
+            users = (self.db.query(*columns)
+                     .filter(or_(username == query, email == query), User.deleted_at.is_(None))
+                     .limit(limit)
+                     .all())
+        if users:
+            next_cursor = None
+        else:
+            users, next_cursor = self._search(columns, username, email, query, limit, cursor)
+
+        if projection:
+            return [user._asdict() for user in users], next_cursor
+        return users, next_cursor
+
+
+    def _search(self, columns, username, email, query: str, limit: int, cursor: str=None):
+        if len(query) < TRIGRAM_LENGTH:
+            condition = or_(username.startswith(query, autoescape=True), email.startswith(query, autoescape=True))
+        else:
+            condition = or_(username.contains(query, autoescape=True), email.contains(query, autoescape=True))
+
+        users = self.db.query(*columns).filter(condition, User.deleted_at.is_(None))
+        if cursor:
+            users = users.filter(User.id > decode_cursor(cursor, int)[0])
+        users = users.order_by(User.id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1].id)
+
+        return users, next_cursor
 
     async def ban(self, user_id: int) -> User:
         """
@@ -158,8 +208,11 @@ class UserRepository(AbstractRepository):
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
 
+        await get_revocations().suspend(user.id)
         user.ban = not user.ban
+        user.token_version = (user.token_version or 0) + 1
         await self.update(user)
+        self.on_commit(partial(get_revocations().revoke, user.id, user.token_version))
         return user
 
 
@@ -177,10 +230,13 @@ class UserRepository(AbstractRepository):
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
 
+        await get_revocations().suspend(user.id)
         user.role = new_role.value
+        # tokens carrying the previous role are refused, clients refresh them
+        user.token_version = (user.token_version or 0) + 1
         self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
+        self.db.flush()
+        self.on_commit(partial(get_revocations().revoke, user.id, user.token_version))
         return user
 
 
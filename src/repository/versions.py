@@ -0,0 +1,97 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .base_repository import AbstractRepository
+from ..models.version import CollectionVersion
+
+
+# the version of the list of all images is spread over counters, writers of different
+# users seldom wait on the same row
+IMAGE_SHARDS = 16
+
+
+def images_key(user_id: int=None) -> str:
+    return "images" if user_id is None else f"images:user:{user_id}"
+
+
+def images_keys(user_id: int) -> tuple[str, str]:
+    """
+    The images_keys function returns the keys to bump when images of a user change:
+    the list of the user and the shard of the list of all images it counts in.
+
+    :param user_id: int: Owner of the changed images
+    :return: The keys
+    """
+    return images_key(user_id), f"images:shard:{user_id % IMAGE_SHARDS}"
+
+
+def comments_key(image_id: int) -> str:
+    return f"comments:image:{image_id}"
+
+
+class CollectionVersions(AbstractRepository):
+    """
+    Version counters of the collections served by the list endpoints: all the images,
+    the images of one user and the comments of one image. Write paths bump the counters
+    of the collections they change in their own transaction, so a version never moves
+    without the content and is rolled back with it. List endpoints derive their ETag
+    from the version and answer 304 without reading the collection. The list of all
+    images is versioned by the sum of its shards, not by one row every write would lock.
+    """
+    model = CollectionVersion
+
+    async def bump(self, *keys: str) -> dict[str, int]:
+        """
+        The bump method increments the versions of the collections, with one upsert.
+        A missing counter starts at 1. The rows stay locked until the transaction ends,
+        writers of the same collection are serialized on them.
+
+        :param self: Represent the instance of the class
+        :param keys: str: Keys of the changed collections
+        :return: The new versions by key
+        """
+        # sorted, concurrent writers lock the rows in the same order
+        keys = sorted({key for key in keys})
+        if not keys:
+            return {}
+
+        dialect = postgresql if self.db.get_bind().dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(self.model).values([{"key": key, "version": 1} for key in keys])
+        statement = statement.on_conflict_do_update(index_elements=[self.model.key],
+                                                    set_={"version": self.model.version + 1})
+        rows = self.db.execute(statement.returning(self.model.key, self.model.version))
+
+        return dict(rows.all())
+
+
+    async def get_single(self, key: str) -> int:
+        """
+        The get_single method reads the version of a collection.
+
+        :param self: Represent the instance of the class
+        :param key: str: Key of the collection
+        :return: The version, 0 for a collection never changed
+        """
+        if key == images_key():
+            # the sum only grows, the row bumped before the shards keeps it above the versions already served
+            keys = [key, *(f"images:shard:{shard}" for shard in range(IMAGE_SHARDS))]
+            version = self.db.scalar(select(func.sum(self.model.version)).where(self.model.key.in_(keys)))
+        else:
+            version = self.db.scalar(select(self.model.version).where(self.model.key == key))
+
+        return version or 0
+
+
+    async def create(self, **kwargs):
+        """Not implemented method in case counters are only created by bump"""
+        raise NotImplementedError
+
+
+    async def update(self, **kwargs):
+        """Not implemented method in case counters are only changed by bump"""
+        raise NotImplementedError
+
+
+    async def delete(self, **kwargs):
+        """Not implemented method in case counters are never removed"""
+        raise NotImplementedError
@@ -8,24 +8,30 @@ from ..dependencies.db import get_db
 from ..services.auth import (oauth2_scheme,
                              create_refresh_token,
                              create_access_token, 
+                             access_claims,
                              get_user_by_refresh_token, 
                             )
 from ..repository.users import UserRepository
 from ..services.hash_handler import hash_password, check_password
+from ..services.revocation import get_revocations
 from ..schemas.user import UserCreate, UserResponse
+from ..dependencies.rate_limit import RateLimit
 
 
 router = APIRouter(prefix='/auth', tags=["auth"])
 
 security = HTTPBearer()
 
+signin_limit = RateLimit("signin")
+
 @router.post('/signup', response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing_username_user = await UserRepository(db).get_username(user_data.username)
+    # a deleted account keeps its username and email until it is purged
+    existing_username_user = await UserRepository(db).get_username(user_data.username, include_deleted=True)
     if existing_username_user:
         raise HTTPException(status_code=409, detail="User with the same username already exists.")
 
-    existing_email_user = await UserRepository(db).get_email(user_data.email)
+    existing_email_user = await UserRepository(db).get_email(user_data.email, include_deleted=True)
     if existing_email_user:
         raise HTTPException(status_code=409, detail="User with the same email already exists.")
     
@@ -35,20 +41,24 @@ async def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
     return user
 
 
-@router.post("/signin", response_model=dict)
+@router.post("/signin", response_model=dict, dependencies=[Depends(signin_limit),])
 async def signin(request_user: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = await UserRepository(db).get_username(request_user.username)
     
     if not user or not check_password(request_user.password, user.password):
         raise HTTPException(status_code=401, detail="Incorrect username or password")
+    if user.ban:
+        # access tokens are trusted without a ban lookup, banned users get none
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User is banned")
 
     refresh_token = create_refresh_token({"sub": request_user.username})
 
     user_repo = UserRepository(db)
     user = await user_repo.update(user, refresh_token=refresh_token)
+    await get_revocations().remember(user.id, user.token_version or 0)
 
     return {
-        "access_token": create_access_token(data={"sub": request_user.username}),
+        "access_token": create_access_token(data=access_claims(user)),
         "refresh_token": refresh_token,
         "token_type": "bearer"
     }
@@ -60,5 +70,6 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials=Security(secur
     if not user:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    new_access_token = create_access_token(data={"sub": user.username})
+    new_access_token = create_access_token(data=access_claims(user))
+    await get_revocations().remember(user.id, user.token_version or 0)
     return {"access_token": new_access_token, "token_type": "bearer"}
\ No newline at end of file
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Response, Body, Path
+from fastapi import APIRouter, HTTPException, Depends, status, Request, Response, Body, Path, Query, Header
+from fastapi.responses import StreamingResponse
 from typing import List
 from sqlalchemy.orm import Session
 
@@ -7,7 +8,12 @@ from ..dependencies.db import get_db
 from ..repository.comments import CommentsRepo
 from ..models.user import User
 from ..repository.images import Images as ImagesRepo
+from ..repository.versions import CollectionVersions, comments_key
 from ..services.auth import get_current_user
+from ..conf.config import get_settings
+from ..services.serialization import FastJSONResponse
+from ..services.conditional import CACHE_CONTROL, collection_etag, not_modified
+from ..services.container import get_services
 
 router = APIRouter(prefix='/images', tags=["comments"])
 
@@ -37,14 +43,65 @@ async def read_comment_for_image(
     return comments
 
 
-@router.get("/{image_id}/comments/", response_model=List[Comment])
+@router.get("/{image_id}/comments/", response_model=List[Comment], response_class=FastJSONResponse)
 async def read_all_comments_for_image(
+    request: Request,
     image_id: int, 
+    limit: int | None = Query(default=None, ge=1, description="Page size, capped by the server"),
+    cursor: str | None = Query(default=None, description="X-Next-Cursor header of the previous page"),
+    newest_first: bool = False,
     db: Session = Depends(get_db),
     user: User=Depends(get_current_user)
 ):
-    comments = await CommentsRepo(user, db).get_many(image_id)
-    return comments
+    pagination = get_settings().pagination
+    limit = min(limit or pagination.comments_default, pagination.comments_max)
+    key = comments_key(image_id)
+    # unchanged comments are answered with a 304, before the comments are read
+    version = await CollectionVersions(db).get_single(key)
+    etag = collection_etag(key, version, limit=limit, cursor=cursor, newest_first=newest_first)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    comments, next_cursor = await CommentsRepo(user, db).get_many(image_id, 
+                                                                  limit=limit, 
+                                                                  cursor=cursor, 
+                                                                  newest_first=newest_first,
+                                                                  projection=True)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return FastJSONResponse(comments, headers=headers)
+
+
+@router.get("/{image_id}/comments/stream")
+async def stream_comments_for_image(
+    image_id: int,
+    last_event_id: int | None = Header(default=None, ge=0, description="Id of the last event received, to resume"),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """
+    The stream_comments_for_image function streams the comments of the image created, edited or deleted
+    from now on as server-sent events. The id of an event is the version of the comment list it produced,
+    a client reconnecting with Last-Event-ID gets the events it missed. A reset event asks the client 
+    to reload the comments, when the missed events are no longer kept.
+
+    :param image_id: int: The ID of the image
+    :param last_event_id: int: Last-Event-ID header of a reconnecting client
+    :param db: Session: Database session, closed before the stream starts
+    :param user: User: Current user
+    :return: A text/event-stream response
+    """
+    if await ImagesRepo(user, db).get_single(image_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found!")
+
+    if last_event_id is None:
+        last_event_id = await CollectionVersions(db).get_single(comments_key(image_id))
+
+    # the stream reads the events with sessions of its own, after the request session is closed
+    return StreamingResponse(get_services().comment_stream.stream(image_id, last_event_id), 
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @router.patch("/{image_id}/comments/{comment_id}", response_model=Comment)
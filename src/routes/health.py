@@ -0,0 +1,32 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from ..services.container import get_services
+
+
+router = APIRouter(prefix='/health', tags=["health"])
+
+
+@router.get('/live')
+async def live():
+    """
+    The live function tells the orchestrator that the process is up and the event loop responds.
+    It never touches the database or the storage.
+
+    :return: A dict with the status
+    """
+    return {"status": "alive"}
+
+
+@router.get('/ready')
+async def ready():
+    """
+    The ready function reports the cached results of the background health checks 
+    and the connection pool saturation. It answers 503 when the worker should be 
+    taken out of rotation.
+
+    :return: A health report
+    """
+    is_ready, report = get_services().monitor.readiness()
+
+    return JSONResponse(content=report, status_code=200 if is_ready else 503)
@@ -8,11 +8,11 @@ from fastapi import (APIRouter,
                      UploadFile, 
                      File, 
                      Form,
+                     Response,
                      )
 from typing import List, Annotated
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-import qrcode
 import io
 
 
@@ -23,13 +23,22 @@ from ..schemas.image import (ImageResponseModel,
                              ImageCreateResponseModel,
                              OrderBy,
                              ImageShareResponseModel,
+                             ImageBulkDeleteResponseModel,
+                             ImageDuplicateResponseModel,
                              )
 from ..dependencies.db import get_db
+from ..services.serialization import FastJSONResponse
 from ..repository.images import Images as ImagesRepo
 from ..repository.tags import Tags as TagsRepo
+from ..repository.versions import CollectionVersions, images_key
 from ..models.user import User
 from ..services.auth import get_current_user
-from ..dependencies.roles import OwnerRoleAccess, Role
+from ..dependencies.roles import OwnerRoleAccess, RoleAccess, Role
+from ..dependencies.uow import UnitOfWork, get_uow
+from ..dependencies.rate_limit import RateLimit, UserRateLimit
+from ..services.container import get_services
+from ..services.conditional import CACHE_CONTROL, collection_etag, not_modified
+from ..conf.config import get_settings
 
 
 router = APIRouter(prefix='/images', tags=["images"])
@@ -38,34 +47,63 @@ allowed_action = OwnerRoleAccess(permited_roles=[Role.admin,],
                                  repository=ImagesRepo, 
                                  param_name='image_id')
 
-@router.get('/', response_model=List[ImageResponseModel])
-async def get_images(keyword: str | None=Query(max_length=25, default=None),
+bulk_delete_roles = [Role.admin, Role.moderator]
+
+moderation_access = RoleAccess([Role.admin, Role.moderator])
+
+upload_limit = UserRateLimit("upload")
+transform_limit = UserRateLimit("transform")
+share_limit = UserRateLimit("share")
+shared_limit = RateLimit("shared")
+
+@router.get('/', response_model=List[ImageResponseModel], response_class=FastJSONResponse)
+async def get_images(request: Request,
+                     keyword: str | None=Query(max_length=25, default=None),
                      order_by: OrderBy=None,
                      offset: int=0, limit: int=100,
+                     user_id: int | None=Query(default=None, description="Only the images of this user"),
                      user: User=Depends(get_current_user), 
                      db: Session=Depends(get_db)):
     """
     The get_images function returns a list of images.
+    The response carries an ETag built from the version of the listed collection, 
+    a request whose If-None-Match still matches it gets a 304 without the images being read.
     
+    :param request: Request: Read the If-None-Match header
     :param keyword: str | None: Filter the images by keyword
     :param default: Set a default value for the parameter
     :param order_by: OrderBy: Specify the order in which to return images
     :param offset: int: Skip the first n images
     :param limit: int: Limit the number of images returned
+    :param user_id: int | None: Only return the images of this user
     :param user: User: Get the user's id from the database
     :param db: Session: Pass the database session to the imagesrepo class
     :return: A list of images objects
     :doc-author: Trelent
     """
-    images = await ImagesRepo(user, db).get_many(offset=offset,
-                                                 limit=limit,
-                                                 order_by=order_by,
-                                                 keyword=keyword,
-                                                )
-    return images
+    key = images_key(user_id)
+    # read before the images: a write committed in between gives a stale tag, never a stale page
+    version = await CollectionVersions(db).get_single(key)
+    etag = collection_etag(key, version, keyword=keyword, order_by=order_by, offset=offset, limit=limit)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    filters = {"user_id": user_id} if user_id is not None else {}
+    images_repo = ImagesRepo(user, db)
+    images = await images_repo.get_many(offset=offset,
+                                        limit=limit,
+                                        order_by=order_by,
+                                        keyword=keyword,
+                                        projection=True,
+                                        **filters,
+                                        )
+    await images_repo.load_comments(images)
+    return FastJSONResponse(images, headers=headers)
 
 
-@router.post('/', response_model=ImageCreateResponseModel, status_code=status.HTTP_201_CREATED)
+@router.post('/', response_model=ImageCreateResponseModel, status_code=status.HTTP_201_CREATED, 
+             dependencies=[Depends(upload_limit),])
 async def create_image(image_form: ImageCreate=Depends(ImageCreate.as_form),
                         user: User=Depends(get_current_user),
                         db: Session=Depends(get_db)):
@@ -81,15 +119,13 @@ async def create_image(image_form: ImageCreate=Depends(ImageCreate.as_form),
     :return: A tuple of the image and a list of tags
     :doc-author: Trelent
     """
-    tags = await TagsRepo(db).get_or_create_many(image_form.tags)
-
     image = await ImagesRepo(user, db).create(image_form.file.file, 
                                               image_form.description, 
-                                              tags)
+                                              image_form.tags)
     return image
 
 
-@router.get("/{image_id}", response_model=ImageResponseModel)
+@router.get("/{image_id}", response_model=ImageResponseModel, response_class=FastJSONResponse)
 async def get_image(image_id: int, 
                     user: User=Depends(get_current_user),
                     db: Session=Depends(get_db)):
@@ -104,36 +140,33 @@ async def get_image(image_id: int,
     :return: An image object, which is a named tuple
     :doc-author: Trelent
     """
-    image = await ImagesRepo(user, db).get_single(image_id)
+    image = await ImagesRepo(user, db).read(image_id)
 
     if image is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found!")
     
-    return image
+    return FastJSONResponse(image)
 
 
 @router.put('/{image_id}', response_model=ImageResponseModel, dependencies=[Depends(allowed_action),])
 async def update_image(body: ImageUpdate, 
                        image_id: int, 
-                       user: User=Depends(get_current_user),
-                       db: Session=Depends(get_db)):
+                       uow: UnitOfWork=Depends(get_uow)):
     """
     The update_image_description function updates the description of an image.
         
         Args:
             body (ImageUpdate): The new description and tags for the image.
             image_id (int): The ID of the image to update.
-            user (User, optional): The current user making this request, if any. Defaults to Depends(get_current_user).
-            db (Session, optional): A database session object used for querying data from a database and committing changes made by this function back into it. Defaults to Depends(get_db).  # noQA
+            uow (UnitOfWork): The session and current user shared with the ownership check. Defaults to Depends(get_uow).
     
     :param body: ImageUpdate: Get the image description and tags from the request body
     :param image_id: int: Specify the image to update
-    :param user: User: Get the current user
-    :param db: Session: Pass in the database session to the imagesrepo class
+    :param uow: UnitOfWork: Session and current user of the request
     :return: A image object
     """
-    body.tags = await TagsRepo(db).get_or_create_many(body.tags)
-    image = await ImagesRepo(user, db).update(image_id, body)
+    body.tags = await TagsRepo(uow.db).get_or_create_many(body.tags)
+    image = await ImagesRepo(uow.user, uow.db).update(image_id, body)
     
     if image is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found!")
@@ -143,19 +176,17 @@ async def update_image(body: ImageUpdate,
 
 @router.delete('/{image_id}', response_model=ImageResponseModel, dependencies=[Depends(allowed_action),])
 async def delete_image(image_id: int, 
-                       user: User=Depends(get_current_user),
-                       db: Session=Depends(get_db),
+                       uow: UnitOfWork=Depends(get_uow),
                        ):
     """
     The delete_image function deletes an image from the database.
     
     :param image_id: int: Identify the image to be deleted
-    :param user: User: Get the user object from the database
-    :param db: Session: Pass in the database session to the function
+    :param uow: UnitOfWork: Session and current user of the request
     :param: Get the image id from the url
     :return: The image that was deleted
     """
-    image = await ImagesRepo(user, db).delete(image_id)
+    image = await ImagesRepo(uow.user, uow.db).delete(image_id)
 
     if image is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found!")
@@ -163,7 +194,57 @@ async def delete_image(image_id: int,
     return image
 
 
-@router.post('/{image_id}/transform', response_model=ImageResponseModel)
+@router.delete('/', response_model=ImageBulkDeleteResponseModel)
+async def delete_images(ids: List[int]=Query(default=[], min_length=1, max_length=500),
+                        user: User=Depends(get_current_user),
+                        db: Session=Depends(get_db),
+                        ):
+    """
+    The delete_images function deletes a set of images at once.
+    Owners may delete their own images, admins and moderators may delete any image.
+    
+    :param ids: List[int]: Ids of the images to be deleted
+    :param user: User: Get the user object from the database
+    :param db: Session: Pass in the database session to the function
+    :return: Ids of the images that were deleted
+    """
+    any_owner = user.role in bulk_delete_roles
+    deleted = await ImagesRepo(user, db).delete_many(ids, any_owner=any_owner)
+    
+    return {"deleted": deleted}
+
+
+@router.get('/{image_id}/duplicates', response_model=List[ImageDuplicateResponseModel], 
+            dependencies=[Depends(moderation_access),])
+async def get_image_duplicates(image_id: int,
+                               distance: int | None = Query(default=None, ge=0, 
+                                                            description="Largest Hamming distance, capped by the server"),
+                               user: User=Depends(get_current_user),
+                               db: Session=Depends(get_db)):
+    """
+    The get_image_duplicates function lists the near duplicates of an image for moderators:
+    re-encoded, resized or slightly edited copies found by perceptual hash.
+    
+    :param image_id: int: Id of the image
+    :param distance: int: Largest Hamming distance, capped by settings.duplicates.distance_max
+    :param user: User: Get the user from the token
+    :param db: Session: Pass the database session to the repository
+    :return: A list of images with their distance, closest first
+    """
+    if not get_services().duplicate_index.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Duplicate index is not ready")
+
+    config = get_settings().duplicates
+    distance = min(config.distance_default if distance is None else distance, config.distance_max)
+    duplicates = await ImagesRepo(user, db).get_duplicates(image_id, distance)
+
+    if duplicates is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found!")
+    
+    return duplicates
+
+
+@router.post('/{image_id}/transform', response_model=ImageResponseModel, dependencies=[Depends(transform_limit),])
 async def transform_image(image_id: int, 
                           transform_model: ImageTransfornModel,
                           user: User=Depends(get_current_user),
@@ -192,7 +273,7 @@ async def transform_image(image_id: int,
     return image
 
 
-@router.get('/{image_id}/share')
+@router.get('/{image_id}/share', dependencies=[Depends(share_limit),])
 async def share_image(image_id: int,
                       request: Request, 
                       user: User=Depends(get_current_user),
@@ -215,6 +296,9 @@ async def share_image(image_id: int,
     
     url = str(request.base_url) + 'images/shared/' + image.identifier
     
+    # imported on first use, only this endpoint needs the QR encoder
+    import qrcode
+
     qr = qrcode.make(url)
     buf = io.BytesIO()
     qr.save(buf)
@@ -222,7 +306,8 @@ async def share_image(image_id: int,
     return StreamingResponse(buf, media_type="image/jpeg")
 
 
-@router.get('/shared/{identifier}', response_model=ImageShareResponseModel)
+@router.get('/shared/{identifier}', response_model=ImageShareResponseModel, response_class=FastJSONResponse,
+            dependencies=[Depends(shared_limit),])
 async def get_shared_image(identifier: str, db: Session=Depends(get_db)):
     """
     The get_shared_image function is used to retrieve an image from the database using its identifier.
@@ -232,9 +317,9 @@ async def get_shared_image(identifier: str, db: Session=Depends(get_db)):
     :return: An image object
     :doc-author: Trelent
     """
-    image = await ImagesRepo(None, db).identify(identifier)
+    image = await ImagesRepo(None, db).read_shared(identifier)
 
     if image is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found!")
 
-    return image
+    return FastJSONResponse(image)
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Response
+
+from ..services.metrics import registry, CONTENT_TYPE
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get('/metrics', include_in_schema=False)
+async def metrics():
+    """
+    The metrics function exposes request, database and storage metrics 
+    in the Prometheus text format.
+
+    :return: A plain text response
+    """
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
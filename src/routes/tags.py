@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, Query
+from typing import List
+from sqlalchemy.orm import Session
+
+from ..schemas.tag import TagSuggestion
+from ..dependencies.db import get_db
+from ..repository.tags import Tags as TagsRepo
+from ..models.user import User
+from ..services.auth import get_current_user
+from ..services.serialization import FastJSONResponse
+from ..conf.config import get_settings
+
+
+router = APIRouter(prefix='/tags', tags=["tags"])
+
+
+@router.get('/suggest', response_model=List[TagSuggestion], response_class=FastJSONResponse)
+async def suggest_tags(prefix: str=Query(min_length=1, max_length=25),
+                       limit: int | None=Query(default=None, ge=1, description="Number of suggestions, capped by the server"),
+                       user: User=Depends(get_current_user),
+                       db: Session=Depends(get_db)):
+    """
+    The suggest_tags function returns existing tags starting with the prefix, most used first,
+    so clients can reuse a tag instead of creating a near duplicate.
+    
+    :param prefix: str: Beginning of the tag name, case insensitive
+    :param limit: int | None: Maximal number of suggestions
+    :param user: User: Get the current user
+    :param db: Session: Database session, used only while the tag index is not loaded
+    :return: A list of tag names with the number of images using them
+    """
+    config = get_settings().tag_index
+    limit = min(limit or config.suggest_default, config.suggest_max)
+    suggestions = await TagsRepo(db).suggest(prefix, limit)
+
+    return FastJSONResponse(suggestions)
@@ -1,36 +1,49 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Form, File, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import EmailStr
 from sqlalchemy.orm import Session
 from typing import List, Annotated
 
 from ..schemas.user import UserCreate, UserUpdate, UserResponse, UserUpdateResponse, UserBan, UserProfileResponse
 from ..repository.users import UserRepository
-from ..dependencies.db import get_db
+from ..dependencies.db import get_db, SessionLocal
 from ..dependencies.roles import RoleAccess
 from ..models.user import Role, User
 from ..services.auth import get_current_user
+from ..services.serialization import FastJSONResponse
+from ..services.export import stream_export
+from ..conf.config import get_settings
 
 router = APIRouter(prefix='/users', tags=["users"])
 
 allowed_action = RoleAccess([Role.admin])
 
 # Implement role access
-@router.get('/', response_model=List[UserResponse], dependencies=[Depends(allowed_action),])
-async def get_users(query: str = Query(..., min_length=1), db: Session = Depends(get_db)):
+@router.get('/', response_model=List[UserResponse], response_class=FastJSONResponse, 
+            dependencies=[Depends(allowed_action),])
+async def get_users(query: str = Query(..., min_length=1), 
+                    limit: int | None = Query(default=None, ge=1, description="Page size, capped by the server"),
+                    cursor: str | None = Query(default=None, description="X-Next-Cursor header of the previous page"),
+                    db: Session = Depends(get_db)):
     """
-The get_users function returns a list of users.
+The get_users function returns one page of users matching the query.
 
 :param query: str: Filter the users by their name
 :param min_length: Set a minimum length for the query string
+:param limit: int: Page size, capped by settings.pagination.users_max
+:param cursor: str: Cursor of the next page from the previous response
 :param db: Session: Get the database session
-:return: A list of users
+:return: A list of users, the X-Next-Cursor header is set when more users match
 :doc-author: Trelent
 """
+    pagination = get_settings().pagination
+    limit = min(limit or pagination.users_default, pagination.users_max)
     user_repo = UserRepository(db)
-    users = await user_repo.get_many(query)
+    users, next_cursor = await user_repo.get_many(query, limit=limit, cursor=cursor, projection=True)
     if not users:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Users not found")
-    return users
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse(users, headers=headers)
 
 
 @router.put('/me', response_model=UserUpdateResponse)
@@ -59,10 +72,12 @@ The update_user function updates a user's email and avatar.
     return updated_user
 
 
-@router.delete('/{user_id}', response_model=UserResponse, dependencies=[Depends(allowed_action)])
+@router.delete('/{user_id}', response_model=UserResponse, status_code=status.HTTP_202_ACCEPTED,
+               dependencies=[Depends(allowed_action)])
 async def delete_user(user_id: int, db: Session = Depends(get_db)):
     """
-The delete_user function deletes a user from the database.
+The delete_user function deletes a user. The account is marked and disabled at once,
+its images, comments and storage objects are removed in the background.
 
 :param user_id: int: Specify the user id of the user to be deleted
 :param db: Session: Get the database session
@@ -146,6 +161,25 @@ The change_user_role function changes the role of a user.
     return user
 
 
+# after /profile/{username}, which would otherwise be matched for a user named export
+@router.get('/{user_id}/export', response_class=StreamingResponse, dependencies=[Depends(allowed_action)])
+async def export_user(user_id: int, compress: bool = False, db: Session = Depends(get_db)):
+    """
+The export_user function streams the images, tags and comments of a user as NDJSON,
+one JSON document per line, for backups and data requests. Memory use does not grow
+with the size of the account.
 
+:param user_id: int: Specify the user to export
+:param compress: bool: Compress the export with gzip
+:param db: Session: Get the database session
+:return: A streaming response with the export as an attachment
+"""
+    user = await UserRepository(db).get_single(user_id=user_id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-
+    filename = f"user-{user_id}.ndjson" + (".gz" if compress else "")
+    # read with a session of its own, the request session is closed before the body is sent
+    return StreamingResponse(stream_export(SessionLocal, user_id, compress),
+                             media_type="application/gzip" if compress else "application/x-ndjson",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
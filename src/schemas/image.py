@@ -1,7 +1,7 @@
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field, ValidationError, field_validator
 from datetime import datetime
-from typing import List
+from typing import Dict, List
 from enum import Enum
 from fastapi import HTTPException, UploadFile, Form, status
 
@@ -44,6 +44,14 @@ class ImageCreateResponseModel(BaseModel):
     identifier: str
     description: str
     url: str
+    width: int | None = None
+    height: int | None = None
+    format: str | None = None
+    byte_size: int | None = None
+    orientation: str | None = None
+    placeholder: str | None = None
+    # srcset attribute values by format, e.g. {"webp": "https://... 160w, https://... 480w"}
+    srcset: Dict[str, str] = {}
     tags: List[TagResponse]
     created_at: datetime
     updated_at: datetime
@@ -56,6 +64,19 @@ class ImageResponseModel(ImageCreateResponseModel):
     comments: List[Comment] = []
 
 
+class ImageBulkDeleteResponseModel(BaseModel):
+    deleted: List[int]
+
+
+class ImageDuplicateResponseModel(BaseModel):
+    id: int
+    identifier: str
+    url: str
+    user_id: int
+    # Hamming distance between the perceptual hashes, 0 for the same picture
+    distance: int
+
+
 class ImageCreate(BaseModel):
     file: UploadFile
     description: str=Field(max_length=250)
@@ -8,4 +8,8 @@ class TagResponse(TagModel):
     id: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class TagSuggestion(BaseModel):
+    name: str
+    count: int
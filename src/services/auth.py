@@ -5,20 +5,20 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 
 from ..dependencies.db import get_db
-from ..conf.config import settings  
+from ..conf.config import get_settings  
 from ..repository.users import UserRepository
+from ..models.user import User, Role
 from ..services.hash_handler import check_password
-
-ALGORITHM = settings.algorithm
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+from ..services.revocation import get_revocations
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/signin")
 
 def create_jwt_token(data: dict):
+    settings = get_settings()
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + timedelta(minutes=settings.auth.access_token_expire_minutes)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
 def verify_password(plain_password, hashed_password):
@@ -28,21 +28,43 @@ def verify_password(plain_password, hashed_password):
 def create_access_token(data: dict):
     return create_jwt_token(data)
 
+
+def access_claims(user: User) -> dict:
+    """
+    The access_claims function returns what an access token says about the user,
+    enough to authorize requests without loading the user.
+
+    :param user: User: The signed in user
+    :return: The sub, uid, role and ver claims
+    """
+    return {"sub": user.username, "uid": user.id, "role": Role(user.role).value, "ver": user.token_version or 0}
+
 def create_refresh_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=7)
     to_encode.update({"exp": expire})
-    encoded_refresh_token = jwt.encode(to_encode, settings.secret_key, algorithm=ALGORITHM)
+    encoded_refresh_token = jwt.encode(to_encode, get_settings().secret_key, algorithm=get_settings().algorithm)
     return encoded_refresh_token
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """
+    The get_current_user function authorizes a request from its access token.
+    Tokens carrying the uid, role and ver claims are trusted without a users table query
+    when the revocations are shared by all workers and the token was not revoked, the returned
+    user is then a transient User with id, username and role only. Older tokens, unknown
+    revocations and revocations kept per worker are checked against the database.
+
+    :param token: str: Access token from the Authorization header
+    :param db: Session: Get the database session
+    :return: The current user
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, get_settings().secret_key, algorithms=[get_settings().algorithm])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
@@ -50,10 +72,30 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise credentials_exception
+
+    user_id, role, version = payload.get("uid"), payload.get("role"), payload.get("ver")
+    claims = None not in (user_id, role, version)
+    if claims:
+        revocations = get_revocations()
+        min_version = await revocations.min_version(user_id)
+        if min_version is not None:
+            if version < min_version:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, 
+                                    detail="Token revoked", 
+                                    headers={"WWW-Authenticate": "Bearer"})
+            # a worker's own revocations miss bans and deletions made by the others
+            if revocations.shared:
+                return User(id=user_id, username=username, role=Role(role), ban=False)
     
     cur_user = await UserRepository(db).get_username(username)
+    if cur_user is None:
+        raise credentials_exception
     if cur_user.ban:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User is banned")
+    if claims and version < (cur_user.token_version or 0):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, 
+                            detail="Token revoked", 
+                            headers={"WWW-Authenticate": "Bearer"})
 
     return cur_user
 
@@ -64,7 +106,7 @@ async def get_user_by_refresh_token(refresh_token: str, db: Session = Depends(ge
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(refresh_token, settings.secret_key, algorithms=[ALGORITHM])
+        payload = jwt.decode(refresh_token, get_settings().secret_key, algorithms=[get_settings().algorithm])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
@@ -74,6 +116,8 @@ async def get_user_by_refresh_token(refresh_token: str, db: Session = Depends(ge
         raise credentials_exception
     
     cur_user = await UserRepository(db).get_username(username)
+    if cur_user is None:
+        raise credentials_exception
     if cur_user.ban:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User is banned")
 
@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from ..conf.config import get_settings, settings_cache
+from .serialization import dumps, loads
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # pragma: no cover - only the memory backend is available
+    aioredis = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# entries of the read cache, a key groups the fields invalidated together
+def image_entry(image_id: int) -> str:
+    return f"image:{image_id}"
+
+
+def shared_entry(identifier: str) -> str:
+    return f"shared:{identifier}"
+
+
+def comments_entry(image_id: int) -> str:
+    return f"comments:{image_id}"
+
+
+class MemoryCache:
+    """
+    Entries kept in the worker process, each worker caches on its own. An entry is
+    a key holding several fields, it expires ttl seconds after it was created.
+    Invalidations only reach the worker they are made in, with several workers the
+    entries are kept for the short memory_ttl or the redis backend is used.
+    """
+
+    def __init__(self, max_keys: int, clock=time.monotonic) -> None:
+        self.max_keys = max_keys
+        self.clock = clock
+        self._entries = OrderedDict()
+
+
+    async def get(self, key: str, field: str) -> bytes | None:
+        """
+        The get method reads a field of the entry stored under key.
+
+        :param self: Represent the instance of the class
+        :param key: str: Key of the entry
+        :param field: str: Field of the entry
+        :return: The stored value, None when missing or expired
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires, fields = entry
+        if expires <= self.clock():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return fields.get(field)
+
+
+    async def generation(self, key: str) -> str:
+        # invalidations of this worker are seen by ReadThroughCache itself
+        return ""
+
+
+    async def set(self, key: str, field: str, value: bytes, ttl: float, generation: str | None="") -> None:
+        """
+        The set method stores a field of the entry under key, an entry that does not exist yet
+        is created with the ttl.
+
+        :param self: Represent the instance of the class
+        :param key: str: Key of the entry
+        :param field: str: Field of the entry
+        :param value: bytes: Value to store
+        :param ttl: float: Seconds the entry is kept
+        :param generation: str | None: Unused, entries of a worker are invalidated in that worker
+        :return: Nothing
+        """
+        now = self.clock()
+        expires, fields = self._entries.pop(key, (now + ttl, {}))
+        if expires <= now:
+            expires, fields = now + ttl, {}
+        fields[field] = value
+
+        self._entries[key] = (expires, fields)
+        if len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class RedisCache:
+    """
+    Entries shared by all workers, stored as Redis hashes. While Redis is unreachable
+    every read is a miss and goes to the database. Every invalidation moves the
+    generation of the entry on, a field loaded from the database is only stored while
+    the generation is the one read before the load, so a worker cannot store a row
+    another worker changed meanwhile.
+    """
+    # the generation check and the write are atomic
+    SET_SCRIPT = """
+    if (redis.call('GET', KEYS[2]) or '') ~= ARGV[4] then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[3], 'NX')
+    return 1
+    """
+    # keys come in pairs of entry and generation
+    DELETE_SCRIPT = """
+    for i = 1, #KEYS, 2 do
+        redis.call('DEL', KEYS[i])
+        redis.call('INCR', KEYS[i + 1])
+        redis.call('EXPIRE', KEYS[i + 1], ARGV[1])
+    end
+    return 1
+    """
+
+    def __init__(self, client, prefix: str, generation_ttl: float=3600) -> None:
+        self.client = client
+        self.prefix = prefix
+        # a generation must outlive the loads that read it, an expired one only skips a store
+        self.generation_ttl = generation_ttl
+
+
+    def _generation_key(self, key: str) -> str:
+        return f"{self.prefix}:generation:{key}"
+
+
+    async def generation(self, key: str) -> str | None:
+        """
+        The generation method reads the generation of the entry before a load.
+
+        :param self: Represent the instance of the class
+        :param key: str: Key of the entry
+        :return: The generation, None when it could not be read and the load is not stored
+        """
+        try:
+            value = await self.client.get(self._generation_key(key))
+        except Exception as err:
+            logger.warning("Cache backend unavailable: %s", err)
+            return None
+
+        return value.decode() if value is not None else ""
+
+
+    async def get(self, key: str, field: str) -> bytes | None:
+        try:
+            return await self.client.hget(f"{self.prefix}:{key}", field)
+        except Exception as err:
+            logger.warning("Cache backend unavailable: %s", err)
+            return None
+
+
+    async def set(self, key: str, field: str, value: bytes, ttl: float, generation: str | None="") -> None:
+        if generation is None:
+            return
+
+        try:
+            # the expiry is set once, the entry does not outlive its first field by more than ttl
+            await self.client.eval(self.SET_SCRIPT, 2, f"{self.prefix}:{key}", self._generation_key(key), 
+                                   field, value, int(ttl), generation)
+        except Exception as err:
+            logger.warning("Cache backend unavailable: %s", err)
+
+
+    async def delete(self, *keys: str) -> None:
+        try:
+            await self.client.eval(self.DELETE_SCRIPT, 2 * len(keys), 
+                                   *(name for key in keys for name in (f"{self.prefix}:{key}", 
+                                                                       self._generation_key(key))),
+                                   int(self.generation_ttl))
+        except Exception as err:
+            logger.warning("Cache backend unavailable, entries kept until they expire: %s", err)
+
+
+class ReadThroughCache:
+    """
+    Serialized read models in front of the database. A miss loads the payload once
+    per worker however many requests ask for it meanwhile, the others wait for that load.
+    Write paths invalidate the entries they change after their transaction commits,
+    a load running across the invalidation, made by this worker or another one, is
+    handed to its waiters but not stored.
+    """
+
+    def __init__(self, backend, ttl: float, enabled: bool=True) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self._loads = {}
+
+
+    async def get_or_load(self, key: str, field: str, loader):
+        """
+        The get_or_load method returns the cached payload or loads and stores it.
+
+        :param self: Represent the instance of the class
+        :param key: str: Key of the entry, see image_entry, shared_entry and comments_entry
+        :param field: str: Field of the entry, the variant of the payload
+        :param loader: Coroutine function returning a JSON serializable payload, None is not stored
+        :return: The payload, dates as ISO strings when it comes from the cache
+        """
+        if not self.enabled:
+            return await loader()
+
+        data = await self.backend.get(key, field)
+        if data is not None:
+            return loads(data)
+
+        pending = self._loads.setdefault(key, {})
+        running = pending.get(field)
+        if running is not None:
+            try:
+                return await asyncio.shield(running)
+            except asyncio.CancelledError:
+                if not running.cancelled():
+                    raise
+            # the request that was loading went away, load without waiting again
+            return await loader()
+
+        running = pending[field] = asyncio.get_running_loop().create_future()
+        try:
+            # invalidations made by other workers during the load move the generation on
+            generation = await self.backend.generation(key)
+            payload = await loader()
+            if payload is not None and self._loading(key, field, running):
+                await self.backend.set(key, field, dumps(payload), self.ttl, generation)
+                if not self._loading(key, field, running):
+                    # invalidated while it was stored
+                    await self.backend.delete(key)
+        except asyncio.CancelledError:
+            running.cancel()
+            raise
+        except Exception as err:
+            running.set_exception(err)
+            # the waiters, if any, raise it too
+            running.exception()
+            raise
+        finally:
+            if self._loading(key, field, running):
+                del self._loads[key][field]
+                if not self._loads[key]:
+                    del self._loads[key]
+
+        running.set_result(payload)
+        return payload
+
+
+    def _loading(self, key: str, field: str, running: asyncio.Future) -> bool:
+        return self._loads.get(key, {}).get(field) is running
+
+
+    async def invalidate(self, *keys: str) -> None:
+        """
+        The invalidate method drops the entries, every field included.
+
+        :param self: Represent the instance of the class
+        :param keys: str: Keys of the changed entries
+        :return: Nothing
+        """
+        if not self.enabled or not keys:
+            return
+
+        for key in keys:
+            self._loads.pop(key, None)
+        await self.backend.delete(*keys)
+
+
+@settings_cache
+def get_cache() -> ReadThroughCache:
+    """
+    The get_cache function creates the configured cache on first use.
+
+    :return: The read through cache over MemoryCache or RedisCache
+    """
+    config = get_settings().cache
+    if config.backend == "memory":
+        return ReadThroughCache(MemoryCache(config.max_keys), config.memory_ttl, config.enabled)
+    if config.backend == "redis":
+        if aioredis is None:
+            raise RuntimeError("The redis cache backend requires the redis package")
+        return ReadThroughCache(RedisCache(aioredis.from_url(config.redis_url), config.key_prefix), 
+                                config.ttl, config.enabled)
+
+    raise ValueError(f"Unknown cache backend {config.backend!r}")
@@ -0,0 +1,290 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import sessionmaker
+
+from ..conf.config import CommentStreamSettings
+from ..dependencies.db import get_engine
+from ..models.comment import CommentEvent
+from ..models.version import CollectionVersion
+from ..repository.versions import comments_key
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Event:
+    version: int
+    kind: str
+    payload: str
+
+    def encode(self) -> bytes:
+        return f"id: {self.version}\nevent: {self.kind}\ndata: {self.payload}\n\n".encode()
+
+
+class Subscription:
+    """
+    One client of the stream of an image, queued the events after the last one it got.
+    When events are missing, or too many to queue, the client gets a reset event instead:
+    it reloads the comments and goes on from there.
+    """
+
+    def __init__(self, image_id: int, last: int, queue_size: int) -> None:
+        self.image_id = image_id
+        self.last = last
+        self.queue = asyncio.Queue(queue_size)
+        self.closed = False
+
+
+    def deliver(self, current: int, events: list[Event]) -> None:
+        """
+        The deliver method queues the events the client has not received yet.
+
+        :param self: Represent the instance of the class
+        :param current: int: Version of the comments of the image, read before the events
+        :param events: list[Event]: Events after the last version of some client, in version order
+        :return: Nothing
+        """
+        events = [event for event in events if event.version > self.last]
+        if len(events) > self.queue.maxsize - self.queue.qsize():
+            # the client reloads on the reset, the queued events are of no use to it
+            self._drain()
+            self._put(Event(max(current, events[-1].version), "reset", "{}"))
+            return
+        if events and events[0].version != self.last + 1:
+            # pruned events
+            self._put(Event(events[0].version - 1, "reset", "{}"))
+        elif not events and current != self.last:
+            # a change without event such as the deletion of the image, or a Last-Event-ID
+            # the image never reached
+            self._put(Event(current, "reset", "{}"))
+
+        for event in events:
+            self._put(event)
+
+
+    def _put(self, event: Event) -> None:
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # the client is too slow, it is disconnected and resumes from the last event it got
+            self.close()
+            return
+        self.last = event.version
+
+
+    def _drain(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+    def close(self) -> None:
+        self._drain()
+        self.queue.put_nowait(None)
+        self.closed = True
+
+
+class CommentStream:
+    """
+    Pushes the comment events of an image to the clients streaming it. A notification
+    for an image reads the events after the oldest client position once and fans them out,
+    notifications arriving meanwhile are folded into one more read. On PostgreSQL the
+    notifications of every worker arrive through LISTEN on one connection per worker,
+    otherwise only the changes committed by this worker are seen.
+    """
+
+    def __init__(self, session_factory: sessionmaker, config: CommentStreamSettings) -> None:
+        self.session_factory = session_factory
+        self.config = config
+        self._subscriptions = {}
+        self._reading = {}
+        self._connection = None
+        self._lost = None
+        self._tasks = []
+        self._notified = set()
+
+
+    async def stream(self, image_id: int, after: int) -> AsyncIterator[bytes]:
+        """
+        The stream method yields the events of the image after version after,
+        as text/event-stream, until the client goes away or falls too far behind.
+
+        :param self: Represent the instance of the class
+        :param image_id: int: Image whose comments are streamed
+        :param after: int: Last version the client knows, Last-Event-ID when it resumes
+        :return: An async iterator of bytes
+        """
+        subscription = Subscription(image_id, after, self.config.queue_size)
+        self._subscriptions.setdefault(image_id, set()).add(subscription)
+        try:
+            # events committed before the subscription, missed by the notifications
+            await self.publish(image_id)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), self.config.keepalive)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                yield event.encode()
+        finally:
+            subscriptions = self._subscriptions.get(image_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(image_id, None)
+
+
+    async def publish(self, image_id: int) -> None:
+        """
+        The publish method delivers the new events of the image to its clients in this worker.
+
+        :param self: Represent the instance of the class
+        :param image_id: int: Image whose comments changed
+        :return: Nothing
+        """
+        if image_id not in self._subscriptions:
+            return
+        if image_id in self._reading:
+            # the running read starts over once done
+            self._reading[image_id] = True
+            return
+
+        self._reading[image_id] = True
+        try:
+            while self._reading[image_id]:
+                self._reading[image_id] = False
+                subscriptions = [subscription for subscription in self._subscriptions.get(image_id, ())
+                                 if not subscription.closed]
+                if not subscriptions:
+                    break
+                after = min(subscription.last for subscription in subscriptions)
+                current, events = await asyncio.to_thread(self._read, image_id, after)
+                for subscription in subscriptions:
+                    subscription.deliver(current, events)
+                if len(events) == self.config.queue_size:
+                    # more events than one read, the clients further ahead wait for them
+                    self._reading[image_id] = True
+        except Exception as err:
+            logger.exception("Comment events of image %d not delivered: %s", image_id, err)
+        finally:
+            del self._reading[image_id]
+
+
+    def _read(self, image_id: int, after: int) -> tuple[int, list[Event]]:
+        with self.session_factory() as db:
+            # read first, the events then include every change it counts
+            current = db.scalar(select(CollectionVersion.version)
+                                .where(CollectionVersion.key == comments_key(image_id)))
+            rows = db.execute(select(CommentEvent.version, CommentEvent.kind, CommentEvent.payload)
+                              .where(CommentEvent.image_id == image_id, CommentEvent.version > after)
+                              .order_by(CommentEvent.version)
+                              .limit(self.config.queue_size)).all()
+
+        return current or 0, [Event(*row) for row in rows]
+
+
+    def _listen(self):
+        connection = get_engine().raw_connection()
+        # a connection of its own for the lifetime of the listener, outside of the pool
+        connection.detach()
+        listener = connection.driver_connection
+        listener.autocommit = True
+        listener.cursor().execute(f'LISTEN "{self.config.channel}"')
+
+        return listener
+
+
+    def _on_notify(self) -> None:
+        try:
+            self._connection.poll()
+        except Exception as err:
+            logger.warning("Comment stream listener disconnected: %s", err)
+            self._lost.set()
+            return
+
+        image_ids = set()
+        while self._connection.notifies:
+            payload = self._connection.notifies.pop(0).payload
+            if payload.isdigit():
+                image_ids.add(int(payload))
+        for image_id in image_ids:
+            self._notify(image_id)
+
+
+    def _notify(self, image_id: int) -> None:
+        task = asyncio.create_task(self.publish(image_id))
+        # the loop only keeps weak references to tasks
+        self._notified.add(task)
+        task.add_done_callback(self._notified.discard)
+
+
+    async def listen(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self._connection = await asyncio.to_thread(self._listen)
+                self._lost = asyncio.Event()
+                loop.add_reader(self._connection.fileno(), self._on_notify)
+                # changes committed while the listener was away
+                for image_id in list(self._subscriptions):
+                    self._notify(image_id)
+                await self._lost.wait()
+            except Exception as err:
+                logger.exception("Comment stream listener failed: %s", err)
+            finally:
+                if self._connection is not None:
+                    loop.remove_reader(self._connection.fileno())
+                    self._connection.close()
+                    self._connection = None
+            await asyncio.sleep(self.config.reconnect_delay)
+
+
+    def _prune(self) -> int:
+        with self.session_factory() as db:
+            deleted = db.execute(delete(CommentEvent)
+                                 .where(CommentEvent.created_at < datetime.utcnow()
+                                        - timedelta(seconds=self.config.retention)))
+            db.commit()
+
+        return deleted.rowcount
+
+
+    async def prune(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self._prune)
+            except Exception as err:
+                logger.exception("Comment events not pruned: %s", err)
+            await asyncio.sleep(self.config.prune_interval)
+
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+
+        self._tasks.append(asyncio.create_task(self.prune()))
+        if self.config.enabled and get_engine().dialect.name == "postgresql":
+            self._tasks.append(asyncio.create_task(self.listen()))
+
+
+    async def stop(self) -> None:
+        # open streams end, clients reconnect to another worker with Last-Event-ID
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.close()
+
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
@@ -0,0 +1,43 @@
+import hashlib
+
+from fastapi import Request
+
+from .serialization import dumps
+
+
+# clients keep the list and ask for it again on every use, with the ETag they got
+CACHE_CONTROL = "private, no-cache"
+
+
+def collection_etag(key: str, version: int, **params) -> str:
+    """
+    The collection_etag function derives the ETag of a list response from the version
+    of the listed collection and the query parameters that select the page.
+    Pass the parameters with the values the query uses, defaults and caps applied.
+
+    :param key: str: Key of the collection, see repository.versions
+    :param version: int: Version of the collection
+    :param params: Query parameters of the list
+    :return: A weak entity tag
+    """
+    digest = hashlib.blake2b(dumps([key, version, sorted(params.items())]), digest_size=12).hexdigest()
+
+    return f'W/"{digest}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """
+    The not_modified function checks the If-None-Match header of the request against etag,
+    with the weak comparison of RFC 9110.
+
+    :param request: Request: Current request
+    :param etag: str: Entity tag of the current response
+    :return: True when the client already holds the response
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+    return "*" in tags or etag.removeprefix("W/") in tags
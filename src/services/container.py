@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from ..conf.config import Settings, get_settings
+
+if TYPE_CHECKING:
+    from .comment_stream import CommentStream
+    from .duplicate_index import DuplicateIndex
+    from .health import HealthMonitor
+    from .image_metadata import MetadataExtractor
+    from .media_storage import MediaCloud
+    from .outbox import OutboxDispatcher
+    from .purge import AccountPurger
+    from .tag_index import TagIndex
+
+
+@dataclass
+class Services:
+    """
+    The storage client and the background services of an application, built by
+    create_app from its settings. Repositories and routes reach them through get_services.
+    """
+    storage: "MediaCloud"
+    extract_metadata: "MetadataExtractor"
+    tag_index: "TagIndex"
+    duplicate_index: "DuplicateIndex"
+    comment_stream: "CommentStream"
+    dispatcher: "OutboxDispatcher"
+    purger: "AccountPurger"
+    monitor: "HealthMonitor"
+
+
+    def start(self) -> None:
+        self.extract_metadata.start()
+        self.dispatcher.start()
+        self.monitor.start()
+        self.tag_index.start()
+        self.duplicate_index.start()
+        self.purger.start()
+        self.comment_stream.start()
+
+
+    async def stop(self) -> None:
+        await self.comment_stream.stop()
+        await self.purger.stop()
+        await self.duplicate_index.stop()
+        await self.tag_index.stop()
+        await self.monitor.stop()
+        await self.dispatcher.stop()
+        self.extract_metadata.stop()
+
+
+def build_services(settings: Settings) -> Services:
+    """
+    The build_services function creates the services from the settings. Nothing connects
+    to the database or the storage before the services are started or used.
+
+    :param settings: Settings: The application settings
+    :return: The services
+    """
+    # the services use the repositories, which look the services up through this module
+    from ..dependencies.db import SessionLocal
+    from .comment_stream import CommentStream
+    from .duplicate_index import DuplicateIndex
+    from .health import HealthMonitor
+    from .image_metadata import MetadataExtractor
+    from .media_storage import MediaCloud
+    from .outbox import OutboxDispatcher
+    from .purge import AccountPurger
+    from .tag_index import TagIndex
+
+    storage = MediaCloud(settings.cloudinary, settings.derivatives)
+    duplicate_index = DuplicateIndex(SessionLocal, settings.duplicates)
+
+    return Services(storage=storage,
+                    extract_metadata=MetadataExtractor(settings.ingest.workers),
+                    tag_index=TagIndex(SessionLocal, settings.tag_index),
+                    duplicate_index=duplicate_index,
+                    comment_stream=CommentStream(SessionLocal, settings.comment_stream),
+                    dispatcher=OutboxDispatcher(SessionLocal, storage, settings.outbox),
+                    purger=AccountPurger(SessionLocal, storage, duplicate_index, settings.purge),
+                    monitor=HealthMonitor(storage, settings.health))
+
+
+_services: Services | None = None
+
+
+def get_services() -> Services:
+    """
+    The get_services function returns the services installed by use_services, or builds
+    them from the application settings on first use, for scripts and tests without an app.
+
+    :return: The services
+    """
+    global _services
+    if _services is None:
+        _services = build_services(get_settings())
+    return _services
+
+
+def use_services(services: Services) -> None:
+    """
+    The use_services function installs the services get_services returns from now on.
+
+    :param services: Services: The services of the application
+    :return: None
+    """
+    global _services
+    _services = services
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from ..conf.config import DuplicatesSettings
+from ..models.image import Image
+
+
+logger = logging.getLogger(__name__)
+
+# hashes are stored as signed 64 bit integers, compared as unsigned
+_MASK = (1 << 64) - 1
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & _MASK).bit_count()
+
+
+class _Node:
+    __slots__ = ("hash", "ids", "children")
+
+    def __init__(self, hash: int, image_id: int) -> None:
+        self.hash = hash
+        self.ids = {image_id}
+        self.children = {}
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of perceptual hashes under the Hamming distance.
+
+    Every child hangs off its parent at the distance between their hashes, so by the
+    triangle inequality a search within k of a hash at distance d from a node only
+    descends into the children at distances d-k to d+k. Images with the same hash
+    share a node. Removing an image leaves its node in place to route searches,
+    the tree is rebuilt on the next reload.
+    """
+
+    def __init__(self) -> None:
+        self._root = None
+        self.size = 0
+
+
+    def add(self, hash: int, image_id: int) -> None:
+        if self._root is None:
+            self._root = _Node(hash, image_id)
+            self.size += 1
+            return
+
+        node = self._root
+        while True:
+            distance = hamming(hash, node.hash)
+            if distance == 0:
+                if image_id not in node.ids:
+                    node.ids.add(image_id)
+                    self.size += 1
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _Node(hash, image_id)
+                self.size += 1
+                return
+            node = child
+
+
+    def remove(self, hash: int, image_id: int) -> None:
+        node = self._root
+        while node is not None:
+            distance = hamming(hash, node.hash)
+            if distance == 0:
+                if image_id in node.ids:
+                    node.ids.discard(image_id)
+                    self.size -= 1
+                return
+            node = node.children.get(distance)
+
+
+    def search(self, hash: int, max_distance: int) -> list[tuple[int, int]]:
+        """
+        The search method finds the images whose hash is within max_distance of hash.
+
+        :param self: Represent the instance of the class
+        :param hash: int: Perceptual hash to compare with
+        :param max_distance: int: Largest Hamming distance of a match
+        :return: A list of (distance, image id) pairs, closest first
+        """
+        matches = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(hash, node.hash)
+            if distance <= max_distance:
+                matches.extend((distance, image_id) for image_id in node.ids)
+            for edge, child in node.children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+
+        return sorted(matches)
+
+
+class DuplicateIndex:
+    """
+    In-process near duplicate index of the perceptual hashes of the images.
+    It is loaded from the images table at startup, follows Images.create and
+    Images.delete in this process and is reloaded periodically to pick up
+    uploads of other workers. Reloads read and build the tree in a worker thread,
+    changes made meanwhile are replayed on the new tree before it is swapped in.
+    """
+
+    def __init__(self, session_factory: sessionmaker, config: DuplicatesSettings) -> None:
+        self.session_factory = session_factory
+        self.config = config
+        self.ready = False
+        self._tree = BKTree()
+        self._task = None
+        # changes made while a reload is in flight, None when there is none
+        self._pending = None
+
+
+    @staticmethod
+    def build(rows) -> BKTree:
+        tree = BKTree()
+        for image_id, hash in rows:
+            tree.add(hash, image_id)
+
+        return tree
+
+
+    def load(self, rows) -> None:
+        """
+        The load method replaces the content of the index.
+
+        :param self: Represent the instance of the class
+        :param rows: Iterable of (image id, hash) pairs
+        :return: Nothing
+        """
+        # swapped in one go, searches never see a half built tree
+        self._tree = self.build(rows)
+        self.ready = True
+
+
+    def _read_tree(self) -> BKTree:
+        with self.session_factory() as db:
+            rows = db.execute(select(Image.id, Image.dhash).where(Image.dhash.is_not(None))).all()
+
+        return self.build(rows)
+
+
+    async def refresh(self) -> None:
+        """
+        The refresh method reloads the index from the images table without holding the event loop.
+
+        :param self: Represent the instance of the class
+        :return: Nothing
+        """
+        self._pending = []
+        try:
+            tree = await asyncio.to_thread(self._read_tree)
+            # adding and removing are idempotent, changes the snapshot already has are harmless
+            for change, hash, image_id in self._pending:
+                getattr(tree, change)(hash, image_id)
+            self._tree = tree
+            self.ready = True
+        finally:
+            self._pending = None
+
+
+    def add(self, hash: int, image_id: int) -> None:
+        self._tree.add(hash, image_id)
+        if self._pending is not None:
+            self._pending.append(("add", hash, image_id))
+
+
+    def remove(self, hash: int, image_id: int) -> None:
+        self._tree.remove(hash, image_id)
+        if self._pending is not None:
+            self._pending.append(("remove", hash, image_id))
+
+
+    def search(self, hash: int, max_distance: int) -> list[tuple[int, int]]:
+        return self._tree.search(hash, max_distance)
+
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as err:
+                logger.exception("Duplicate index refresh failed: %s", err)
+            await asyncio.sleep(self.config.refresh_interval)
+
+
+    def start(self) -> None:
+        if self.config.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
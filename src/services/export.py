@@ -0,0 +1,157 @@
+"""
+Streaming export of the data of one user: the account, its images with their tags
+and its comments, one JSON document per line (NDJSON), optionally gzip compressed.
+
+    python -m src.services.export 42 -o user-42.ndjson.gz
+"""
+import argparse
+import sys
+import zlib
+from typing import Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..models.comment import Comment
+from ..models.image import Image, Tag, image_m2m_tag
+from ..models.user import User
+from ..models.base import json_array_agg
+from .serialization import dumps
+
+
+# rows buffered per fetch from the server side cursor
+BATCH_SIZE = 500
+# bytes of output collected before they are handed on
+CHUNK_SIZE = 64 * 1024
+
+
+def _rows(db: Session, statement) -> Iterator[dict]:
+    # yield_per streams the result with a server side cursor, memory holds one batch at a time
+    yield from db.execute(statement.execution_options(yield_per=BATCH_SIZE)).mappings()
+
+
+def records(db: Session, user_id: int) -> Iterator[dict]:
+    """
+    The records function yields the user, its images and its comments as plain dicts,
+    each with a type key. Rows are read as columns, never as mapped objects,
+    so nothing accumulates in the session.
+
+    :param db: Session: Database session
+    :param user_id: int: Id of the exported user
+    :return: An iterator of records, nothing for an unknown user
+    """
+    user = db.execute(select(User.id, User.username, User.email, User.role, User.avatar, User.confirmed,
+                             User.ban, User.created_at, User.updated_at)
+                      .where(User.id == user_id)).mappings().first()
+    if user is None:
+        return
+    yield {"type": "user", **user}
+
+    tags = (select(json_array_agg(Tag.name))
+            .join(image_m2m_tag, image_m2m_tag.c.tag_id == Tag.id)
+            .where(image_m2m_tag.c.image_id == Image.id)
+            .correlate(Image)
+            .scalar_subquery()
+            .label("tags"))
+    images = (select(Image.id, Image.identifier, Image.url, Image.description, Image.width, Image.height,
+                     Image.format, Image.byte_size, Image.created_at, Image.updated_at, tags)
+              .where(Image.user_id == user_id)
+              .order_by(Image.id))
+    for image in _rows(db, images):
+        # json_agg gives NULL for an image without tags
+        yield {"type": "image", **image, "tags": image["tags"] or []}
+
+    comments = (select(Comment.id, Comment.image_id, Comment.body, Comment.created_at, Comment.updated_at)
+                .where(Comment.user_id == user_id)
+                .order_by(Comment.id))
+    for comment in _rows(db, comments):
+        yield {"type": "comment", **comment}
+
+
+def _chunks(lines: Iterator[bytes]) -> Iterator[bytes]:
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    # wbits=31 writes the gzip container, readable by gunzip and browsers
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(session_factory: sessionmaker, user_id: int, compress: bool=False) -> Iterator[bytes]:
+    """
+    The stream_export function yields the export of the user in chunks. It opens its own
+    session, which stays open while the export is consumed, after the request session is gone.
+    On PostgreSQL the export is read from a single REPEATABLE READ snapshot.
+
+    :param session_factory: sessionmaker: Factory of the session reading the export
+    :param user_id: int: Id of the exported user
+    :param compress: bool: Compress the output with gzip
+    :return: An iterator of bytes
+    """
+    with session_factory() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        chunks = _chunks(dumps(record) + b"\n" for record in records(db, user_id))
+        yield from _gzip(chunks) if compress else chunks
+
+
+def write_export(session_factory: sessionmaker, user_id: int, file, compress: bool=False) -> int:
+    """
+    The write_export function writes the export of the user to a binary file.
+
+    :param session_factory: sessionmaker: Factory of the session reading the export
+    :param user_id: int: Id of the exported user
+    :param file: Binary file object
+    :param compress: bool: Compress the output with gzip
+    :return: The number of bytes written
+    """
+    written = 0
+    for chunk in stream_export(session_factory, user_id, compress):
+        written += file.write(chunk)
+
+    return written
+
+
+def main(argv: list[str]=None, session_factory: sessionmaker=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.services.export",
+                                     description="Export the images, tags and comments of a user as NDJSON.")
+    parser.add_argument("user_id", type=int, help="id of the exported user")
+    parser.add_argument("-o", "--output", help="file to write, standard output by default")
+    parser.add_argument("--gzip", action="store_true", help="compress the output, implied by a .gz output file")
+    args = parser.parse_args(argv)
+
+    if session_factory is None:
+        from ..dependencies.db import SessionLocal as session_factory
+
+    with session_factory() as db:
+        if db.get(User, args.user_id) is None:
+            print(f"User {args.user_id} not found", file=sys.stderr)
+            return 1
+
+    compress = args.gzip or bool(args.output and args.output.endswith(".gz"))
+    if args.output is None:
+        write_export(session_factory, args.user_id, sys.stdout.buffer, compress)
+        return 0
+
+    with open(args.output, "wb") as file:
+        written = write_export(session_factory, args.user_id, file, compress)
+    print(f"Exported user {args.user_id} to {args.output}, {written} bytes", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
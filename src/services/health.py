@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from ..conf.config import HealthSettings
+from ..dependencies.db import get_engine
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProbeResult:
+    ok: bool
+    latency_ms: float | None = None
+    error: str | None = None
+    checked_at: str | None = None
+
+
+class HealthMonitor:
+    """
+    Checks the database and the media storage in the background and keeps the latest
+    results in memory, so liveness and readiness probes never touch a dependency.
+    Storage is pinged through the rate limited Cloudinary Admin API, only when it is
+    required or its probe is enabled, and every storage_interval seconds.
+    """
+
+    def __init__(self, storage, config: HealthSettings, engine: Engine=None) -> None:
+        self._engine = engine
+        self.storage = storage
+        self.config = config
+        self.db = ProbeResult(ok=False, error="not checked yet")
+        self.media = ProbeResult(ok=False, error="not checked yet" if self.probes_storage else "probe disabled")
+        self.last_refresh = None
+        self.last_storage_check = None
+        self._task = None
+
+
+    @property
+    def engine(self) -> Engine:
+        # the application engine is created on first use
+        return self._engine if self._engine is not None else get_engine()
+
+
+    async def _probe(self, check) -> ProbeResult:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), timeout=self.config.timeout)
+        except Exception as err:
+            message = str(err) or err.__class__.__name__
+            return ProbeResult(ok=False, error=message, checked_at=datetime.utcnow().isoformat())
+
+        latency = round((time.perf_counter() - start) * 1000, 3)
+        return ProbeResult(ok=True, latency_ms=latency, checked_at=datetime.utcnow().isoformat())
+
+
+    def _select_one(self) -> None:
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+
+    async def check_db(self) -> None:
+        await asyncio.to_thread(self._select_one)
+
+
+    async def check_storage(self) -> None:
+        await self.storage.ping()
+
+
+    @property
+    def probes_storage(self) -> bool:
+        return self.config.storage_required or self.config.storage_probe
+
+
+    def storage_due(self) -> bool:
+        if not self.probes_storage:
+            return False
+
+        return (self.last_storage_check is None 
+                or time.monotonic() - self.last_storage_check >= self.config.storage_interval)
+
+
+    async def refresh(self) -> None:
+        """
+        The refresh method probes the database and, when it is due, the storage concurrently
+        and stores the results.
+
+        :param self: Represent the instance of the class
+        :return: Nothing
+        """
+        probes = {"database": self._probe(self.check_db)}
+        if self.storage_due():
+            probes["storage"] = self._probe(self.check_storage)
+        results = dict(zip(probes, await asyncio.gather(*probes.values())))
+
+        self.db = results["database"]
+        if "storage" in results:
+            self.media = results["storage"]
+            self.last_storage_check = time.monotonic()
+        self.last_refresh = time.monotonic()
+
+        for name, result in results.items():
+            if not result.ok:
+                logger.warning("Health check of %s failed: %s", name, result.error)
+
+
+    def pool_status(self) -> dict:
+        """
+        The pool_status method reads connection pool usage from memory.
+
+        :param self: Represent the instance of the class
+        :return: A dict with pool size, checked out connections and saturation
+        """
+        pool = self.engine.pool
+        if not hasattr(pool, "checkedout") or not hasattr(pool, "size"):
+            return {"size": None, "checked_out": None, "saturation": 0.0}
+
+        capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+        checked_out = pool.checkedout()
+
+        return {"size": capacity, "checked_out": checked_out, "saturation": round(checked_out / capacity, 3)}
+
+
+    def is_stale(self) -> bool:
+        if self.last_refresh is None:
+            return True
+
+        return time.monotonic() - self.last_refresh > self.config.interval * 3 + self.config.timeout
+
+
+    def readiness(self) -> tuple[bool, dict]:
+        """
+        The readiness method decides from cached state whether the worker should receive traffic.
+
+        :param self: Represent the instance of the class
+        :return: A tuple of the verdict and a report
+        """
+        pool = self.pool_status()
+        reasons = []
+        if self.is_stale():
+            reasons.append("health checks are stale")
+        if not self.db.ok:
+            reasons.append("database unavailable")
+        if self.config.storage_required and not self.media.ok:
+            reasons.append("storage unavailable")
+        if pool["saturation"] >= self.config.pool_saturation:
+            reasons.append("connection pool saturated")
+
+        report = {
+            "status": "ready" if not reasons else "unavailable",
+            "reasons": reasons,
+            "database": asdict(self.db),
+            "storage": asdict(self.media),
+            "pool": pool,
+        }
+
+        return not reasons, report
+
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as err:
+                logger.exception("Health refresh failed: %s", err)
+            await asyncio.sleep(self.config.interval)
+
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
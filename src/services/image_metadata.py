@@ -0,0 +1,184 @@
+import asyncio
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+
+try:
+    from PIL import Image as PILImage, ImageOps
+except ImportError:  # pragma: no cover - only the byte size is recorded
+    PILImage = ImageOps = None
+
+
+logger = logging.getLogger(__name__)
+
+# EXIF orientations that rotate the picture by 90 degrees, width and height are swapped on display
+_ROTATED = {5, 6, 7, 8}
+_EXIF_ORIENTATION = 0x0112
+# side of the copy the placeholder color is computed from
+_SAMPLE_SIZE = 64
+# the difference hash compares each pixel of a 9x8 grayscale copy with its right neighbour
+_DHASH_SIZE = 8
+
+
+@dataclass
+class ImageMetadata:
+    """
+    Facts about an uploaded picture, stored with the image. Width and height are
+    the displayed size, EXIF rotation applied. Fields are None when unknown.
+    """
+    byte_size: int
+    width: int | None = None
+    height: int | None = None
+    format: str | None = None
+    orientation: str | None = None
+    placeholder: str | None = None
+    dhash: int | None = None
+
+
+    @classmethod
+    def from_storage(cls, result: dict) -> "ImageMetadata":
+        """
+        The from_storage method reads the metadata Cloudinary returns for an upload,
+        used for derived images the application never holds in memory.
+
+        :param cls: Represent the class
+        :param result: dict: Upload response
+        :return: The metadata, without placeholder
+        """
+        width, height = result.get("width"), result.get("height")
+        return cls(byte_size=result.get("bytes"),
+                   width=width,
+                   height=height,
+                   format=result.get("format"),
+                   orientation=orientation(width, height))
+
+
+def orientation(width: int | None, height: int | None) -> str | None:
+    if not width or not height:
+        return None
+    if width == height:
+        return "square"
+
+    return "landscape" if width > height else "portrait"
+
+
+def extract(data: bytes) -> ImageMetadata:
+    """
+    The extract function decodes the picture header and a downscaled copy of the picture.
+    It runs in a worker process, pictures Pillow can not read only get their byte size.
+
+    :param data: bytes: Content of the uploaded file
+    :return: The metadata
+    """
+    metadata = ImageMetadata(byte_size=len(data))
+    if PILImage is None:
+        return metadata
+
+    try:
+        with PILImage.open(io.BytesIO(data)) as img:
+            width, height = img.size
+            if img.getexif().get(_EXIF_ORIENTATION) in _ROTATED:
+                width, height = height, width
+            metadata.width, metadata.height = width, height
+            metadata.format = (img.format or "").lower() or None
+            metadata.orientation = orientation(width, height)
+            sample = downscale(img)
+            metadata.placeholder = dominant_color(sample)
+            metadata.dhash = dhash(sample)
+    except Exception as err:
+        logger.warning("Image metadata not extracted: %s", err)
+
+    return metadata
+
+
+def downscale(img):
+    """
+    The downscale function returns a small RGB copy of the picture as it is displayed,
+    the placeholder and the perceptual hash are computed from it.
+
+    :param img: Opened Pillow image
+    :return: A Pillow image at most _SAMPLE_SIZE pixels wide and high
+    """
+    # JPEG decodes straight to a reduced size, the full picture is never expanded
+    img.draft("RGB", (_SAMPLE_SIZE, _SAMPLE_SIZE))
+    sample = ImageOps.exif_transpose(img.convert("RGB") if img.mode != "RGB" else img)
+    sample.thumbnail((_SAMPLE_SIZE, _SAMPLE_SIZE))
+
+    return sample
+
+
+def dominant_color(sample) -> str:
+    """
+    The dominant_color function returns the most frequent color of the picture,
+    shown by galleries in place of the picture until it is loaded.
+
+    :param sample: Small RGB copy of the picture
+    :return: The color as #rrggbb
+    """
+    palette = sample.quantize(colors=8)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def dhash(sample) -> int:
+    """
+    The dhash function computes the difference hash of the picture: one bit per pair
+    of horizontally adjacent pixels of a tiny grayscale copy, set when the left one is brighter.
+    Re-encoding, resizing and small edits keep most bits.
+
+    :param sample: Small RGB copy of the picture
+    :return: The hash as a signed 64 bit integer, as stored in the images table
+    """
+    pixels = sample.convert("L").resize((_DHASH_SIZE + 1, _DHASH_SIZE), PILImage.LANCZOS).tobytes()
+    value = 0
+    for row in range(_DHASH_SIZE):
+        line = pixels[row * (_DHASH_SIZE + 1):(row + 1) * (_DHASH_SIZE + 1)]
+        for left, right in zip(line, line[1:]):
+            value = value << 1 | (left > right)
+
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class MetadataExtractor:
+    """
+    Runs extract in a pool of worker processes, decoding does not hold the event loop
+    or the GIL of the application process. The pool of `workers` processes, as many
+    as CPUs when omitted, is started with the application. Until then extract runs
+    in a worker thread.
+    """
+
+    def __init__(self, workers: int=None) -> None:
+        self.workers = workers
+        self._pool = None
+
+
+    def start(self) -> None:
+        if PILImage is not None and self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+
+    async def __call__(self, file) -> ImageMetadata:
+        """
+        The extractor reads the uploaded file and rewinds it for the upload that follows.
+        Large uploads are spooled to disk, the file is read in a worker thread.
+
+        :param self: Represent the instance of the class
+        :param file: Binary file object of the upload
+        :return: The metadata
+        """
+        data = await asyncio.to_thread(file.read)
+        file.seek(0)
+        if PILImage is None or self._pool is None:
+            return await asyncio.to_thread(extract, data)
+
+        return await asyncio.get_running_loop().run_in_executor(self._pool, extract, data)
+
+
+    def stop(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -1,21 +1,49 @@
+import asyncio
+from functools import lru_cache
+
 import cloudinary
 from cloudinary.uploader import upload_image, destroy
+from cloudinary.api import delete_resources, delete_resources_by_prefix, ping
 from cloudinary import CloudinaryImage
 
 
-from src.conf.config import settings
+from src.conf.config import get_settings, CloudinarySettings, DerivativeSettings
+from src.services.metrics import storage_timer
 
 
-cloudinary.config( 
-  cloud_name = settings.cloudinary.cloud_name, 
-  api_key = settings.cloudinary.api_key, 
-  api_secret = settings.cloudinary.api_secret
-)
+@lru_cache
+def configure_cloudinary(cloud_name: str, api_key: str, api_secret: str) -> None:
+    # configured on the first storage call instead of at import time
+    cloudinary.config( 
+      cloud_name = cloud_name, 
+      api_key = api_key, 
+      api_secret = api_secret
+    )
 
 DEFAULT_TAG = "avatar"
 
 class MediaCloud:
-    FOLDER = settings.cloudinary.folder
+    # Cloudinary Admin API accepts up to 100 public ids per delete_resources call
+    DELETE_BATCH_SIZE = 100
+
+    def __init__(self, config: CloudinarySettings=None, derivatives: DerivativeSettings=None) -> None:
+        """
+        The storage is built from the Cloudinary and derivative settings, read from
+        the application settings when omitted.
+
+        :param self: Represent the instance of the class
+        :param config: CloudinarySettings: Account and folder of the storage
+        :param derivatives: DerivativeSettings: Widths and formats generated at upload
+        :return: None
+        """
+        self.config = config or get_settings().cloudinary
+        self.derivative_config = derivatives or get_settings().derivatives
+        self.folder = self.config.folder
+
+
+    def configure(self) -> None:
+        configure_cloudinary(self.config.cloud_name, self.config.api_key, self.config.api_secret)
+
 
     def get_public_id(self, username: str, identifier: str):
         """
@@ -30,10 +58,51 @@ class MediaCloud:
         :doc-author: Trelent
         """
         
-        public_id = f'{self.FOLDER}/{username}/{identifier}'
+        public_id = f'{self.folder}/{username}/{identifier}'
 
         return public_id
 
+    def get_avatar_public_id(self, identifier: str) -> str:
+        """
+        The get_avatar_public_id function returns the public id of the avatar of a user.
+        
+        :param self: Represent the instance of the class
+        :param identifier: str: Username of the user
+        :return: The public_id of the avatar
+        """
+        return f'{self.folder}/avatar/{identifier}'
+
+
+    def derivatives(self) -> list[dict]:
+        """
+        The derivatives function lists the eager transformations generating the configured 
+        derivative widths at upload, in the original format and as WebP.
+        
+        :param self: Represent the instance of the class
+        :return: A list of transformation dicts
+        """
+        config = self.derivative_config
+        formats = [{}, {"format": "webp"}] if config.webp else [{}]
+
+        return [{"width": width, "crop": "limit", **format} for width in config.widths for format in formats]
+
+
+    def derivatives_of(self, result: dict) -> list[dict]:
+        """
+        The derivatives_of function reads the derivatives generated at upload from the upload response.
+        
+        :param self: Represent the instance of the class
+        :param result: dict: Upload response
+        :return: A list of dicts with width, height, format, byte_size and url
+        """
+        return [{"width": item["width"],
+                 "height": item.get("height"),
+                 "format": item["format"],
+                 "byte_size": item.get("bytes"),
+                 "url": item.get("secure_url") or item["url"]} for item in result.get("eager", [])]
+
+
+    @storage_timer("avatar_upload")
     async def avatar_upload(self, file, identifier) -> CloudinaryImage:
         """
         The avatar_upload function uploads an avatar image to Cloudinary, 
@@ -45,6 +114,8 @@ class MediaCloud:
         :return: A cloudinaryimage object
         :doc-author: Trelent
         """
+        self.configure()
+        
         options = {
                     "overwrite": True,
                     "width": 300,
@@ -53,15 +124,14 @@ class MediaCloud:
                     "format": "jpeg",
                     }
         
-        public_id = f'{self.FOLDER}/avatar/{identifier}'
-        
-        options.update({"public_id": public_id})
+        options.update({"public_id": self.get_avatar_public_id(identifier)})
         
-        image = upload_image(file, **options)
+        image = await asyncio.to_thread(upload_image, file, **options)
         
         return image
     
 
+    @storage_timer("upload")
     async def user_image_upload(self, file, public_id: str, transformations: dict=None):
         """
         The user_image_upload function uploads an image to Cloudinary.
@@ -77,16 +147,20 @@ class MediaCloud:
         :return: A dict with the following keys:
         :doc-author: Trelent
         """
+        self.configure()
         
-        options = {"public_id": public_id}
+        # derivatives are generated with the upload, their urls come back in the response.
+        # The call lasts for the original and every rendition, it runs in a worker thread
+        options = {"public_id": public_id, "eager": self.derivatives()}
         if transformations:
             options.update(transformations)
         
-        image = upload_image(file, **options)
+        image = await asyncio.to_thread(upload_image, file, **options)
         
         return image
 
 
+    @storage_timer("remove")
     async def remove_media(self, public_id: str):
         """
         The remove_media function is used to remove a media file from Cloudinary.
@@ -96,24 +170,89 @@ class MediaCloud:
         :param public_id: str: Specify the public id of the media to be removed
         :return: response object
         """
-        result = destroy(public_id)
+        self.configure()
+        
+        result = await asyncio.to_thread(destroy, public_id)
         
         return result
+
+
+    @storage_timer("remove_many")
+    async def remove_media_many(self, public_ids: list[str]) -> list[dict]:
+        """
+        The remove_media_many function removes a set of media files from Cloudinary
+        with as few Admin API calls as possible, sending public ids in batches.
+        Calls are made in a worker thread so the event loop is not blocked.
+        
+        :param self: Represent the instance of a class
+        :param public_ids: list[str]: Public ids of the media to be removed
+        :return: A list of response objects, one per batch
+        """
+        self.configure()
+        
+        results = []
+        for start in range(0, len(public_ids), self.DELETE_BATCH_SIZE):
+            batch = public_ids[start:start + self.DELETE_BATCH_SIZE]
+            results.append(await asyncio.to_thread(delete_resources, batch))
+
+        return results
+
+
+    @storage_timer("remove_by_prefix")
+    async def remove_media_by_prefix(self, prefix: str) -> dict:
+        """
+        The remove_media_by_prefix function removes every media file whose public id 
+        starts with the given prefix, e.g. all images of a single user. Cloudinary removes
+        up to 1000 files per call and answers partial while more remain, the calls are
+        repeated until none is left.
+        
+        :param self: Represent the instance of a class
+        :param prefix: str: Public id prefix of the media to be removed
+        :return: response object with the files deleted by all the calls
+        """
+        self.configure()
+        
+        deleted = {}
+        options = {}
+        while True:
+            result = await asyncio.to_thread(delete_resources_by_prefix, prefix, **options)
+            deleted.update(result.get("deleted", {}))
+            if not result.get("partial"):
+                break
+            if not result.get("deleted") and not result.get("next_cursor"):
+                # nothing removed and nowhere to continue from, the caller retries later
+                raise RuntimeError(f"Removal of the media under {prefix!r} made no progress")
+            options = {"next_cursor": result["next_cursor"]} if result.get("next_cursor") else {}
+
+        return {**result, "deleted": deleted}
     
 
+    @storage_timer("ping")
+    async def ping(self) -> dict:
+        """
+        The ping function checks that Cloudinary is reachable and the credentials are accepted.
+        
+        :param self: Represent the instance of a class
+        :return: response object
+        """
+        self.configure()
+        
+        result = await asyncio.to_thread(ping)
+
+        return result
+    
+
+    @storage_timer("transform")
     async def image_transform(self, 
                               url: str, 
                               transformations: dict, 
                               new_public_id: str=None) -> CloudinaryImage:
+        self.configure()
+        
         transformations.update({"overwrite": False,
-                                "public_id": new_public_id})
+                                "public_id": new_public_id,
+                                "eager": self.derivatives()})
         
-        image = upload_image(url, **transformations)
+        image = await asyncio.to_thread(upload_image, url, **transformations)
         
         return image
-
-storage = MediaCloud()
-        
-
-
-
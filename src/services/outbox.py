@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from itertools import groupby
+
+from sqlalchemy.orm import sessionmaker
+
+from ..conf.config import OutboxSettings
+from ..models.outbox import StorageAction
+from ..repository.base_repository import run_in_thread
+from ..repository.outbox import StorageOutbox
+from .media_storage import MediaCloud
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """
+    Background worker that performs storage operations staged in the outbox table.
+    Removals are sent to the storage in batches, failures are retried with
+    exponential backoff. The database work runs in worker threads.
+    """
+
+    def __init__(self, session_factory: sessionmaker, storage: MediaCloud, config: OutboxSettings) -> None:
+        self.session_factory = session_factory
+        self.storage = storage
+        self.config = config
+        self._task = None
+
+
+    async def dispatch_once(self) -> int:
+        """
+        The dispatch_once method runs one batch of due tasks.
+
+        :param self: Represent the instance of the class
+        :return: Number of tasks that were picked up
+        """
+        with self.session_factory() as db:
+            outbox = StorageOutbox(db)
+            # the queries run in a worker thread, the rows stay locked across the storage calls
+            tasks = await run_in_thread(db, outbox.get_due(self.config.batch_size))
+
+            for action, group in groupby(sorted(tasks, key=lambda t: t.action.value), key=lambda t: t.action):
+                group = list(group)
+                try:
+                    await self._perform(action, [task.target for task in group])
+                except Exception as err:
+                    logger.warning("Storage %s failed for %d task(s): %s", action.value, len(group), err)
+                    await outbox.retry(group,
+                                       str(err),
+                                       max_attempts=self.config.max_attempts,
+                                       backoff_base=self.config.backoff_base,
+                                       backoff_max=self.config.backoff_max)
+                    continue
+
+                for task in group:
+                    await outbox.delete(task)
+
+            await asyncio.to_thread(db.commit)
+
+        return len(tasks)
+
+
+    async def _perform(self, action: StorageAction, targets: [str]) -> None:
+        if action == StorageAction.remove:
+            await self.storage.remove_media_many(targets)
+        elif action == StorageAction.remove_prefix:
+            for prefix in targets:
+                await self.storage.remove_media_by_prefix(prefix)
+        else:
+            raise ValueError(f"Unknown storage action {action}")
+
+
+    async def run(self) -> None:
+        """
+        The run method polls the outbox until cancelled. A full batch is followed
+        immediately by the next one, otherwise the dispatcher sleeps for poll_interval.
+
+        :param self: Represent the instance of the class
+        :return: Nothing
+        """
+        while True:
+            try:
+                processed = await self.dispatch_once()
+            except Exception as err:
+                logger.exception("Outbox dispatch failed: %s", err)
+                processed = 0
+
+            if processed < self.config.batch_size:
+                await asyncio.sleep(self.config.poll_interval)
+
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,37 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException, status
+
+
+def encode_cursor(*values) -> str:
+    """
+    The encode_cursor function packs the sort key of the last row of a page
+    into an opaque, url safe string.
+
+    :param values: Sort key values, datetimes are kept as ISO strings
+    :return: The cursor string
+    """
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """
+    The decode_cursor function unpacks a cursor produced by encode_cursor.
+
+    :param cursor: str: The cursor string
+    :param types: Expected type of each value, datetime values are parsed from ISO strings
+    :return: A tuple with the sort key values
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(values) != len(types):
+            raise ValueError("Cursor length mismatch")
+
+        return tuple(datetime.fromisoformat(value) if kind is datetime else kind(value)
+                     for kind, value in zip(types, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid cursor")
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..conf.config import PurgeSettings
+from ..models.comment import Comment
+from ..models.image import Image, ImageDerivative, image_m2m_tag
+from ..models.outbox import StorageAction
+from ..models.user import User
+from ..repository.base_repository import run_in_thread
+from ..repository.outbox import StorageOutbox
+from ..repository.tags import Tags
+from ..repository.versions import CollectionVersions, comments_key, images_keys
+from ..repository.comment_events import CommentEvents
+from .cache import get_cache, image_entry, shared_entry, comments_entry
+from .duplicate_index import DuplicateIndex
+from .media_storage import MediaCloud
+
+
+logger = logging.getLogger(__name__)
+
+
+class AccountPurger:
+    """
+    Background worker removing the accounts marked as deleted by UserRepository.delete.
+    Images and comments are deleted in short transactions of batch_size rows, then
+    the storage folder and avatar of the user are removed and the user row is deleted.
+    Tags left unused by a batch of images are deleted with it. Every step can be repeated,
+    a purge interrupted by a failure or a restart is resumed by the next poll. The database
+    work runs in worker threads, requests are served meanwhile.
+    """
+
+    def __init__(self, session_factory: sessionmaker, storage: MediaCloud, duplicate_index: DuplicateIndex,
+                 config: PurgeSettings) -> None:
+        self.session_factory = session_factory
+        self.storage = storage
+        self.duplicate_index = duplicate_index
+        self.config = config
+        self._task = None
+
+
+    async def _in_thread(self, step, *args):
+        with self.session_factory() as db:
+            return await run_in_thread(db, step(db, *args))
+
+
+    async def purge_once(self) -> int:
+        """
+        The purge_once method purges the accounts marked so far, oldest first.
+
+        :param self: Represent the instance of the class
+        :return: Number of purged accounts
+        """
+        user_ids = await self._in_thread(self._marked)
+        for user_id in user_ids:
+            await self.purge(user_id)
+
+        return len(user_ids)
+
+
+    async def purge(self, user_id: int) -> None:
+        """
+        The purge method removes the account, its images, comments and storage objects.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of an account marked as deleted
+        :return: Nothing
+        """
+        account = await self._in_thread(self._account, user_id)
+        if account is None:
+            return
+        username, avatar = account
+
+        # the trailing separator keeps the folders of users named alike
+        folder = self.storage.get_public_id(username, "")
+        # a user named like the avatar folder shares it with every avatar, 
+        # its images are removed one by one instead
+        by_prefix = folder != self.storage.get_avatar_public_id("")
+
+        while rows := await self._in_thread(self._delete_images, user_id, username, by_prefix):
+            for row in rows:
+                if row.dhash is not None:
+                    self.duplicate_index.remove(row.dhash, row.id)
+            await get_cache().invalidate(*(key for row in rows for key in (image_entry(row.id), 
+                                                                           shared_entry(row.identifier), 
+                                                                           comments_entry(row.id))))
+        while rows := await self._in_thread(self._delete_comments, user_id):
+            await get_cache().invalidate(*(key for row in rows if row.image_id is not None
+                                           for key in (image_entry(row.image_id), comments_entry(row.image_id))))
+
+        # the marked row keeps the username taken, a new account of the same name cannot
+        # upload under the folder or avatar before they are gone. A failure is retried by the next poll
+        if by_prefix:
+            await self.storage.remove_media_by_prefix(folder)
+        if avatar:
+            await self.storage.remove_media_many([self.storage.get_avatar_public_id(username)])
+        await self._in_thread(self._delete_account, user_id)
+
+        logger.info("Purged account %d", user_id)
+
+
+    async def _marked(self, db: Session) -> list[int]:
+        return db.scalars(select(User.id)
+                          .where(User.deleted_at.is_not(None))
+                          .order_by(User.deleted_at)
+                          .limit(self.config.batch_size)).all()
+
+
+    async def _account(self, db: Session, user_id: int) -> tuple[str, str] | None:
+        user = db.get(User, user_id)
+        if user is None or user.deleted_at is None:
+            return None
+
+        return user.username, user.avatar
+
+
+    async def _delete_images(self, db: Session, user_id: int, username: str, by_prefix: bool) -> list:
+        # a concurrent purge of the same account skips the locked rows
+        rows = db.execute(select(Image.id, Image.identifier, Image.dhash)
+                          .where(Image.user_id == user_id)
+                          .order_by(Image.id)
+                          .limit(self.config.batch_size)
+                          .with_for_update(skip_locked=True)).all()
+        ids = [row.id for row in rows]
+        if not ids:
+            return []
+
+        tag_ids = db.scalars(select(image_m2m_tag.c.tag_id)
+                             .where(image_m2m_tag.c.image_id.in_(ids))
+                             .distinct()).all()
+        db.execute(delete(image_m2m_tag).where(image_m2m_tag.c.image_id.in_(ids)))
+        # cleaned with the batch, a purge resumed after a failure finds no images left to collect them from
+        await Tags(db).delete_unused_by_ids(tag_ids)
+        db.execute(delete(ImageDerivative).where(ImageDerivative.image_id.in_(ids)))
+        # comments of other users stay, like for Images.delete_many
+        db.execute(update(Comment).where(Comment.image_id.in_(ids)).values(image_id=None))
+        db.execute(delete(Image).where(Image.id.in_(ids)))
+        await CollectionVersions(db).bump(*images_keys(user_id), *map(comments_key, ids))
+        if not by_prefix:
+            await StorageOutbox(db).create_many(StorageAction.remove, 
+                                                [self.storage.get_public_id(username, row.identifier) 
+                                                 for row in rows])
+        db.commit()
+
+        return rows
+
+
+    async def _delete_comments(self, db: Session, user_id: int) -> list:
+        rows = db.execute(select(Comment.id, Comment.image_id, Image.user_id)
+                          .outerjoin(Image, Image.id == Comment.image_id)
+                          .where(Comment.user_id == user_id)
+                          .limit(self.config.batch_size)).all()
+        if not rows:
+            return []
+
+        image_ids = {row.image_id for row in rows if row.image_id is not None}
+        db.execute(delete(Comment).where(Comment.id.in_([row.id for row in rows])))
+        # the commented images are listed with their comments
+        keys = {key for row in rows if row.image_id is not None 
+                for key in (comments_key(row.image_id), *images_keys(row.user_id))}
+        versions = await CollectionVersions(db).bump(*keys)
+        # the streams of the images reload their comments
+        for image_id in image_ids:
+            await CommentEvents(db).create(image_id, versions[comments_key(image_id)], "reset", "{}")
+        db.commit()
+
+        return rows
+
+
+    async def _delete_account(self, db: Session, user_id: int) -> None:
+        db.execute(delete(User).where(User.id == user_id))
+        db.commit()
+
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.purge_once()
+            except Exception as err:
+                logger.exception("Account purge failed: %s", err)
+            await asyncio.sleep(self.config.poll_interval)
+
+
+    def start(self) -> None:
+        if self.config.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
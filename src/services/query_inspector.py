@@ -0,0 +1,173 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_PLACEHOLDER_LIST = re.compile(r"\?(\s*,\s*\?)+")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    The statement_shape function normalizes a statement so that executions differing
+    only by parameters, including the length of expanded IN lists, compare equal.
+
+    :param statement: str: SQL text as sent to the driver
+    :return: The normalized statement
+    """
+    shape = _PLACEHOLDER.sub("?", statement)
+    shape = _PLACEHOLDER_LIST.sub("?", shape)
+
+    return _SPACES.sub(" ", shape).strip()
+
+
+@dataclass
+class QueryLog:
+    entries: list = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, statement: str, parameters, duration: float) -> None:
+        self.entries.append((statement, parameters, duration))
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        The repeated method returns statement shapes executed at least threshold times,
+        which is how lazy loads in a loop (N+1) show up.
+
+        :param self: Represent the instance of the class
+        :param threshold: int: Minimal number of executions to report
+        :return: A list of (shape, count) pairs, most frequent first
+        """
+        shapes = Counter(statement_shape(statement) for statement, _, _ in self.entries)
+
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+    def summary(self) -> str:
+        lines = [f"{len(self.entries)} queries:"]
+        lines.extend(f"  [{duration * 1000:.1f} ms] {statement_shape(statement)}"
+                     for statement, _, duration in self.entries)
+
+        return "\n".join(lines)
+
+
+_current_log: ContextVar[QueryLog | None] = ContextVar("query_inspector_log", default=None)
+
+
+class QueryInspector:
+    """
+    Opt-in development aid that records the statements of each request, warns about
+    repeated statement shapes (N+1 patterns) and logs slow queries with their parameters.
+    """
+
+    def __init__(self, slow_ms: float=100, repeat_threshold: int=5) -> None:
+        self.slow_ms = slow_ms
+        self.repeat_threshold = repeat_threshold
+
+
+    def install(self, engine: Engine) -> None:
+        if not event.contains(engine, "before_cursor_execute", self._before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+
+    def uninstall(self, engine: Engine) -> None:
+        if event.contains(engine, "before_cursor_execute", self._before_cursor_execute):
+            event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_inspector_start", []).append(time.perf_counter())
+
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_inspector_start"].pop()
+
+        if duration * 1000 >= self.slow_ms:
+            logger.warning("Slow query (%.1f ms): %s; parameters: %r", duration * 1000, statement, parameters)
+
+        log = _current_log.get()
+        if log is not None:
+            log.add(statement, parameters, duration)
+
+
+    @contextmanager
+    def track(self):
+        """
+        The track method collects statements executed in the current context
+        (an HTTP request, a test) into a QueryLog.
+
+        :param self: Represent the instance of the class
+        :return: The query log
+        """
+        log = QueryLog()
+        token = _current_log.set(log)
+        try:
+            yield log
+        finally:
+            _current_log.reset(token)
+
+
+    def report(self, log: QueryLog, label: str) -> None:
+        for shape, count in log.repeated(self.repeat_threshold):
+            logger.warning("Possible N+1 in %s: statement executed %d times: %s", label, count, shape)
+
+
+class QueryInspectorMiddleware:
+    """
+    ASGI middleware that reports repeated statements per request.
+    """
+
+    def __init__(self, app, inspector: QueryInspector) -> None:
+        self.app = app
+        self.inspector = inspector
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with self.inspector.track() as log:
+            await self.app(scope, receive, send)
+
+        route = scope.get("route")
+        label = f'{scope["method"]} {getattr(route, "path", scope["path"])}'
+        self.inspector.report(log, label)
+
+
+@contextmanager
+def capture_queries(engine: Engine):
+    """
+    The capture_queries function records every statement executed through the engine
+    while the block runs, regardless of the thread or task it is executed from.
+    Meant for tests, where the application may run in another thread.
+
+    :param engine: Engine: Engine to listen to
+    :return: The query log
+    """
+    log = QueryLog()
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["capture_queries_start"] = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        log.add(statement, parameters, time.perf_counter() - conn.info.pop("capture_queries_start"))
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    try:
+        yield log
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+        event.remove(engine, "after_cursor_execute", after)
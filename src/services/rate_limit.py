@@ -0,0 +1,146 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from ..conf.config import get_settings, settings_cache
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # pragma: no cover - only the memory backend is available
+    aioredis = None
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Bucket:
+    """
+    Token bucket: holds up to capacity tokens, refilled at rate tokens per second.
+    """
+    capacity: int
+    rate: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Bucket":
+        """
+        The parse method reads a bucket written as "capacity/seconds",
+        "10/60" allows bursts of 10 requests and 10 requests per minute on average.
+
+        :param value: str: Bucket description from the settings
+        :return: The bucket
+        """
+        capacity, seconds = value.split("/")
+        capacity, seconds = int(capacity), float(seconds)
+        if capacity < 1 or seconds <= 0:
+            raise ValueError(f"Invalid rate limit {value!r}")
+
+        return cls(capacity, capacity / seconds)
+
+
+class MemoryBuckets:
+    """
+    Buckets kept in the worker process, each worker limits on its own.
+    """
+
+    def __init__(self, max_keys: int, clock=time.monotonic) -> None:
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+
+
+    async def take(self, key: str, bucket: Bucket) -> float:
+        """
+        The take method takes one token from the bucket stored under key.
+
+        :param self: Represent the instance of the class
+        :param key: str: Bucket key, route name and client
+        :param bucket: Bucket: Capacity and refill rate
+        :return: 0 when the token was taken, otherwise the seconds until one is available
+        """
+        now = self.clock()
+        tokens, updated = self._buckets.pop(key, (bucket.capacity, now))
+        tokens = min(bucket.capacity, tokens + (now - updated) * bucket.rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / bucket.rate
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        return wait
+
+
+# refill and take in one round trip, atomic across workers; the Redis clock is used so
+# workers with skewed clocks share the same buckets. The key expires once it would be full.
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """
+    Buckets shared by all workers through Redis.
+    A Redis failure lets the request through, the limiter never takes the API down.
+    """
+
+    def __init__(self, client, prefix: str) -> None:
+        self.prefix = prefix
+        self._take = client.register_script(TAKE_SCRIPT)
+
+
+    async def take(self, key: str, bucket: Bucket) -> float:
+        """
+        The take method takes one token from the bucket stored under key.
+
+        :param self: Represent the instance of the class
+        :param key: str: Bucket key, route name and client
+        :param bucket: Bucket: Capacity and refill rate
+        :return: 0 when the token was taken, otherwise the seconds until one is available
+        """
+        try:
+            wait = await self._take(keys=[f"{self.prefix}:{key}"], args=[bucket.capacity, bucket.rate])
+        except Exception as err:
+            logger.warning("Rate limit backend unavailable: %s", err)
+            return 0.0
+
+        return float(wait)
+
+
+@settings_cache
+def get_buckets():
+    """
+    The get_buckets function creates the configured backend on first use.
+
+    :return: MemoryBuckets or RedisBuckets
+    """
+    config = get_settings().rate_limit
+    if config.backend == "memory":
+        return MemoryBuckets(config.max_keys)
+    if config.backend == "redis":
+        if aioredis is None:
+            raise RuntimeError("The redis rate limit backend requires the redis package")
+        return RedisBuckets(aioredis.from_url(config.redis_url), config.key_prefix)
+
+    raise ValueError(f"Unknown rate limit backend {config.backend!r}")
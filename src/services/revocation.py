@@ -0,0 +1,170 @@
+import logging
+import time
+
+from ..conf.config import get_settings, settings_cache
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # pragma: no cover - only the memory backend is available
+    aioredis = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryRevocations:
+    """
+    Lowest accepted token version of the users whose tokens were revoked, kept in the
+    worker process. Entries expire with the access tokens they revoke. Revocations made
+    by other workers or before a restart are not seen here, so the backend only rejects
+    tokens early and every other token is still checked against the users table.
+    """
+    shared = False
+
+    def __init__(self, ttl: float, clock=time.monotonic) -> None:
+        self.ttl = ttl
+        self.clock = clock
+        self._versions = {}
+
+
+    async def remember(self, user_id: int, version: int) -> None:
+        # tokens are checked against the users table, issued versions are not needed
+        pass
+
+
+    async def suspend(self, user_id: int) -> None:
+        # nothing is trusted without the users table, there is nothing to suspend
+        pass
+
+
+    async def revoke(self, user_id: int, version: int) -> None:
+        """
+        The revoke method rejects the access tokens of the user with a lower version.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :param version: int: Current token version of the user
+        :return: Nothing
+        """
+        self._versions[user_id] = (version, self.clock() + self.ttl)
+
+
+    async def min_version(self, user_id: int) -> int | None:
+        """
+        The min_version method returns the lowest accepted token version of the user.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :return: The version, None when this worker revoked no token of the user
+        """
+        version, expires = self._versions.get(user_id, (None, None))
+        if expires is not None and expires <= self.clock():
+            del self._versions[user_id]
+            return None
+
+        return version
+
+
+class RedisRevocations:
+    """
+    Lowest accepted token version of every user with a live token, shared by all workers
+    through Redis. The version is remembered when a token is issued. A change revoking
+    tokens suspends the entry before its transaction commits and writes the new version
+    after, so a failed write leaves the user suspended instead of trusting old claims.
+    Missing, evicted and suspended entries and an unreachable Redis make tokens to be
+    checked against the users table.
+    """
+    shared = True
+    # value of a suspended entry, no token is trusted without the users table
+    SUSPENDED = -1
+
+    def __init__(self, client, prefix: str, ttl: float) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+
+    async def remember(self, user_id: int, version: int) -> None:
+        """
+        The remember method records the version of a token being issued, unless the user
+        already has an entry. A suspension or a newer revocation is never overwritten.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :param version: int: Token version of the user
+        :return: Nothing
+        """
+        try:
+            await self.client.set(f"{self.prefix}:{user_id}", version, ex=int(self.ttl), nx=True)
+        except Exception as err:
+            # the tokens of the user are checked against the users table
+            logger.warning("Revocation backend unavailable: %s", err)
+
+
+    async def suspend(self, user_id: int) -> None:
+        """
+        The suspend method stops trusting the tokens of the user before a change revoking
+        them commits. Errors are raised, the change must not commit without it.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :return: Nothing
+        """
+        await self.client.set(f"{self.prefix}:{user_id}", self.SUSPENDED, ex=int(self.ttl))
+
+
+    async def revoke(self, user_id: int, version: int) -> None:
+        """
+        The revoke method rejects the access tokens of the user with a lower version,
+        once the change revoking them committed.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :param version: int: Current token version of the user
+        :return: Nothing
+        """
+        try:
+            await self.client.set(f"{self.prefix}:{user_id}", version, ex=int(self.ttl))
+        except Exception as err:
+            # the entry stays suspended, tokens are checked against the users table
+            logger.warning("Revocation backend unavailable: %s", err)
+
+
+    async def min_version(self, user_id: int) -> int | None:
+        """
+        The min_version method returns the lowest accepted token version of the user.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :return: The version, None when the tokens of the user must be checked against the users table
+        """
+        try:
+            version = await self.client.get(f"{self.prefix}:{user_id}")
+        except Exception as err:
+            logger.warning("Revocation backend unavailable: %s", err)
+            return None
+
+        if version is None or int(version) == self.SUSPENDED:
+            return None
+
+        return int(version)
+
+
+@settings_cache
+def get_revocations():
+    """
+    The get_revocations function creates the configured backend on first use.
+
+    :return: MemoryRevocations or RedisRevocations
+    """
+    config = get_settings().auth
+    # an entry is useless once the tokens it revokes have expired
+    ttl = config.access_token_expire_minutes * 60
+    if config.revocation_backend == "memory":
+        return MemoryRevocations(ttl)
+    if config.revocation_backend == "redis":
+        if aioredis is None:
+            raise RuntimeError("The redis revocation backend requires the redis package")
+        return RedisRevocations(aioredis.from_url(config.redis_url), config.key_prefix, ttl)
+
+    raise ValueError(f"Unknown revocation backend {config.revocation_backend!r}")
@@ -0,0 +1,59 @@
+import json
+from dataclasses import fields, is_dataclass
+from datetime import date, datetime
+from enum import Enum
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the stdlib encoder is used instead
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if is_dataclass(value):
+        return {field.name: getattr(value, field.name) for field in fields(value)}
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """
+    The dumps function encodes plain payloads (dicts, lists, dataclasses, datetimes, enums) to JSON,
+    with orjson when it is installed.
+
+    :param content: Payload to encode
+    :return: UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes):
+    """
+    The loads function decodes JSON produced by dumps, datetimes and enums come back as strings.
+
+    :param data: bytes: UTF-8 encoded JSON
+    :return: The payload
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for payloads that are already shaped like the response model.
+    Routes returning it skip response model validation, the response_model of the
+    route is still used for the OpenAPI schema.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
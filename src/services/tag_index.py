@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import logging
+from bisect import bisect_left, insort
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from ..conf.config import TagIndexSettings
+from ..models.image import Tag, image_m2m_tag
+
+
+logger = logging.getLogger(__name__)
+
+# sorts after any character a tag name can hold, closes the range of a prefix
+_PREFIX_END = "\U0010ffff"
+
+
+class TagIndex:
+    """
+    In-process prefix index of tag names with the number of images using each tag.
+
+    Names are kept in a sorted list of lowercased keys, so the tags matching a prefix
+    are one contiguous slice found with two binary searches. The index is loaded from
+    the tags table at startup, follows Tags.create and Tags.delete in this process and
+    is reloaded periodically to pick up tags of other workers and usage counts.
+    """
+
+    def __init__(self, session_factory: sessionmaker, config: TagIndexSettings) -> None:
+        self.session_factory = session_factory
+        self.config = config
+        self.ready = False
+        self._keys = []
+        self._names = {}
+        self._counts = {}
+        self._task = None
+
+
+    def load(self, rows) -> None:
+        """
+        The load method replaces the content of the index.
+
+        :param self: Represent the instance of the class
+        :param rows: Iterable of (name, usage count) pairs
+        :return: Nothing
+        """
+        names, counts = {}, {}
+        for name, count in rows:
+            key = name.lower()
+            names[key] = name
+            counts[key] = count
+
+        # swapped in one go, suggestions never see a half built index
+        self._keys, self._names, self._counts = sorted(names), names, counts
+        self.ready = True
+
+
+    def _read_tags(self) -> list[tuple[str, int]]:
+        with self.session_factory() as db:
+            usage = (select(Tag.name, func.count(image_m2m_tag.c.image_id))
+                     .outerjoin(image_m2m_tag, image_m2m_tag.c.tag_id == Tag.id)
+                     .group_by(Tag.id, Tag.name))
+            return db.execute(usage).all()
+
+
+    async def refresh(self) -> None:
+        self.load(await asyncio.to_thread(self._read_tags))
+
+
+    def add(self, name: str) -> None:
+        key = name.lower()
+        if key in self._names:
+            return
+
+        insort(self._keys, key)
+        self._names[key] = name
+        self._counts[key] = 0
+
+
+    def remove(self, name: str) -> None:
+        key = name.lower()
+        if self._names.pop(key, None) is None:
+            return
+
+        self._counts.pop(key, None)
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+
+
+    def suggest(self, prefix: str, limit: int) -> list[dict]:
+        """
+        The suggest method returns the most used tags starting with the prefix,
+        ties are broken alphabetically. Matching is case insensitive.
+
+        :param self: Represent the instance of the class
+        :param prefix: str: Beginning of the tag name
+        :param limit: int: Maximal number of suggestions
+        :return: A list of dicts with name and count
+        """
+        key = prefix.lower()
+        start = bisect_left(self._keys, key)
+        end = bisect_left(self._keys, key + _PREFIX_END, lo=start)
+        counts = self._counts
+        best = heapq.nsmallest(limit, self._keys[start:end], key=lambda match: (-counts[match], match))
+
+        return [{"name": self._names[match], "count": counts[match]} for match in best]
+
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as err:
+                logger.exception("Tag index refresh failed: %s", err)
+            await asyncio.sleep(self.config.refresh_interval)
+
+
+    def start(self) -> None:
+        if self.config.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
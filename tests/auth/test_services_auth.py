@@ -3,13 +3,15 @@ from unittest.mock import MagicMock, patch
 
 from fastapi import HTTPException
 
-from src.models.user import User
+from src.models.user import User, Role
 from src.services.auth import (
                                verify_password, 
                                create_refresh_token, 
                                create_access_token,
+                               access_claims,
                                get_user_by_refresh_token,
                                get_current_user)
+from src.services.revocation import MemoryRevocations, RedisRevocations
 from src.services.hash_handler import hash_password
 
 token_data = {"sub": "test_user"}
@@ -80,6 +82,16 @@ class TestAuth(unittest.IsolatedAsyncioTestCase):
             await get_user_by_refresh_token(token)
 
     
+    @patch("src.services.auth.UserRepository.get_username")
+    async def test_get_user_by_refresh_token_deleted(self, user_repo):
+        user_repo.return_value = None
+        token = create_refresh_token(token_data)
+        with self.assertRaises(HTTPException) as err:
+            await get_user_by_refresh_token(token)
+
+        self.assertEqual(err.exception.status_code, 401)
+
+    
     @patch("src.services.auth.UserRepository.get_username")
     async def test_get_user_by_refresh_token_ban(self, user_repo):
         self.user.ban = True
@@ -91,6 +103,185 @@ class TestAuth(unittest.IsolatedAsyncioTestCase):
         self.user.ban = False
 
 
+
+class SharedRevocations(MemoryRevocations):
+    """
+    Stands in for a backend shared by all workers: a user without revocation is known.
+    """
+    shared = True
+
+    async def min_version(self, user_id: int) -> int | None:
+        version = await super().min_version(user_id)
+        return 0 if version is None else version
+
+
+class TestAccessClaims(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.user = User(**fake_user, token_version=2)
+        self.revocations = SharedRevocations(ttl=60)
+        patcher = patch("src.services.auth.get_revocations", return_value=self.revocations)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def test_access_claims(self):
+        self.assertEqual(access_claims(self.user), {"sub": "test_user", "uid": 1, "role": "admin", "ver": 2})
+
+
+    @patch("src.services.auth.UserRepository.get_username")
+    async def test_claims_skip_database(self, user_repo):
+        token = create_access_token(access_claims(self.user))
+        cur_user = await get_current_user(token=token)
+
+        user_repo.assert_not_called()
+        self.assertEqual((cur_user.id, cur_user.username, cur_user.role), (1, "test_user", Role.admin))
+
+
+    @patch("src.services.auth.UserRepository.get_username")
+    async def test_revoked(self, user_repo):
+        token = create_access_token(access_claims(self.user))
+        await self.revocations.revoke(self.user.id, 3)
+
+        with self.assertRaises(HTTPException) as err:
+            await get_current_user(token=token)
+        self.assertEqual(err.exception.detail, "Token revoked")
+
+        self.user.token_version = 3
+        cur_user = await get_current_user(token=create_access_token(access_claims(self.user)))
+        self.assertEqual(cur_user.id, self.user.id)
+        user_repo.assert_not_called()
+
+
+    @patch("src.services.auth.UserRepository.get_username")
+    async def test_unknown_revocations_check_database(self, user_repo):
+        token = create_access_token(access_claims(self.user))
+        self.user.token_version = 3
+        user_repo.return_value = self.user
+
+        with patch.object(self.revocations, "min_version", return_value=None):
+            with self.assertRaises(HTTPException) as err:
+                await get_current_user(token=token)
+        self.assertEqual(err.exception.detail, "Token revoked")
+        user_repo.assert_awaited_once()
+
+
+    @patch("src.services.auth.UserRepository.get_username")
+    async def test_worker_revocations_check_database(self, user_repo):
+        revocations = MemoryRevocations(ttl=60)
+        token = create_access_token(access_claims(self.user))
+        # banned by another worker
+        user_repo.return_value = User(**fake_user, token_version=3, ban=True)
+
+        with patch("src.services.auth.get_revocations", return_value=revocations):
+            with self.assertRaises(HTTPException) as err:
+                await get_current_user(token=token)
+            self.assertEqual(err.exception.detail, "User is banned")
+
+            await revocations.revoke(self.user.id, 3)
+            with self.assertRaises(HTTPException) as err:
+                await get_current_user(token=token)
+        self.assertEqual(err.exception.detail, "Token revoked")
+        user_repo.assert_awaited_once()
+
+
+    async def test_revocations_expire(self):
+        clock = MagicMock(return_value=100.0)
+        revocations = MemoryRevocations(ttl=60, clock=clock)
+        await revocations.revoke(1, 3)
+        self.assertEqual(await revocations.min_version(1), 3)
+        self.assertIsNone(await revocations.min_version(2))
+
+        clock.return_value = 160.0
+        self.assertIsNone(await revocations.min_version(1))
+
+
+class FakeRedis:
+    """
+    In-process stand-in for the SET and GET commands of a Redis client.
+    """
+
+    def __init__(self) -> None:
+        self.values = {}
+        self.fail = False
+
+
+    async def set(self, key: str, value, ex: int=None, nx: bool=False):
+        if self.fail:
+            raise ConnectionError("redis is down")
+        if nx and key in self.values:
+            return None
+        self.values[key] = str(value).encode()
+        return True
+
+
+    async def get(self, key: str):
+        if self.fail:
+            raise ConnectionError("redis is down")
+        return self.values.get(key)
+
+
+class TestRedisRevocations(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.user = User(**fake_user, token_version=2)
+        self.client = FakeRedis()
+        self.revocations = RedisRevocations(self.client, "token_version", ttl=60)
+        patcher = patch("src.services.auth.get_revocations", return_value=self.revocations)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    @patch("src.services.auth.UserRepository.get_username")
+    async def test_missing_key_checks_database(self, user_repo):
+        token = create_access_token(access_claims(self.user))
+        # banned, the entry was evicted
+        user_repo.return_value = User(**fake_user, token_version=3, ban=True)
+
+        self.assertIsNone(await self.revocations.min_version(self.user.id))
+        with self.assertRaises(HTTPException) as err:
+            await get_current_user(token=token)
+        self.assertEqual(err.exception.detail, "User is banned")
+
+
+    @patch("src.services.auth.UserRepository.get_username")
+    async def test_remembered_version_skips_database(self, user_repo):
+        await self.revocations.remember(self.user.id, 2)
+        # a remembered version never overwrites a newer one
+        await self.revocations.remember(self.user.id, 1)
+
+        cur_user = await get_current_user(token=create_access_token(access_claims(self.user)))
+
+        self.assertEqual(cur_user.id, self.user.id)
+        user_repo.assert_not_called()
+
+
+    @patch("src.services.auth.UserRepository.get_username")
+    async def test_failed_revoke_stays_suspended(self, user_repo):
+        await self.revocations.remember(self.user.id, 2)
+        token = create_access_token(access_claims(self.user))
+        user_repo.return_value = User(**fake_user, token_version=3, ban=True)
+
+        await self.revocations.suspend(self.user.id)
+        self.client.fail = True
+        with self.assertLogs("src.services.revocation", "WARNING"):
+            await self.revocations.revoke(self.user.id, 3)
+        self.client.fail = False
+        await self.revocations.remember(self.user.id, 2)
+
+        with self.assertRaises(HTTPException) as err:
+            await get_current_user(token=token)
+        self.assertEqual(err.exception.detail, "User is banned")
+        user_repo.assert_awaited_once()
+
+
+    async def test_failed_suspend_raises(self):
+        self.client.fail = True
+
+        with self.assertRaises(ConnectionError):
+            await self.revocations.suspend(self.user.id)
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -1,17 +1,25 @@
 import asyncio
 import unittest
+from datetime import datetime, timedelta
 from unittest.mock import MagicMock
-from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
 
 from src.models.comment import Comment
 from src.models.user import User, Role
 from src.repository.comments import CommentsRepo
+from src.schemas.comment_example import Comment as CommentSchema
 from src.models.image import Image
+from src.dependencies.db import Base
 
 fake_user_data = {"id": 1, "username": "testuser", "email": "test@example.com", "role": Role.user}
 fake_comment_data = {"id": 1, "body": "Test comment", "image_id": 1, "user_id": 1}
 fake_image_data = {"id": 1, "url": "www.ttt.com/folder/image.jpeg", "description": "A sample image", "user_id": 1}
 
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
 
 class TestCommentsRepo(unittest.IsolatedAsyncioTestCase):
 
@@ -46,7 +54,8 @@ class TestCommentsRepo(unittest.IsolatedAsyncioTestCase):
         result = await self.comments_repo.update(self.mock_image.id, self.mock_comment.id, updated_body)
 
         self.assertEqual(result.body, updated_body)
-        self.mock_session.commit.assert_called_once()
+        self.mock_session.flush.assert_called_once()
+        self.mock_session.commit.assert_not_called()
 
     async def test_delete_comment(self):
         self.mock_session.query().filter().first.return_value = self.mock_comment
@@ -55,15 +64,17 @@ class TestCommentsRepo(unittest.IsolatedAsyncioTestCase):
 
         self.assertTrue(result)
         self.mock_session.delete.assert_called_once_with(self.mock_comment)
-        self.mock_session.commit.assert_called_once()
+        self.mock_session.flush.assert_called_once()
+        self.mock_session.commit.assert_not_called()
 
     async def test_get_many_comments(self):
-        self.mock_session.query().filter().all.return_value = [self.mock_comment]
+        self.mock_session.query().filter().order_by().limit().all.return_value = [self.mock_comment]
 
-        result = await self.comments_repo.get_many(self.mock_image.id)
+        result, next_cursor = await self.comments_repo.get_many(self.mock_image.id, limit=10)
 
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0].id, fake_comment_data['id'])
+        self.assertIsNone(next_cursor)
 
     async def test_can_edit_comment(self):
         result = await self.comments_repo.can_edit_comment(self.mock_user, self.mock_comment)
@@ -87,5 +98,75 @@ class TestCommentsRepo(unittest.IsolatedAsyncioTestCase):
         self.assertFalse(result)
 
 
+
+class TestCommentsPagination(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        Base.metadata.create_all(bind=engine)
+        db = TestingSessionLocal()
+        db.add(User(id=1, username="testuser", email="test@example.com", password="password"))
+        db.add(Image(**fake_image_data))
+        start = datetime(2024, 1, 1)
+        # two comments share a timestamp to exercise the id tie breaker
+        stamps = [start + timedelta(minutes=i // 2) for i in range(7)]
+        db.add_all([Comment(body=f"comment {i}", image_id=1, user_id=1, created_at=stamp, updated_at=stamp)
+                    for i, stamp in enumerate(stamps)])
+        db.commit()
+        db.close()
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=engine)
+
+
+    def setUp(self) -> None:
+        self.db = TestingSessionLocal()
+        self.repo = CommentsRepo(None, self.db)
+
+
+    def tearDown(self) -> None:
+        self.db.close()
+
+
+    async def walk(self, **kwargs):
+        ids, cursor = [], None
+        while True:
+            page, cursor = await self.repo.get_many(1, limit=3, cursor=cursor, **kwargs)
+            self.assertLessEqual(len(page), 3)
+            ids.extend(comment.id for comment in page)
+            if cursor is None:
+                return ids
+
+
+    async def test_pages_oldest_first(self):
+        ids = await self.walk()
+
+        self.assertEqual(ids, list(range(1, 8)))
+
+
+    async def test_pages_newest_first(self):
+        ids = await self.walk(newest_first=True)
+
+        self.assertEqual(ids, list(range(7, 0, -1)))
+
+
+    async def test_projection(self):
+        page, cursor = await self.repo.get_many(1, limit=3, projection=True)
+        entities, _ = await self.repo.get_many(1, limit=3)
+
+        self.assertEqual(page, [CommentSchema.model_validate(comment).model_dump() for comment in entities])
+        page, _ = await self.repo.get_many(1, limit=3, cursor=cursor, projection=True)
+        self.assertEqual([comment["id"] for comment in page], [4, 5, 6])
+
+
+    async def test_invalid_cursor(self):
+        with self.assertRaises(HTTPException) as err:
+            await self.repo.get_many(1, limit=3, cursor="not-a-cursor")
+
+        self.assertEqual(err.exception.status_code, 422)
+
+
 if __name__ == '__main__':
     unittest.main()
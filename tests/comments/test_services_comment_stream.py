@@ -0,0 +1,219 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.conf.config import CommentStreamSettings
+from src.dependencies.db import Base, get_db
+from src.models.comment import CommentEvent
+from src.models.image import Image
+from src.models.user import User, Role
+from src.repository.comments import CommentsRepo
+from src.routes import comment
+from src.services.auth import get_current_user
+from src.services.comment_stream import CommentStream, Event, Subscription
+from src.services.container import get_services
+
+
+# events are read from worker threads, every thread must see the same in-memory database
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def event(version: int, kind: str="created") -> Event:
+    return Event(version, kind, json.dumps({"version": version}))
+
+
+def parse(data: bytes) -> dict:
+    fields = dict(line.split(": ", 1) for line in data.decode().strip().splitlines())
+    return {"id": int(fields["id"]), "event": fields["event"], "data": json.loads(fields["data"])}
+
+
+class TestSubscription(unittest.IsolatedAsyncioTestCase):
+
+    def received(self, subscription: Subscription) -> list[tuple[int, str]]:
+        events = []
+        while not subscription.queue.empty():
+            item = subscription.queue.get_nowait()
+            events.append(item and (item.version, item.kind))
+        return events
+
+
+    async def test_deliver_in_order(self):
+        subscription = Subscription(1, last=2, queue_size=10)
+        subscription.deliver(4, [event(1), event(2), event(3), event(4)])
+        subscription.deliver(4, [event(3), event(4)])
+
+        self.assertEqual(self.received(subscription), [(3, "created"), (4, "created")])
+        self.assertEqual(subscription.last, 4)
+
+
+    async def test_missing_events_reset(self):
+        subscription = Subscription(1, last=2, queue_size=10)
+        subscription.deliver(6, [event(5), event(6)])
+        # a change without event, the image was deleted
+        subscription.deliver(7, [])
+
+        self.assertEqual(self.received(subscription), [(4, "reset"), (5, "created"), (6, "created"), (7, "reset")])
+
+
+    async def test_unknown_last_event_id_reset(self):
+        subscription = Subscription(1, last=100, queue_size=10)
+        subscription.deliver(3, [])
+
+        self.assertEqual(self.received(subscription), [(3, "reset")])
+        self.assertEqual(subscription.last, 3)
+
+
+    async def test_backlog_larger_than_queue_reset(self):
+        subscription = Subscription(1, last=0, queue_size=3)
+        subscription.deliver(3, [event(1), event(2)])
+        subscription.deliver(6, [event(3), event(4), event(5), event(6)])
+
+        self.assertEqual(self.received(subscription), [(6, "reset")])
+
+
+    async def test_close(self):
+        subscription = Subscription(1, last=0, queue_size=3)
+        subscription.deliver(1, [event(1)])
+        subscription.close()
+        subscription.deliver(2, [event(2)])
+
+        self.assertEqual(self.received(subscription), [None])
+        self.assertTrue(subscription.closed)
+
+
+class TestCommentStream(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        Base.metadata.create_all(bind=engine)
+        self.db = TestingSessionLocal()
+        self.user = User(username="user", email="user@example.com", password="password", role=Role.user)
+        self.db.add(Image(user=self.user, url="url", identifier="image", description="d"))
+        self.db.commit()
+        self.stream = CommentStream(TestingSessionLocal, CommentStreamSettings(keepalive=0.05))
+        patcher = patch.object(get_services(), "comment_stream", self.stream)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def tearDown(self) -> None:
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+    async def commit(self) -> None:
+        # notifications are scheduled on the loop once the transaction commits, they are awaited here
+        callbacks = self.db.info.pop("on_commit", [])
+        self.db.commit()
+        for callback in callbacks:
+            result = callback()
+            if result is not None:
+                await asyncio.wrap_future(result)
+
+
+    async def next_event(self, stream) -> dict:
+        async def skip_keepalives():
+            data = await stream.__anext__()
+            while data.startswith(b":"):
+                data = await stream.__anext__()
+            return data
+
+        # a missing event fails the test instead of waiting forever
+        return parse(await asyncio.wait_for(skip_keepalives(), 1))
+
+
+    async def test_live_events(self):
+        repo = CommentsRepo(self.user, self.db)
+        stream = self.stream.stream(1, 0)
+        waiting = asyncio.ensure_future(self.next_event(stream))
+        await asyncio.sleep(0.01)
+
+        created = await repo.create("first", 1, self.user.id)
+        await self.commit()
+        self.assertEqual(await waiting, {"id": 1, "event": "created",
+                                         "data": {"body": "first", "id": created.id, "image_id": 1,
+                                                  "user_id": self.user.id,
+                                                  "created_at": created.created_at.isoformat(),
+                                                  "updated_at": created.updated_at.isoformat()}})
+
+        await repo.update(1, created.id, "edited")
+        await repo.delete(1, created.id)
+        await self.commit()
+        updated, deleted = await self.next_event(stream), await self.next_event(stream)
+
+        self.assertEqual((updated["id"], updated["event"], updated["data"]["body"]), (2, "updated", "edited"))
+        self.assertEqual(deleted, {"id": 3, "event": "deleted", "data": {"id": created.id, "image_id": 1}})
+        await stream.aclose()
+        self.assertEqual(self.stream._subscriptions, {})
+
+
+    async def test_resume(self):
+        repo = CommentsRepo(self.user, self.db)
+        for body in ("first", "second", "third"):
+            await repo.create(body, 1, self.user.id)
+        await self.commit()
+
+        stream = self.stream.stream(1, 1)
+        received = [await self.next_event(stream), await self.next_event(stream)]
+        await stream.aclose()
+        self.assertEqual([(event["id"], event["data"]["body"]) for event in received], [(2, "second"), (3, "third")])
+
+        # events older than the retention are gone
+        self.db.execute(delete(CommentEvent).where(CommentEvent.version < 3))
+        self.db.commit()
+        stream = self.stream.stream(1, 1)
+        received = [await self.next_event(stream), await self.next_event(stream)]
+        await stream.aclose()
+        self.assertEqual([(event["id"], event["event"]) for event in received], [(2, "reset"), (3, "created")])
+
+
+    async def test_stop_ends_streams(self):
+        stream = self.stream.stream(1, 0)
+        self.assertEqual(await stream.__anext__(), b": keepalive\n\n")
+
+        await self.stream.stop()
+
+        with self.assertRaises(StopAsyncIteration):
+            await stream.__anext__()
+
+
+class TestStreamRoute(unittest.TestCase):
+
+    def setUp(self) -> None:
+        Base.metadata.create_all(bind=engine)
+        app = FastAPI()
+        app.include_router(comment.router)
+        def override_get_db():
+            with TestingSessionLocal() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_current_user] = lambda: User(id=1, username="user", role=Role.user)
+        self.client = TestClient(app)
+
+
+    def tearDown(self) -> None:
+        Base.metadata.drop_all(bind=engine)
+
+
+    def test_unknown_image(self):
+        response = self.client.get("/images/1/comments/stream")
+
+        self.assertEqual(response.status_code, 404, response.text)
+
+
+    def test_invalid_last_event_id(self):
+        response = self.client.get("/images/1/comments/stream", headers={"Last-Event-ID": "abc"})
+
+        self.assertEqual(response.status_code, 422, response.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 import pytest
+from contextlib import contextmanager
 from unittest.mock import MagicMock
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -10,6 +11,7 @@ from src.models.user import Base
 from src.dependencies.db import get_db
 from src.services.auth import get_current_user
 from src.models.user import User
+from src.services.query_inspector import capture_queries
 import os
 import dotenv
 
@@ -63,4 +65,16 @@ def client(session, user):
     yield TestClient(app)
 
 
+@pytest.fixture
+def query_budget():
+    """
+    Usage: with query_budget(3): client.get("/images/1")
+    Fails when the block executes more statements than the budget.
+    """
+    @contextmanager
+    def budget(limit: int):
+        with capture_queries(engine) as log:
+            yield log
+        assert len(log) <= limit, f"Query budget of {limit} exceeded, {log.summary()}"
 
+    return budget
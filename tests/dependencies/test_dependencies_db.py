@@ -1,5 +1,6 @@
 import unittest
-from fastapi import Depends
+from unittest.mock import patch
+from fastapi import Depends, HTTPException
 from sqlalchemy import text
 
 from src.dependencies.db import get_db, session
@@ -8,18 +9,37 @@ from src.models.image import Tag
 class TestDB(unittest.IsolatedAsyncioTestCase):
     
     async def test_connection(self):
-        db = next(get_db())
+        db = await get_db().__anext__()
         
         result = db.execute(text('SELECT 1')).fetchone()
         self.assertIsNotNone(result)
 
 
     async def test_connection_err(self):
+        with self.assertRaises(TypeError):
+            with session() as s:
+                s.add(Tag("name"))
+
+
+    @patch("src.dependencies.db.SessionLocal")
+    async def test_commits_once(self, session_local):
         with session() as s:
-            s.add(Tag("name"))
-            s.commit()
+            s.add(Tag(name="name"))
+
+        s.commit.assert_called_once()
+        s.rollback.assert_not_called()
+        s.close.assert_called_once()
+
+
+    @patch("src.dependencies.db.SessionLocal")
+    async def test_rolls_back_and_raises(self, session_local):
+        with self.assertRaises(HTTPException):
+            with session() as s:
+                raise HTTPException(status_code=404)
 
-            
+        s.commit.assert_not_called()
+        s.rollback.assert_called_once()
+        s.close.assert_called_once()
 
 
 if __name__ == '__main__':
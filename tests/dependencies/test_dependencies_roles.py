@@ -8,6 +8,7 @@ from src.models.user import User, Role
 from src.repository.images import Images, Image
 from src.dependencies.db import Base
 from src.dependencies.roles import RoleAccess, OwnerRoleAccess
+from src.dependencies.uow import UnitOfWork
 
 import os
 import dotenv
@@ -77,8 +78,7 @@ class TestRoleAccess(unittest.IsolatedAsyncioTestCase):
         result = await OwnerRoleAccess([Role.admin,], 
                                     repository=Images, 
                                     param_name="image_id")(MagicMock(path_params={"image_id": image_id}),
-                                                            user=self.admin,
-                                                            db=self.db)
+                                                            uow=UnitOfWork(self.db, self.admin))
         
         self.assertEqual(result, True)
 
@@ -89,8 +89,7 @@ class TestRoleAccess(unittest.IsolatedAsyncioTestCase):
             result = await OwnerRoleAccess([Role.moderator,],
                                  repository=Images, 
                                  param_name="image_id")(MagicMock(path_params={"image_id": image_id}),
-                                                        user=self.user,
-                                                        db=self.db) 
+                                                        uow=UnitOfWork(self.db, self.user)) 
             
 
     async def test_resource_owner_wrong(self):
@@ -98,8 +97,7 @@ class TestRoleAccess(unittest.IsolatedAsyncioTestCase):
             result = await OwnerRoleAccess([Role.moderator,],
                                             repository=Images, 
                                             param_name="image_id")(MagicMock(),
-                                                                user=self.user,
-                                                                db=self.db)
+                                                                uow=UnitOfWork(self.db, self.user))
         
     
 
@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import MagicMock
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.user import User, Role
+from src.models.image import Image
+from src.dependencies.db import Base
+from src.dependencies.roles import OwnerRoleAccess
+from src.dependencies.uow import UnitOfWork
+from src.repository.images import Images
+from src.services.query_inspector import capture_queries
+
+
+class TestUnitOfWork(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=cls.engine)
+        cls.Session = sessionmaker(autocommit=False, autoflush=False, bind=cls.engine)
+        db = cls.Session()
+        owner = User(username="owner", email="owner@example.com", password="password", role=Role.user)
+        other = User(username="other", email="other@example.com", password="password", role=Role.user)
+        db.add_all([owner, other, Image(user=owner, url="www.ttt.com/1.jpeg", identifier="image1", description="desc")])
+        db.commit()
+        db.close()
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=cls.engine)
+
+
+    def setUp(self) -> None:
+        self.db = self.Session()
+
+
+    def tearDown(self) -> None:
+        self.db.close()
+
+
+    def uow(self, user_id: int, role: Role=Role.user) -> UnitOfWork:
+        # the transient user get_current_user builds from token claims
+        return UnitOfWork(self.db, User(id=user_id, username=f"user{user_id}", role=role))
+
+
+    async def test_is_owner(self):
+        self.assertTrue(await self.uow(1).is_owner(Image, 1))
+        self.assertFalse(await self.uow(2).is_owner(Image, 1))
+        # missing records are left to the handler
+        self.assertTrue(await self.uow(2).is_owner(Image, 100))
+
+
+    async def test_owner_access_is_one_exists_query(self):
+        access = OwnerRoleAccess([Role.admin], repository=Images, param_name="image_id")
+        request = MagicMock(path_params={"image_id": "1"})
+
+        with capture_queries(self.engine) as log:
+            self.assertTrue(await access(request, uow=self.uow(1)))
+        self.assertEqual(len(log), 1)
+        statement, _, _ = log.entries[0]
+        self.assertIn("EXISTS", statement.upper())
+        self.assertEqual(self.db.identity_map.keys(), set())
+
+        with self.assertRaises(HTTPException):
+            await access(request, uow=self.uow(2))
+
+        with capture_queries(self.engine) as log:
+            self.assertTrue(await access(request, uow=self.uow(2, Role.admin)))
+        self.assertEqual(len(log), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
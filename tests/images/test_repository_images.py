@@ -1,3 +1,4 @@
+import io
 from collections.abc import Callable
 from typing import Any
 import unittest
@@ -7,11 +8,17 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
 from src.models.user import User
-from src.models.image import Image
+from src.models.image import Image, ImageDerivative, Tag
+from src.models.comment import Comment
+from src.models.outbox import StorageTask, StorageAction
 from src.dependencies.db import Base
 from src.repository.images import Images
-from src.schemas.image import OrderBy
+from src.schemas.image import OrderBy, ImageResponseModel
+from src.services.query_inspector import capture_queries
 
 import os
 import dotenv
@@ -59,17 +66,54 @@ class TestImagesRepository(unittest.IsolatedAsyncioTestCase):
         self.db.close()
 
     
-    @patch('src.services.media_storage.storage.user_image_upload')
+    @patch('src.services.media_storage.MediaCloud.user_image_upload')
     async def test_image_create(self, mock_upload):
         mock_upload.return_value = MagicMock(**fake_image)
-        image = await Images(self.user, self.db).create(MagicMock(), fake_image["description"], fake_image["tags"])
+        image = await Images(self.user, self.db).create(io.BytesIO(b"picture"), fake_image["description"], fake_image["tags"])
         self.assertEqual(image.url, fake_image["url"])
+        self.assertEqual(image.byte_size, 7)
+
+        public_id = mock_upload.call_args.args[1]
+        reservation = self.db.query(StorageTask).filter(StorageTask.target == public_id).first()
+        self.assertIsNone(reservation)
+
+
+    @patch('src.services.media_storage.MediaCloud.user_image_upload')
+    async def test_image_create_derivatives(self, mock_upload):
+        # a 300 pixels wide picture, the 480 and 1080 copies keep its size
+        eager = [{"width": min(width, 300), "height": 200, "format": format, "bytes": 100,
+                  "url": f"http://cdn/{width}.{format}", "secure_url": f"https://cdn/{width}.{format}"}
+                 for width in (160, 480, 1080) for format in ("jpg", "webp")]
+        mock_upload.return_value = MagicMock(**fake_image, metadata={"eager": eager})
 
+        image = await Images(self.user, self.db).create(io.BytesIO(b"picture"), fake_image["description"], [])
+        self.db.flush()
+
+        self.assertEqual(len(image.derivatives), 4)
+        self.assertEqual(image.srcset, {"jpg": "https://cdn/160.jpg 160w, https://cdn/480.jpg 300w",
+                                        "webp": "https://cdn/160.webp 160w, https://cdn/480.webp 300w"})
+        self.db.rollback()
+
+
+    @patch('src.services.media_storage.MediaCloud.user_image_upload')
+    async def test_image_create_rolled_back(self, mock_upload):
+        mock_upload.return_value = MagicMock(**fake_image)
+        image = await Images(self.user, self.db).create(MagicMock(), fake_image["description"], ["rolled_back"])
+        identifier = image.identifier
+        self.db.rollback()
 
-    @patch('src.services.media_storage.storage.remove_media')
+        # the reservation was committed on its own, the dispatcher removes the uploaded asset
+        public_id = mock_upload.call_args.args[1]
+        reservation = self.db.query(StorageTask).filter(StorageTask.target == public_id).first()
+        self.assertIsNotNone(reservation)
+        self.assertIsNone(self.db.query(Image).filter(Image.identifier == identifier).first())
+        self.assertIsNone(self.db.query(Tag).filter(Tag.name == "rolled_back").first())
+
+
+    @patch('src.services.media_storage.MediaCloud.remove_media')
     async def test_image_delete(self, mock_drop):
         mock_drop.return_value = {}
-        img = Image(**fake_image)
+        img = Image(identifier="to_delete", **fake_image)
         self.db.add(img)
         self.db.commit()
         self.db.refresh(img)
@@ -77,8 +121,44 @@ class TestImagesRepository(unittest.IsolatedAsyncioTestCase):
         image = await Images(self.user, self.db).delete(img.id)
         self.assertIsNone(self.db.get(Image, img.id))
         self.assertEqual(image.id, img.id)
+        mock_drop.assert_not_called()
+        task = self.db.query(StorageTask).filter(StorageTask.target.endswith("to_delete")).first()
+        self.assertIsNotNone(task)
 
     
+    async def test_image_delete_many(self):
+        tag = Tag(name="bulk_tag")
+        imgs = [Image(**{**fake_image, "tags": [tag]}) for _ in range(3)]
+        self.db.add_all(imgs)
+        self.db.commit()
+        pks = [img.id for img in imgs]
+
+        deleted = await Images(self.user, self.db).delete_many(pks + [1000])
+
+        self.assertEqual(sorted(deleted), sorted(pks))
+        self.assertEqual(self.db.query(Image).filter(Image.id.in_(pks)).count(), 0)
+        self.assertIsNone(self.db.query(Tag).filter(Tag.name == "bulk_tag").first())
+        tasks = self.db.query(StorageTask).filter(StorageTask.action == StorageAction.remove).all()
+        self.assertTrue(len(tasks) >= len(pks))
+
+
+    async def test_image_delete_many_not_owner(self):
+        other = User(username="other", email="other@gmail.com", password="password")
+        self.db.add(other)
+        self.db.commit()
+        img = Image(**{**fake_image, "user_id": other.id})
+        self.db.add(img)
+        self.db.commit()
+
+        with self.assertRaises(HTTPException):
+            await Images(self.user, self.db).delete_many([img.id])
+
+        self.assertIsNotNone(self.db.get(Image, img.id))
+
+        deleted = await Images(self.user, self.db).delete_many([img.id], any_owner=True)
+        self.assertEqual(deleted, [img.id])
+
+
     async def test_image_delete_wrong(self):
         pk = 100
         image = await Images(self.user, self.db).delete(pk)
@@ -125,10 +205,10 @@ class TestImagesRepository(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(fake_image["url"], images[0].url)
 
 
-    @patch("src.services.media_storage.storage.image_transform")
+    @patch("src.services.media_storage.MediaCloud.image_transform")
     @patch("src.schemas.image.ImageTransfornModel")
     async def test_image_transform(self, transform_mock, mock_upload):
-        mock_upload.return_value = MagicMock(**fake_image2)
+        mock_upload.return_value = MagicMock(**fake_image2, metadata={"width": 300, "height": 300, "bytes": 4096})
         transform = transform_mock()
         transform.model_dump.return_value = {"effect": "sepia"}
 
@@ -138,6 +218,7 @@ class TestImagesRepository(unittest.IsolatedAsyncioTestCase):
 
         self.assertNotEqual(image.id, img.id)
         self.assertEqual(image.description, img.description)
+        self.assertEqual((image.width, image.height, image.byte_size, image.orientation), (300, 300, 4096, "square"))
 
 
     async def test_image_transform_wrong(self):
@@ -166,5 +247,91 @@ class TestImagesRepository(unittest.IsolatedAsyncioTestCase):
         
 
 
+
+class TestImagesProjection(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=cls.engine)
+        cls.Session = sessionmaker(autocommit=False, autoflush=False, bind=cls.engine)
+        db = cls.Session()
+        start = datetime(2024, 1, 1)
+        user = User(**fake_user)
+        tags = [Tag(name=f"tag{i}") for i in range(3)]
+        db.add_all([user, *tags])
+        for i in range(3):
+            stamp = start + timedelta(minutes=i)
+            derivatives = [ImageDerivative(format=format, width=width, url=f"www.ttt.com/{width}/{i}.{format}")
+                           for width in (480, 160)[:i] for format in ("jpg", "webp")]
+            image = Image(user=user, url=f"www.ttt.com/{i}.jpeg", identifier=f"image{i}", description=f"desc {i}",
+                          tags=tags[:i], derivatives=derivatives, created_at=stamp, updated_at=stamp)
+            db.add(image)
+            db.add_all([Comment(body=f"comment {j}", image=image, user=user, 
+                                created_at=stamp + timedelta(seconds=j), updated_at=stamp) for j in range(i)])
+        db.commit()
+        db.close()
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=cls.engine)
+
+
+    def setUp(self) -> None:
+        self.db = self.Session()
+        self.user = self.db.get(User, 1)
+
+
+    def tearDown(self) -> None:
+        self.db.close()
+
+
+    async def assert_same_payload(self, **kwargs):
+        repo = Images(self.user, self.db)
+        images = await repo.get_many(0, 100, **kwargs)
+        expected = [ImageResponseModel.model_validate(image).model_dump() for image in images]
+
+        rows = await repo.get_many(0, 100, projection=True, **kwargs)
+        await repo.load_comments(rows)
+
+        payload = [asdict(row) for row in rows]
+        self.assertEqual(payload, expected)
+        return payload
+
+
+    async def test_projection_matches_response_model(self):
+        payload = await self.assert_same_payload(order_by=OrderBy.created_at_desc.value, keyword=None)
+
+        self.assertEqual([image["id"] for image in payload], [3, 2, 1])
+        self.assertEqual(payload[0]["srcset"], {"jpg": "www.ttt.com/160/2.jpg 160w, www.ttt.com/480/2.jpg 480w",
+                                                "webp": "www.ttt.com/160/2.webp 160w, www.ttt.com/480/2.webp 480w"})
+        self.assertEqual(payload[2]["srcset"], {})
+        self.assertEqual(len(payload[0]["tags"]), 2)
+        self.assertEqual(len(payload[0]["comments"]), 2)
+
+
+    async def test_projection_with_keyword(self):
+        payload = await self.assert_same_payload(order_by=None, keyword="tag1")
+
+        self.assertEqual([image["id"] for image in payload], [3])
+
+
+    async def test_projection_single_query(self):
+        with capture_queries(self.engine) as log:
+            rows = await Images(self.user, self.db).get_many(0, 100, order_by=None, keyword="desc", projection=True)
+
+        self.assertEqual(len(log), 1)
+        self.assertEqual([row.tags for row in rows], [[], [{"name": "tag0", "id": 1}], 
+                                                      [{"name": "tag0", "id": 1}, {"name": "tag1", "id": 2}]])
+        self.assertEqual([row.comments for row in rows], [[], [], []])
+
+
+    async def test_projection_empty(self):
+        payload = await Images(self.user, self.db).get_many(0, 100, order_by=None, keyword="missing", projection=True)
+
+        self.assertEqual(payload, [])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -79,6 +79,23 @@ def test_image_delete_wrong(client):
     assert response.status_code == 404, response.text
 
 
+def test_images_bulk_delete(client, monkeypatch):
+    mock_delete = AsyncMock()
+    mock_delete.return_value = [1, 2]
+    monkeypatch.setattr("src.repository.images.Images.delete_many", mock_delete)
+
+    response = client.delete("/images/?ids=1&ids=2&ids=3")
+
+    assert response.status_code == 200, response.text
+    assert response.json()["deleted"] == [1, 2]
+
+
+def test_images_bulk_delete_empty(client):
+    response = client.delete("/images/")
+
+    assert response.status_code == 422, response.text
+
+
 def test_image_transform(client, monkeypatch):
     body = {
             "height": None,
@@ -176,4 +193,26 @@ def test_image_get_wrong(client, monkeypatch):
     pk = 10
     response = client.get(f"/images/{pk}")
 
-    assert response.status_code == 404, response.text
\ No newline at end of file
+    assert response.status_code == 404, response.text
+
+
+def test_image_get_query_budget(client, session, query_budget):
+    owner = session.get(User, 1) or User(id=1, username="owner", email="owner@example.com", password="password")
+    image = Image(user=owner, url="www.ttt.com/folder/budget.jpeg", description="budget", identifier="budget")
+    session.add(image)
+    session.commit()
+    pk = image.id
+
+    # image row, tags and comments
+    with query_budget(3):
+        response = client.get(f"/images/{pk}")
+
+    assert response.status_code == 200, response.text
+    assert response.json()["id"] == pk
+
+
+def test_images_get_query_budget(client, query_budget):
+    with query_budget(3):
+        response = client.get("/images/?offset=0&limit=10")
+
+    assert response.status_code == 200, response.text
@@ -0,0 +1,200 @@
+import asyncio
+import io
+import random
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.conf.config import get_settings, DuplicatesSettings
+from src.dependencies.db import Base
+from src.models.user import User
+from src.models.image import Image
+from src.repository.images import Images
+from src.services.container import get_services
+from src.services.duplicate_index import BKTree, DuplicateIndex, hamming
+from src.services.image_metadata import ImageMetadata
+
+
+# the index reads from a worker thread, both threads must see the same in-memory database
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# signed like the images.dhash column, 0b1111 and -1 differ in 60 bits
+BASE = 0b1111
+NEAR = 0b0111
+FAR = -1
+
+
+class TestBKTree(unittest.TestCase):
+
+    def test_hamming_of_signed_hashes(self):
+        self.assertEqual(hamming(BASE, NEAR), 1)
+        self.assertEqual(hamming(BASE, FAR), 60)
+        self.assertEqual(hamming(-(1 << 63), 0), 1)
+
+
+    def test_search_matches_linear_scan(self):
+        rng = random.Random(7)
+        hashes = {image_id: rng.getrandbits(64) - (1 << 63) for image_id in range(500)}
+        # near copies of a few images
+        for image_id in range(500, 520):
+            hashes[image_id] = hashes[image_id - 500] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+        tree = BKTree()
+        for image_id, hash in hashes.items():
+            tree.add(hash, image_id)
+
+        for query in (hashes[3], hashes[510], rng.getrandbits(64)):
+            for max_distance in (0, 2, 6, 20):
+                expected = sorted((hamming(query, hash), image_id) for image_id, hash in hashes.items()
+                                  if hamming(query, hash) <= max_distance)
+                self.assertEqual(tree.search(query, max_distance), expected)
+
+
+    def test_add_and_remove(self):
+        tree = BKTree()
+        tree.add(BASE, 1)
+        tree.add(BASE, 2)
+        tree.add(BASE, 2)
+        tree.add(NEAR, 3)
+        self.assertEqual(tree.size, 3)
+        self.assertEqual(tree.search(BASE, 1), [(0, 1), (0, 2), (1, 3)])
+
+        tree.remove(BASE, 1)
+        tree.remove(NEAR, 3)
+        tree.remove(FAR, 4)
+        self.assertEqual(tree.size, 1)
+        self.assertEqual(tree.search(BASE, 64), [(0, 2)])
+        self.assertEqual(BKTree().search(BASE, 64), [])
+
+
+class TestDuplicateIndexDatabase(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        Base.metadata.create_all(bind=engine)
+        db = TestingSessionLocal()
+        user = User(username="user", email="user@example.com", password="password")
+        db.add_all([Image(user=user, url="url1", identifier="image1", description="d", dhash=BASE),
+                    Image(user=user, url="url2", identifier="image2", description="d", dhash=NEAR),
+                    Image(user=user, url="url3", identifier="image3", description="d", dhash=FAR),
+                    Image(user=user, url="url4", identifier="image4", description="d")])
+        db.commit()
+        db.close()
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=engine)
+
+
+    def setUp(self) -> None:
+        self.db = TestingSessionLocal()
+        self.user = self.db.get(User, 1)
+        self.index = DuplicateIndex(TestingSessionLocal, DuplicatesSettings())
+        # repositories look the index up through get_services
+        self.patcher = patch.object(get_services(), "duplicate_index", self.index)
+        self.patcher.start()
+
+
+    def tearDown(self) -> None:
+        self.patcher.stop()
+        self.db.close()
+
+
+    async def test_refresh(self):
+        await self.index.refresh()
+
+        self.assertTrue(self.index.ready)
+        self.assertEqual(self.index.search(BASE, 4), [(0, 1), (1, 2)])
+
+
+    async def test_changes_during_refresh_are_kept(self):
+        await self.index.refresh()
+        read, resume = threading.Event(), threading.Event()
+        read_tree = self.index._read_tree
+
+        def slow_read_tree():
+            tree = read_tree()
+            read.set()
+            resume.wait(1)
+            return tree
+
+        with patch.object(self.index, "_read_tree", slow_read_tree):
+            refresh = asyncio.ensure_future(self.index.refresh())
+            await asyncio.to_thread(read.wait, 1)
+            # committed after the snapshot was read, the loop is not held by the reload
+            self.index.add(BASE ^ 0b110000, 100)
+            self.index.remove(NEAR, 2)
+            resume.set()
+            await refresh
+
+        self.assertEqual(self.index.search(BASE, 4), [(0, 1), (2, 100)])
+
+
+    async def test_get_duplicates(self):
+        await self.index.refresh()
+        repo = Images(self.user, self.db)
+
+        self.assertEqual(await repo.get_duplicates(1, 4), [{"id": 2, "identifier": "image2", "url": "url2",
+                                                            "user_id": 1, "distance": 1}])
+        self.assertEqual(await repo.get_duplicates(3, 4), [])
+        # pictures that could not be hashed have no duplicates
+        self.assertEqual(await repo.get_duplicates(4, 64), [])
+        self.assertIsNone(await repo.get_duplicates(100, 4))
+
+
+    async def test_index_stale_after_external_delete(self):
+        await self.index.refresh()
+        self.index.add(NEAR, 100)
+
+        duplicates = await Images(self.user, self.db).get_duplicates(1, 4)
+
+        self.assertEqual([duplicate["id"] for duplicate in duplicates], [2])
+
+
+    @patch("src.services.image_metadata.MetadataExtractor.__call__", new_callable=AsyncMock)
+    @patch("src.services.media_storage.MediaCloud.user_image_upload")
+    async def test_create_and_delete_follow_commits(self, mock_upload, mock_extract):
+        await self.index.refresh()
+        mock_upload.return_value = MagicMock(url="url5", metadata={})
+        mock_extract.return_value = ImageMetadata(byte_size=7, dhash=BASE ^ 0b110000)
+        repo = Images(self.user, self.db)
+
+        image = await repo.create(io.BytesIO(b"picture"), "d", [])
+        self.assertEqual(self.index.search(BASE, 2), [(0, 1), (1, 2)])
+        self.db.commit()
+        self.assertEqual(self.index.search(BASE, 2), [(0, 1), (1, 2), (2, image.id)])
+
+        await repo.delete(image.id)
+        self.db.commit()
+        self.assertEqual(self.index.search(BASE, 2), [(0, 1), (1, 2)])
+
+
+    @patch("src.services.image_metadata.MetadataExtractor.__call__", new_callable=AsyncMock)
+    @patch("src.services.media_storage.MediaCloud.user_image_upload")
+    async def test_reject_on_upload(self, mock_upload, mock_extract):
+        await self.index.refresh()
+        mock_extract.return_value = ImageMetadata(byte_size=7, dhash=NEAR ^ 0b1)
+        repo = Images(self.user, self.db)
+
+        with patch.object(get_settings().duplicates, "reject_on_upload", True), \
+             patch.object(get_settings().duplicates, "reject_distance", 1):
+            with self.assertRaises(HTTPException) as err:
+                await repo.create(io.BytesIO(b"picture"), "d", [])
+            self.assertEqual(err.exception.status_code, 409)
+            mock_upload.assert_not_called()
+
+            mock_extract.return_value = ImageMetadata(byte_size=7, dhash=NEAR ^ 0b11110000)
+            mock_upload.return_value = MagicMock(url="url6", metadata={})
+            image = await repo.create(io.BytesIO(b"picture"), "d", [])
+
+        self.assertEqual(image.dhash, NEAR ^ 0b11110000)
+        self.db.rollback()
+
+
+if __name__ == "__main__":
+    unittest.main()
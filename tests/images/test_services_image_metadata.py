@@ -0,0 +1,102 @@
+import io
+import unittest
+from unittest.mock import patch
+
+from src.services import image_metadata
+from src.services.image_metadata import ImageMetadata, MetadataExtractor, extract, orientation
+from src.services.duplicate_index import hamming
+
+
+class TestImageMetadata(unittest.IsolatedAsyncioTestCase):
+
+    def test_orientation(self):
+        self.assertEqual(orientation(640, 480), "landscape")
+        self.assertEqual(orientation(480, 640), "portrait")
+        self.assertEqual(orientation(500, 500), "square")
+        self.assertIsNone(orientation(None, 480))
+
+
+    def test_from_storage(self):
+        metadata = ImageMetadata.from_storage({"width": 300, "height": 400, "format": "png", "bytes": 2048})
+
+        self.assertEqual(metadata, ImageMetadata(byte_size=2048, width=300, height=400,
+                                                 format="png", orientation="portrait"))
+        self.assertEqual(ImageMetadata.from_storage({}), ImageMetadata(byte_size=None))
+
+
+    def test_unreadable_picture_keeps_byte_size(self):
+        self.assertEqual(extract(b"not a picture"), ImageMetadata(byte_size=13))
+        with patch.object(image_metadata, "PILImage", None):
+            self.assertEqual(extract(b"not a picture"), ImageMetadata(byte_size=13))
+
+
+    @unittest.skipIf(image_metadata.PILImage is None, "Pillow is not installed")
+    def test_extract(self):
+        buf = io.BytesIO()
+        picture = image_metadata.PILImage.new("RGB", (120, 80), (200, 30, 30))
+        picture.paste((10, 20, 30), (0, 0, 20, 20))
+        exif = picture.getexif()
+        # rotated by 90 degrees on display
+        exif[0x0112] = 6
+        picture.save(buf, "JPEG", exif=exif)
+
+        metadata = extract(buf.getvalue())
+
+        self.assertEqual((metadata.width, metadata.height), (80, 120))
+        self.assertEqual(metadata.format, "jpeg")
+        self.assertEqual(metadata.orientation, "portrait")
+        self.assertEqual(metadata.byte_size, len(buf.getvalue()))
+        red, green, blue = (int(metadata.placeholder[i:i + 2], 16) for i in (1, 3, 5))
+        self.assertTrue(red > 150 and green < 80 and blue < 80, metadata.placeholder)
+
+
+    @unittest.skipIf(image_metadata.PILImage is None, "Pillow is not installed")
+    def test_dhash_survives_reencoding(self):
+        def encode(picture, size, format, **options):
+            buf = io.BytesIO()
+            picture.resize(size).save(buf, format, **options)
+            return extract(buf.getvalue()).dhash
+
+        gradient = image_metadata.PILImage.linear_gradient("L").rotate(90).convert("RGB").resize((400, 300))
+        other = gradient.transpose(image_metadata.PILImage.Transpose.FLIP_LEFT_RIGHT)
+        original = encode(gradient, (400, 300), "PNG")
+
+        self.assertLessEqual(hamming(original, encode(gradient, (200, 150), "JPEG", quality=40)), 4)
+        self.assertGreater(hamming(original, encode(other, (400, 300), "PNG")), 16)
+        self.assertTrue(-(1 << 63) <= original < 1 << 63)
+
+
+    async def test_extractor_rewinds_file(self):
+        file = io.BytesIO(b"picture")
+        with patch.object(image_metadata, "PILImage", None):
+            metadata = await MetadataExtractor()(file)
+
+        self.assertEqual(metadata.byte_size, 7)
+        self.assertEqual(file.read(), b"picture")
+
+
+    async def test_extractor_before_start(self):
+        file = io.BytesIO(b"picture")
+        with patch.object(image_metadata, "extract", wraps=image_metadata.extract) as extract_mock:
+            metadata = await MetadataExtractor()(file)
+
+        self.assertEqual(metadata.byte_size, 7)
+        extract_mock.assert_called_once_with(b"picture")
+
+
+    @unittest.skipIf(image_metadata.PILImage is None, "Pillow is not installed")
+    async def test_extractor_pool_started_with_the_application(self):
+        extractor = MetadataExtractor(workers=1)
+        self.assertIsNone(extractor._pool)
+
+        extractor.start()
+        try:
+            self.assertIsNotNone(extractor._pool)
+            self.assertEqual((await extractor(io.BytesIO(b"picture"))).byte_size, 7)
+        finally:
+            extractor.stop()
+        self.assertIsNone(extractor._pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
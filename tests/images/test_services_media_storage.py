@@ -1,7 +1,9 @@
+import threading
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 from cloudinary import CloudinaryImage
 
+from src.conf.config import settings
 from src.services.media_storage import MediaCloud
 
 
@@ -33,6 +35,18 @@ class TestMediaCloud(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(image, self.image_mock)
 
 
+    @patch("src.services.media_storage.upload_image")
+    async def test_upload_off_the_event_loop(self, cloud_mock):
+        threads = []
+        cloud_mock.side_effect = lambda *args, **kwargs: threads.append(threading.get_ident())
+
+        await MediaCloud().user_image_upload(self.file_mock, "111111111")
+        await MediaCloud().image_transform("wwww", {}, "22222")
+
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
     @patch("src.services.media_storage.upload_image")
     async def test_user_image_transform(self, cloud_mock):
         cloud_mock.return_value = self.image_mock
@@ -55,5 +69,68 @@ class TestMediaCloud(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(image, self.image_mock)
 
 
+
+    @patch("src.services.media_storage.delete_resources")
+    async def test_user_image_remove_many(self, cloud_mock):
+        cloud_mock.return_value = {"deleted": {}}
+        idents = [str(i) for i in range(MediaCloud.DELETE_BATCH_SIZE + 1)]
+
+        result = await MediaCloud().remove_media_many(idents)
+
+        self.assertEqual(cloud_mock.call_count, 2)
+        self.assertEqual(len(result), 2)
+
+
+    @patch("src.services.media_storage.delete_resources_by_prefix")
+    async def test_user_media_remove_by_prefix(self, cloud_mock):
+        cloud_mock.return_value = {"deleted": {}}
+        prefix = "folder/user/"
+
+        result = await MediaCloud().remove_media_by_prefix(prefix)
+
+        cloud_mock.assert_called_once_with(prefix)
+        self.assertEqual(result, cloud_mock.return_value)
+
+
+    @patch("src.services.media_storage.delete_resources_by_prefix")
+    async def test_remove_by_prefix_until_complete(self, cloud_mock):
+        # more than 1000 files, Cloudinary answers partial with a cursor
+        cloud_mock.side_effect = [{"deleted": {"folder/user/1": "deleted"}, "partial": True, "next_cursor": "c1"},
+                                  {"deleted": {"folder/user/2": "deleted"}, "partial": False}]
+
+        result = await MediaCloud().remove_media_by_prefix("folder/user/")
+
+        self.assertEqual(cloud_mock.call_args_list, [call("folder/user/"), call("folder/user/", next_cursor="c1")])
+        self.assertEqual(result["deleted"], {"folder/user/1": "deleted", "folder/user/2": "deleted"})
+
+
+    @patch("src.services.media_storage.delete_resources_by_prefix")
+    async def test_remove_by_prefix_without_progress(self, cloud_mock):
+        cloud_mock.return_value = {"deleted": {}, "partial": True}
+
+        with self.assertRaises(RuntimeError):
+            await MediaCloud().remove_media_by_prefix("folder/user/")
+
+
+    @patch("src.services.media_storage.upload_image")
+    async def test_upload_generates_derivatives(self, cloud_mock):
+        with patch.object(settings.derivatives, "widths", [160, 480]), \
+             patch.object(settings.derivatives, "webp", True):
+            await MediaCloud().user_image_upload(self.file_mock, "111111111")
+
+        self.assertEqual(cloud_mock.call_args.kwargs["eager"], [{"width": 160, "crop": "limit"},
+                                                                {"width": 160, "crop": "limit", "format": "webp"},
+                                                                {"width": 480, "crop": "limit"},
+                                                                {"width": 480, "crop": "limit", "format": "webp"}])
+
+
+    def test_derivatives_of(self):
+        result = {"eager": [{"width": 160, "height": 90, "format": "webp", "bytes": 512,
+                             "url": "http://cdn/a.webp", "secure_url": "https://cdn/a.webp"}]}
+
+        self.assertEqual(MediaCloud().derivatives_of(result), [{"width": 160, "height": 90, "format": "webp",
+                                                                "byte_size": 512, "url": "https://cdn/a.webp"}])
+        self.assertEqual(MediaCloud().derivatives_of({}), [])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.conf.config import OutboxSettings
+from src.dependencies.db import Base
+from src.models.outbox import StorageTask, StorageAction
+from src.repository.outbox import StorageOutbox
+from src.services.outbox import OutboxDispatcher
+
+
+SQLALCHEMY_DATABASE_URL="sqlite://"
+
+# the dispatcher queries from worker threads, every thread must see the same in-memory database
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class TestOutboxDispatcher(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        Base.metadata.create_all(bind=engine)
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=engine)
+
+
+    def setUp(self) -> None:
+        self.db = TestingSessionLocal()
+        self.db.query(StorageTask).delete()
+        self.db.commit()
+        self.storage = MagicMock()
+        self.storage.remove_media_many = AsyncMock(return_value=[])
+        self.storage.remove_media_by_prefix = AsyncMock(return_value={})
+        self.config = OutboxSettings(batch_size=10, max_attempts=2, backoff_base=60)
+        self.dispatcher = OutboxDispatcher(TestingSessionLocal, self.storage, self.config)
+
+
+    def tearDown(self) -> None:
+        self.db.close()
+
+
+    async def test_dispatch_batches_removals(self):
+        await StorageOutbox(self.db).create_many(StorageAction.remove, ["f/u/1", "f/u/2", "f/u/3"])
+        await StorageOutbox(self.db).create(StorageAction.remove_prefix, "f/u/")
+        self.db.commit()
+
+        processed = await self.dispatcher.dispatch_once()
+
+        self.assertEqual(processed, 4)
+        self.storage.remove_media_many.assert_awaited_once_with(["f/u/1", "f/u/2", "f/u/3"])
+        self.storage.remove_media_by_prefix.assert_awaited_once_with("f/u/")
+        self.assertEqual(self.db.query(StorageTask).count(), 0)
+
+
+    async def test_dispatch_skips_delayed(self):
+        await StorageOutbox(self.db).create(StorageAction.remove, "f/u/reserved", delay=600)
+        self.db.commit()
+
+        processed = await self.dispatcher.dispatch_once()
+
+        self.assertEqual(processed, 0)
+        self.storage.remove_media_many.assert_not_awaited()
+
+
+    async def test_dispatch_retry_with_backoff(self):
+        self.storage.remove_media_many.side_effect = RuntimeError("cloud is down")
+        await StorageOutbox(self.db).create(StorageAction.remove, "f/u/1")
+        self.db.commit()
+
+        await self.dispatcher.dispatch_once()
+
+        task = self.db.query(StorageTask).one()
+        self.db.refresh(task)
+        self.assertEqual(task.attempts, 1)
+        self.assertEqual(task.last_error, "cloud is down")
+        self.assertGreater(task.available_at, datetime.utcnow() + timedelta(seconds=30))
+        self.assertFalse(task.failed)
+
+        task.available_at = datetime.utcnow()
+        self.db.commit()
+        await self.dispatcher.dispatch_once()
+
+        self.db.refresh(task)
+        self.assertTrue(task.failed)
+        self.assertEqual(await self.dispatcher.dispatch_once(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
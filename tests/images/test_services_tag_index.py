@@ -0,0 +1,136 @@
+import unittest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.conf.config import TagIndexSettings
+from src.dependencies.db import Base
+from src.models.user import User
+from src.models.image import Image, Tag
+from src.repository.tags import Tags
+from src.services.container import get_services
+from src.services.tag_index import TagIndex
+
+
+# the index reads from a worker thread, both threads must see the same in-memory database
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class TestTagIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.index = TagIndex(TestingSessionLocal, TagIndexSettings())
+        self.index.load([("Sea", 3), ("sunset", 7), ("sun", 7), ("summer", 1), ("mountain", 9)])
+
+
+    def test_suggest_orders_by_usage(self):
+        self.assertEqual(self.index.suggest("s", 3), [{"name": "sun", "count": 7},
+                                                      {"name": "sunset", "count": 7},
+                                                      {"name": "Sea", "count": 3}])
+
+
+    def test_suggest_case_insensitive(self):
+        self.assertEqual(self.index.suggest("SE", 10), [{"name": "Sea", "count": 3}])
+        self.assertEqual(self.index.suggest("x", 10), [])
+
+
+    def test_add_and_remove(self):
+        self.index.add("sunrise")
+        self.index.add("Sunrise")
+        self.assertEqual([tag["name"] for tag in self.index.suggest("sunr", 10)], ["sunrise"])
+
+        self.index.remove("SUNRISE")
+        self.index.remove("missing")
+        self.assertEqual(self.index.suggest("sunr", 10), [])
+        self.assertEqual(len(self.index.suggest("", 10)), 5)
+
+
+class TestTagIndexDatabase(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        Base.metadata.create_all(bind=engine)
+        db = TestingSessionLocal()
+        user = User(username="user", email="user@example.com", password="password")
+        sea, sun, summer = Tag(name="sea"), Tag(name="sun"), Tag(name="summer_2024")
+        db.add_all([Image(user=user, url="url1", identifier="image1", description="d", tags=[sea, sun]),
+                    Image(user=user, url="url2", identifier="image2", description="d", tags=[sun]),
+                    summer])
+        db.commit()
+        db.close()
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=engine)
+
+
+    def setUp(self) -> None:
+        self.db = TestingSessionLocal()
+        self.index = TagIndex(TestingSessionLocal, TagIndexSettings())
+        # repositories look the index up through their module
+        self.patcher = patch.object(get_services(), "tag_index", self.index)
+        self.patcher.start()
+
+
+    def tearDown(self) -> None:
+        self.patcher.stop()
+        self.db.close()
+
+
+    async def test_refresh_counts_usage(self):
+        await self.index.refresh()
+
+        self.assertTrue(self.index.ready)
+        self.assertEqual(self.index.suggest("s", 10), [{"name": "sun", "count": 2},
+                                                       {"name": "sea", "count": 1},
+                                                       {"name": "summer_2024", "count": 0}])
+
+
+    async def test_fallback_matches_index(self):
+        expected = [{"name": "sun", "count": 2}, {"name": "sea", "count": 1}]
+
+        self.assertEqual(await Tags(self.db).suggest("S", 2), expected)
+        await self.index.refresh()
+        self.assertEqual(await Tags(self.db).suggest("S", 2), expected)
+
+
+    async def test_fallback_escapes_wildcards(self):
+        self.assertEqual(await Tags(self.db).suggest("summer_", 10), [{"name": "summer_2024", "count": 0}])
+        self.assertEqual(await Tags(self.db).suggest("s_", 10), [])
+        self.assertEqual(await Tags(self.db).suggest("%", 10), [])
+
+
+    async def test_repository_keeps_index_current(self):
+        await self.index.refresh()
+
+        await Tags(self.db).create("sky")
+        # the index follows committed changes only
+        self.assertEqual(self.index.suggest("sk", 10), [])
+        self.db.commit()
+        self.assertIn({"name": "sky", "count": 0}, self.index.suggest("sk", 10))
+
+        await Tags(self.db).delete("sky")
+        self.db.commit()
+        self.assertEqual(self.index.suggest("sk", 10), [])
+
+        unused = await Tags(self.db).create("skyline")
+        self.db.commit()
+        await Tags(self.db).delete_unused_by_ids([unused.id])
+        self.db.commit()
+        self.assertEqual(self.index.suggest("sk", 10), [])
+
+
+    async def test_rollback_leaves_index_untouched(self):
+        await self.index.refresh()
+
+        await Tags(self.db).create("skiing")
+        self.db.rollback()
+        self.db.commit()
+
+        self.assertEqual(self.index.suggest("ski", 10), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from main import create_app
+from src.conf.config import get_settings, use_settings
+from src.dependencies.db import LazySessionMaker, SessionLocal, get_engine
+from src.services.cache import get_cache
+from src.services.rate_limit import get_buckets
+from src.services.revocation import get_revocations
+from src.services.container import get_services, use_services
+from src.services.query_inspector import QueryInspectorMiddleware
+
+
+class TestCreateApp(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # create_app installs its settings and services, the other tests keep the previous ones
+        settings, services = get_settings(), get_services()
+        self.addCleanup(use_services, services)
+        self.addCleanup(use_settings, settings)
+
+
+    def test_uses_given_settings(self):
+        settings = get_settings().model_copy(deep=True)
+        settings.query_inspector.enabled = True
+        settings.cloudinary.folder = "other"
+
+        app = create_app(settings)
+
+        self.assertIs(app.state.settings, settings)
+        self.assertIs(get_settings(), settings)
+        self.assertIs(get_services(), app.state.services)
+        self.assertEqual(app.state.services.storage.get_avatar_public_id("user"), "other/avatar/user")
+        self.assertIs(app.state.services.tag_index.config, settings.tag_index)
+        self.assertIn(QueryInspectorMiddleware, [middleware.cls for middleware in app.user_middleware])
+        paths = {route.path for route in app.routes}
+        self.assertTrue({"/health/live", "/health/ready", "/halthchecker", "/metrics"} <= paths)
+
+
+    def test_backends_follow_the_settings(self):
+        before = get_engine(), get_cache(), get_buckets(), get_revocations()
+        settings = get_settings().model_copy(deep=True)
+        settings.cache.memory_ttl = 7
+
+        create_app(settings)
+        after = get_engine(), get_cache(), get_buckets(), get_revocations()
+
+        self.assertTrue(all(new is not old for new, old in zip(after, before)))
+        self.assertEqual(get_cache().ttl, 7)
+        with SessionLocal() as session:
+            self.assertIs(session.get_bind(), after[0])
+        # the same settings keep what was built from them
+        create_app(settings)
+        self.assertIs(get_engine(), after[0])
+
+
+    def test_inspector_disabled(self):
+        app = create_app()
+
+        self.assertNotIn(QueryInspectorMiddleware, [middleware.cls for middleware in app.user_middleware])
+
+
+    def test_import_without_environment(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = {"PATH": os.environ.get("PATH", "")}
+
+        # settings are read when the app is first built, not when main is imported
+        result = subprocess.run([sys.executable, "-c", "import main"], cwd=root, env=env, 
+                                capture_output=True, text=True)
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+class TestLazySessionMaker(unittest.TestCase):
+
+    def test_binds_on_first_session(self):
+        factory = LazySessionMaker()
+        self.assertIsNone(factory.kw.get("bind"))
+
+        with factory() as session:
+            self.assertIsNotNone(session.get_bind())
+
+        self.assertIsNotNone(factory.kw.get("bind"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,12 @@
+import asyncio
+import threading
 import unittest
 from unittest.mock import MagicMock
 
-from src.repository.base_repository import AbstractRepository
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.repository.base_repository import AbstractRepository, run_in_thread
 
 
 class FakeRepository(AbstractRepository):
@@ -38,5 +43,28 @@ class TestAbstractRepository(unittest.IsolatedAsyncioTestCase):
             await FakeRepository(MagicMock()).get_single()
 
 
+    async def test_run_in_thread(self):
+        threads, done = [], asyncio.Event()
+
+        async def notify():
+            threads.append(threading.current_thread())
+            done.set()
+
+        async def work(db: Session) -> threading.Thread:
+            repo = FakeRepository(db)
+            repo.on_commit(lambda: threads.append(threading.current_thread()))
+            repo.on_commit(notify)
+            db.commit()
+            return threading.current_thread()
+
+        with Session(create_engine("sqlite://")) as db:
+            worker = await run_in_thread(db, work(db))
+        await asyncio.wait_for(done.wait(), 1)
+
+        # the work ran off the loop, its commit callbacks on it
+        self.assertIsNot(worker, threading.current_thread())
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
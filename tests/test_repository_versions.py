@@ -0,0 +1,166 @@
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.dependencies.db import Base, get_db
+from src.models.comment import Comment
+from src.models.image import Image
+from src.models.user import User, Role
+from src.repository.comments import CommentsRepo
+from src.repository.images import Images
+from src.models.version import CollectionVersion
+from src.repository.versions import CollectionVersions, IMAGE_SHARDS, comments_key, images_key, images_keys
+from src.routes import comment, images
+from src.services.auth import get_current_user
+from src.services.query_inspector import capture_queries
+
+
+# the routes run the handlers from the threadpool, every thread must see the same in-memory database
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class TestCollectionVersions(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        Base.metadata.create_all(bind=engine)
+        self.db = TestingSessionLocal()
+        self.owner = User(username="owner", email="owner@example.com", password="password", role=Role.user)
+        self.other = User(username="other", email="other@example.com", password="password", role=Role.user)
+        self.images = [Image(user=self.owner, url=f"url{i}", identifier=f"image{i}", description="d")
+                       for i in range(2)]
+        self.db.add_all([self.other, *self.images])
+        self.db.commit()
+        self.versions = CollectionVersions(self.db)
+
+
+    def tearDown(self) -> None:
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+    async def versions_of(self, *keys: str) -> list[int]:
+        return [await self.versions.get_single(key) for key in keys]
+
+
+    async def test_bump(self):
+        self.assertEqual(await self.versions.get_single("images"), 0)
+
+        await self.versions.bump("images", "comments:image:1", "images")
+        await self.versions.bump("images")
+        await self.versions.bump()
+
+        self.assertEqual(await self.versions_of("images", "comments:image:1", "comments:image:2"), [2, 1, 0])
+
+
+    async def test_images_version_from_shards(self):
+        # a version served before the list was sharded
+        await self.versions.bump(images_key())
+        await self.versions.bump(*images_keys(1))
+        await self.versions.bump(*images_keys(2))
+        await self.versions.bump(*images_keys(1 + IMAGE_SHARDS))
+
+        self.assertEqual(await self.versions_of(images_key(), images_key(1), images_key(1 + IMAGE_SHARDS)), [4, 1, 1])
+        self.assertEqual(self.db.query(CollectionVersion).filter(CollectionVersion.key.startswith("images:shard:")).count(), 2)
+
+
+    async def test_bump_rolled_back(self):
+        await self.versions.bump("images")
+        self.db.commit()
+        await self.versions.bump("images")
+        self.db.rollback()
+
+        self.assertEqual(await self.versions.get_single("images"), 1)
+
+
+    async def test_comment_writes(self):
+        image_id = self.images[0].id
+        repo = CommentsRepo(self.other, self.db)
+
+        comment = await repo.create("first", image_id, self.other.id)
+        await repo.update(image_id, comment.id, "edited")
+        await repo.delete(image_id, comment.id)
+
+        self.assertEqual(await self.versions_of(comments_key(image_id), images_key(), images_key(self.owner.id),
+                                                images_key(self.other.id), comments_key(self.images[1].id)),
+                         [3, 3, 3, 0, 0])
+
+
+    async def test_image_writes(self):
+        repo = Images(self.owner, self.db)
+
+        await repo.delete_many([image.id for image in self.images])
+
+        self.assertEqual(await self.versions_of(images_key(), images_key(self.owner.id), images_key(self.other.id),
+                                                *(comments_key(image.id) for image in self.images)),
+                         [1, 1, 0, 1, 1])
+
+
+class TestConditionalLists(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        Base.metadata.create_all(bind=engine)
+        db = TestingSessionLocal()
+        owner = User(username="owner", email="owner@example.com", password="password", role=Role.user)
+        image = Image(user=owner, url="url", identifier="image", description="d")
+        db.add_all([image, Comment(body="first", image=image, user=owner)])
+        db.commit()
+        db.close()
+
+        app = FastAPI()
+        app.include_router(images.router)
+        app.include_router(comment.router)
+        def override_get_db():
+            with TestingSessionLocal() as db:
+                yield db
+                db.commit()
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_current_user] = lambda: User(id=1, username="owner", role=Role.user)
+        cls.client = TestClient(app)
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=engine)
+
+
+    def assert_conditional(self, url: str, params: dict, changed_params: dict) -> None:
+        response = self.client.get(url, params=params)
+        etag = response.headers["etag"]
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(len(response.json()), 1)
+
+        with capture_queries(engine) as log:
+            cached = self.client.get(url, params=params, headers={"If-None-Match": f'"other", {etag}'})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.headers["etag"], etag)
+        self.assertEqual(cached.content, b"")
+        # only the version is read
+        self.assertEqual([statement for statement, _, _ in log.entries if "collection_versions" not in statement], [])
+
+        other_page = self.client.get(url, params=changed_params, headers={"If-None-Match": etag})
+        self.assertEqual(other_page.status_code, 200)
+
+        created = self.client.post("/images/1/comments/", json="second")
+        self.assertEqual(created.status_code, 201, created.text)
+        stale = self.client.get(url, params=params, headers={"If-None-Match": etag})
+        self.assertEqual(stale.status_code, 200)
+        self.assertNotEqual(stale.headers["etag"], etag)
+
+
+    def test_comments(self):
+        self.assert_conditional("/images/1/comments/", {"limit": 1}, {"limit": 1, "newest_first": True})
+
+
+    def test_images(self):
+        self.assert_conditional("/images/", {"user_id": 1}, {"user_id": 1, "offset": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
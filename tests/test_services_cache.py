@@ -0,0 +1,338 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.conf.config import CacheSettings, get_settings
+from src.dependencies.db import Base
+from src.models.comment import Comment
+from src.models.image import Image
+from src.models.user import User
+from src.repository.comments import CommentsRepo
+from src.repository.images import Images
+from src.schemas.image import ImageUpdate
+from src.services.cache import MemoryCache, RedisCache, ReadThroughCache, get_cache
+from src.services.query_inspector import capture_queries
+
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """
+    Local stand-in for redis.asyncio.Redis: hashes in a dict, expiries recorded but not applied,
+    the scripts of RedisCache run as Python.
+    """
+
+    def __init__(self) -> None:
+        self.hashes = {}
+        self.values = {}
+        self.ttl = {}
+        self.down = False
+
+    def check(self) -> None:
+        if self.down:
+            raise ConnectionError("Connection refused")
+
+    async def hget(self, key: str, field: str):
+        self.check()
+        return self.hashes.get(key, {}).get(field)
+
+    async def hset(self, key: str, field: str, value: bytes):
+        self.check()
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def expire(self, key: str, seconds: int, nx: bool=False):
+        self.check()
+        if not nx or key not in self.ttl:
+            self.ttl[key] = seconds
+
+    async def get(self, key: str):
+        self.check()
+        return self.values.get(key)
+
+    async def delete(self, *keys: str):
+        self.check()
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.ttl.pop(key, None)
+
+    async def eval(self, script: str, numkeys: int, *args):
+        self.check()
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == RedisCache.SET_SCRIPT:
+            if (self.values.get(keys[1]) or b"").decode() != argv[3]:
+                return 0
+            await self.hset(keys[0], argv[0], argv[1])
+            await self.expire(keys[0], argv[2], nx=True)
+            return 1
+        if script == RedisCache.DELETE_SCRIPT:
+            for entry, generation in zip(keys[::2], keys[1::2]):
+                await self.delete(entry)
+                self.values[generation] = str(int(self.values.get(generation, 0)) + 1).encode()
+                self.ttl[generation] = argv[0]
+            return 1
+        raise NotImplementedError(script)
+
+
+class TestBackends(unittest.IsolatedAsyncioTestCase):
+
+    async def test_memory_expires(self):
+        clock = FakeClock()
+        cache = MemoryCache(10, clock=clock)
+        await cache.set("image:1", "", b"1", ttl=60)
+        clock.now += 30
+        await cache.set("image:1", "page", b"2", ttl=60)
+
+        self.assertEqual(await cache.get("image:1", ""), b"1")
+        clock.now += 30
+        # the entry expires with its first field
+        self.assertIsNone(await cache.get("image:1", "page"))
+
+
+    async def test_memory_drops_least_recently_used(self):
+        cache = MemoryCache(2, clock=FakeClock())
+        await cache.set("image:1", "", b"1", ttl=60)
+        await cache.set("image:2", "", b"2", ttl=60)
+        await cache.get("image:1", "")
+        await cache.set("image:3", "", b"3", ttl=60)
+
+        self.assertEqual(await cache.get("image:1", ""), b"1")
+        self.assertIsNone(await cache.get("image:2", ""))
+        await cache.delete("image:1", "image:4")
+        self.assertIsNone(await cache.get("image:1", ""))
+
+
+    async def test_redis(self):
+        redis = FakeRedis()
+        cache = RedisCache(redis, "cache")
+        await cache.set("comments:1", "10::0", b"page", ttl=60)
+        await cache.set("comments:1", "10::1", b"newest", ttl=30)
+
+        self.assertEqual(await cache.get("comments:1", "10::0"), b"page")
+        self.assertEqual(redis.ttl, {"cache:comments:1": 60})
+        await cache.delete("comments:1")
+        self.assertEqual(redis.hashes, {})
+        self.assertEqual(redis.values, {"cache:generation:comments:1": b"1"})
+
+
+    async def test_redis_invalidation_by_another_worker(self):
+        redis = FakeRedis()
+        # two workers share the entries in Redis, each with its own ReadThroughCache
+        cache, other = (ReadThroughCache(RedisCache(redis, "cache"), ttl=60) for _ in range(2))
+        release = asyncio.Event()
+        loads = []
+
+        async def loader():
+            loads.append(len(loads) + 1)
+            await release.wait()
+            return {"id": 1, "version": loads[-1]}
+
+        reader = asyncio.create_task(cache.get_or_load("image:1", "", loader))
+        await asyncio.sleep(0)
+        await other.invalidate("image:1")
+        release.set()
+
+        self.assertEqual(await reader, {"id": 1, "version": 1})
+        self.assertEqual(redis.hashes, {})
+        self.assertEqual(await cache.get_or_load("image:1", "", loader), {"id": 1, "version": 2})
+        self.assertEqual(await other.get_or_load("image:1", "", loader), {"id": 1, "version": 2})
+
+
+    async def test_redis_down_misses(self):
+        redis = FakeRedis()
+        redis.down = True
+        cache = ReadThroughCache(RedisCache(redis, "cache"), ttl=60)
+
+        async def loader():
+            return {"id": 1}
+
+        with self.assertLogs("src.services.cache", "WARNING"):
+            self.assertEqual(await cache.get_or_load("image:1", "", loader), {"id": 1})
+            await cache.invalidate("image:1")
+
+
+class TestGetCache(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        get_cache.cache_clear()
+
+
+    def test_memory_entries_are_short_lived(self):
+        get_cache.cache_clear()
+        with patch.object(get_settings(), "cache", CacheSettings(backend="memory", ttl=60, memory_ttl=5)):
+            cache = get_cache()
+
+        self.assertIsInstance(cache.backend, MemoryCache)
+        self.assertEqual(cache.ttl, 5)
+
+
+class TestReadThroughCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.cache = ReadThroughCache(MemoryCache(10), ttl=60)
+        self.loads = 0
+        self.release = asyncio.Event()
+
+
+    async def loader(self):
+        self.loads += 1
+        await self.release.wait()
+        return {"id": 1, "version": self.loads}
+
+
+    async def test_one_load_per_miss(self):
+        readers = [asyncio.create_task(self.cache.get_or_load("image:1", "", self.loader)) for _ in range(50)]
+        await asyncio.sleep(0)
+        self.release.set()
+
+        self.assertEqual(await asyncio.gather(*readers), [{"id": 1, "version": 1}] * 50)
+        self.assertEqual(await self.cache.get_or_load("image:1", "", self.loader), {"id": 1, "version": 1})
+        self.assertEqual(self.loads, 1)
+
+
+    async def test_load_across_invalidation_is_not_stored(self):
+        reader = asyncio.create_task(self.cache.get_or_load("image:1", "", self.loader))
+        await asyncio.sleep(0)
+        await self.cache.invalidate("image:1")
+        self.release.set()
+
+        self.assertEqual(await reader, {"id": 1, "version": 1})
+        self.assertEqual(await self.cache.get_or_load("image:1", "", self.loader), {"id": 1, "version": 2})
+
+
+    async def test_errors_and_missing_rows_are_not_stored(self):
+        async def failing():
+            self.loads += 1
+            await self.release.wait()
+            raise LookupError("database down")
+
+        async def missing():
+            return None
+
+        readers = [asyncio.create_task(self.cache.get_or_load("image:1", "", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        self.release.set()
+        results = await asyncio.gather(*readers, return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, LookupError) for result in results))
+        self.assertEqual(self.loads, 1)
+        self.assertIsNone(await self.cache.get_or_load("image:1", "", missing))
+        self.assertEqual(await self.cache.get_or_load("image:1", "", self.loader), {"id": 1, "version": 2})
+
+
+    async def test_waiters_load_when_the_loading_request_is_cancelled(self):
+        leader = asyncio.create_task(self.cache.get_or_load("image:1", "", self.loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(self.cache.get_or_load("image:1", "", self.loader))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        self.release.set()
+
+        self.assertEqual(await waiter, {"id": 1, "version": 2})
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+
+
+    async def test_disabled(self):
+        self.release.set()
+        cache = ReadThroughCache(MemoryCache(10), ttl=60, enabled=False)
+
+        await cache.get_or_load("image:1", "", self.loader)
+        await cache.get_or_load("image:1", "", self.loader)
+
+        self.assertEqual(self.loads, 2)
+
+
+class TestCachedReads(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        Base.metadata.create_all(bind=engine)
+        db = TestingSessionLocal()
+        user = User(username="user", email="user@example.com", password="password")
+        image = Image(user=user, url="url", identifier="image", description="before")
+        db.add_all([image, Comment(body="first", image=image, user=user)])
+        db.commit()
+        db.close()
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=engine)
+
+
+    def setUp(self) -> None:
+        self.db = TestingSessionLocal()
+        self.user = self.db.get(User, 1)
+        self.cache = ReadThroughCache(MemoryCache(10), ttl=60)
+        for module in ("src.repository.images", "src.repository.comments"):
+            patcher = patch(f"{module}.get_cache", return_value=self.cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+    def tearDown(self) -> None:
+        self.db.close()
+
+
+    async def commit(self) -> None:
+        # invalidations are scheduled on the loop once the transaction commits, they are awaited here
+        callbacks = self.db.info.pop("on_commit", [])
+        self.db.commit()
+        for callback in callbacks:
+            await asyncio.wrap_future(callback())
+
+
+    async def test_image(self):
+        repo = Images(self.user, self.db)
+        image = await repo.read(1)
+        with capture_queries(engine) as log, TestingSessionLocal() as db:
+            cached = await Images(self.user, db).read(1)
+
+        self.assertEqual(len(log), 0)
+        self.assertEqual(cached["description"], "before")
+        self.assertEqual(cached["comments"][0]["body"], "first")
+        self.assertEqual(cached["created_at"], image["created_at"].isoformat())
+        self.assertIsNone(await repo.read(100))
+
+        self.assertEqual(await repo.read_shared("image"), {"url": "url", "description": "before"})
+        await repo.update(1, ImageUpdate(description="after", tags=[]))
+        self.assertEqual((await repo.read(1))["description"], "before")
+        await self.commit()
+
+        self.assertEqual((await repo.read(1))["description"], "after")
+        self.assertEqual(await repo.read_shared("image"), {"url": "url", "description": "after"})
+
+
+    async def test_comments(self):
+        repo = CommentsRepo(self.user, self.db)
+        page, _ = await repo.get_many(1, limit=10, projection=True)
+        await Images(self.user, self.db).read(1)
+
+        comment = await repo.create("second", 1, self.user.id)
+        await self.commit()
+        fresh, _ = await repo.get_many(1, limit=10, projection=True)
+
+        self.assertEqual([comment["body"] for comment in page], ["first"])
+        self.assertEqual([comment["body"] for comment in fresh], ["first", "second"])
+        self.assertEqual(len((await Images(self.user, self.db).read(1))["comments"]), 2)
+
+        await repo.delete(1, comment.id)
+        await self.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.dependencies.db import Base, get_db
+from src.models.comment import Comment
+from src.models.image import Image, Tag
+from src.models.user import User, Role
+from src.routes import users
+from src.services import export
+from src.services.auth import get_current_user
+from src.services.export import main, records, stream_export
+
+
+# the export is read from the threadpool, every thread must see the same in-memory database
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def read_lines(data: bytes) -> list[dict]:
+    return [json.loads(line) for line in data.decode().splitlines()]
+
+
+class TestExport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        Base.metadata.create_all(bind=engine)
+        db = TestingSessionLocal()
+        owner = User(username="owner", email="owner@example.com", password="password", role=Role.user)
+        other = User(username="other", email="other@example.com", password="password", role=Role.user)
+        sea = Tag(name="sea")
+        images = [Image(user=owner, url=f"url{i}", identifier=f"image{i}", description=f"desc {i}",
+                        tags=[sea] if i % 2 else []) for i in range(5)]
+        others = Image(user=other, url="url", identifier="others", description="desc")
+        db.add_all([*images, others,
+                    Comment(body="own", image=others, user=owner),
+                    Comment(body="theirs", image=images[0], user=other)])
+        db.commit()
+        db.close()
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=engine)
+
+
+    def test_records(self):
+        with TestingSessionLocal() as db:
+            exported = list(records(db, 1))
+            # read as columns, no mapped object is kept by the session
+            self.assertEqual(len(db.identity_map), 0)
+
+        self.assertEqual([record["type"] for record in exported], ["user"] + ["image"] * 5 + ["comment"])
+        self.assertEqual(exported[0]["username"], "owner")
+        self.assertNotIn("password", exported[0])
+        self.assertEqual([record["tags"] for record in exported[1:6]], [[], ["sea"], [], ["sea"], []])
+        self.assertEqual(exported[6]["body"], "own")
+
+        with TestingSessionLocal() as db:
+            self.assertEqual(list(records(db, 100)), [])
+
+
+    def test_stream_in_chunks(self):
+        with patch.object(export, "CHUNK_SIZE", 200):
+            chunks = list(stream_export(TestingSessionLocal, 1))
+
+        self.assertGreater(len(chunks), 1)
+        lines = read_lines(b"".join(chunks))
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(lines[0]["role"], "user")
+
+
+    def test_gzip(self):
+        plain = b"".join(stream_export(TestingSessionLocal, 1))
+        compressed = b"".join(stream_export(TestingSessionLocal, 1, compress=True))
+
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+
+    def test_cli_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "user-1.ndjson.gz")
+            self.assertEqual(main(["1", "-o", path], session_factory=TestingSessionLocal), 0)
+            with gzip.open(path) as file:
+                self.assertEqual(len(read_lines(file.read())), 7)
+
+            with patch("sys.stderr", io.StringIO()):
+                self.assertEqual(main(["100", "-o", path], session_factory=TestingSessionLocal), 1)
+
+
+    def test_endpoint(self):
+        app = FastAPI()
+        app.include_router(users.router)
+        def override_get_db():
+            with TestingSessionLocal() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_current_user] = lambda: User(id=2, username="admin", role=Role.admin)
+        client = TestClient(app)
+
+        with patch.object(users, "SessionLocal", TestingSessionLocal):
+            response = client.get("/users/1/export", params={"compress": True})
+            missing = client.get("/users/100/export")
+
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(response.headers["content-type"], "application/gzip")
+        self.assertIn('filename="user-1.ndjson.gz"', response.headers["content-disposition"])
+        self.assertEqual(len(read_lines(gzip.decompress(response.content))), 7)
+        self.assertEqual(missing.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+from fastapi.testclient import TestClient
+
+from main import app
+from src.conf.config import HealthSettings
+from src.services.container import get_services
+from src.services.health import HealthMonitor
+
+
+class TestHealthMonitor(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2, max_overflow=0)
+        self.storage = MagicMock()
+        self.storage.ping = AsyncMock(return_value={"status": "ok"})
+        self.config = HealthSettings(interval=1, timeout=0.5, storage_probe=True)
+        self.monitor = HealthMonitor(self.storage, self.config, self.engine)
+
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+
+
+    async def test_not_ready_before_first_check(self):
+        is_ready, report = self.monitor.readiness()
+
+        self.assertFalse(is_ready)
+        self.assertIn("health checks are stale", report["reasons"])
+
+
+    async def test_ready_after_refresh(self):
+        await self.monitor.refresh()
+
+        is_ready, report = self.monitor.readiness()
+
+        self.assertTrue(is_ready)
+        self.assertEqual(report["status"], "ready")
+        self.assertTrue(report["database"]["ok"])
+        self.assertEqual(report["pool"], {"size": 2, "checked_out": 0, "saturation": 0.0})
+
+
+    async def test_storage_failure(self):
+        self.storage.ping.side_effect = RuntimeError("cloud is down")
+
+        await self.monitor.refresh()
+
+        is_ready, report = self.monitor.readiness()
+        self.assertTrue(is_ready)
+        self.assertEqual(report["storage"]["error"], "cloud is down")
+
+        self.config.storage_required = True
+        is_ready, report = self.monitor.readiness()
+        self.assertFalse(is_ready)
+        self.assertIn("storage unavailable", report["reasons"])
+
+
+    async def test_storage_probe_interval(self):
+        await self.monitor.refresh()
+        await self.monitor.refresh()
+
+        self.storage.ping.assert_awaited_once()
+        self.assertTrue(self.monitor.media.ok)
+
+        self.monitor.last_storage_check -= self.config.storage_interval
+        await self.monitor.refresh()
+        self.assertEqual(self.storage.ping.await_count, 2)
+
+
+    async def test_storage_probe_opt_in(self):
+        self.monitor = HealthMonitor(self.storage, HealthSettings(interval=1, timeout=0.5), self.engine)
+
+        await self.monitor.refresh()
+
+        self.storage.ping.assert_not_awaited()
+        is_ready, report = self.monitor.readiness()
+        self.assertTrue(is_ready)
+        self.assertEqual(report["storage"]["error"], "probe disabled")
+
+
+    async def test_probe_timeout(self):
+        async def slow():
+            await asyncio.sleep(5)
+
+        self.storage.ping = slow
+
+        await self.monitor.refresh()
+
+        self.assertFalse(self.monitor.media.ok)
+        self.assertTrue(self.monitor.db.ok)
+
+
+    async def test_pool_saturated(self):
+        await self.monitor.refresh()
+        connections = [self.engine.connect(), self.engine.connect()]
+        try:
+            is_ready, report = self.monitor.readiness()
+        finally:
+            for conn in connections:
+                conn.close()
+
+        self.assertFalse(is_ready)
+        self.assertEqual(report["pool"]["saturation"], 1.0)
+        self.assertIn("connection pool saturated", report["reasons"])
+
+
+    async def test_database_failure(self):
+        self.monitor = HealthMonitor(self.storage, self.config, create_engine("sqlite:////nonexistent/dir/db.sqlite3"))
+
+        await self.monitor.refresh()
+
+        is_ready, report = self.monitor.readiness()
+        self.assertFalse(is_ready)
+        self.assertIn("database unavailable", report["reasons"])
+        self.assertIsNotNone(report["database"]["error"])
+
+
+class TestHealthRoutes(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.client = TestClient(app)
+        self.monitor = get_services().monitor
+        self.db, self.last_refresh = self.monitor.db, self.monitor.last_refresh
+
+
+    def tearDown(self) -> None:
+        self.monitor.db, self.monitor.last_refresh = self.db, self.last_refresh
+
+
+    def test_live(self):
+        response = self.client.get("/health/live")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "alive"})
+
+
+    def test_ready_from_cache(self):
+        asyncio.run(self.monitor.refresh())
+
+        response = self.client.get("/health/ready")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "ready")
+
+
+    def test_not_ready(self):
+        self.monitor.last_refresh = None
+
+        response = self.client.get("/health/ready")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("health checks are stale", response.json()["reasons"])
+
+
+if __name__ == "__main__":
+    unittest.main()
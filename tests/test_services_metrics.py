@@ -0,0 +1,96 @@
+import unittest
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from src.services.metrics import (Counter, Histogram, MetricsMiddleware, instrument_engine, 
+                                  registry, storage_timer)
+from src.routes.metrics import router as metrics_router
+
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+instrument_engine(engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def get_test_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+app.include_router(metrics_router)
+
+
+@app.get("/items/{item_id}")
+async def read_item(item_id: int, db=Depends(get_test_db)):
+    db.execute(text("SELECT 1"))
+    db.execute(text("SELECT 2"))
+    return {"id": item_id}
+
+
+class TestMetrics(unittest.IsolatedAsyncioTestCase):
+
+    def test_histogram_render(self):
+        histogram = Histogram("test_latency_seconds", "Test latency.", ("route",), buckets=(0.1, 1.0))
+        histogram.observe(0.1, route="/a")
+        histogram.observe(0.5, route="/a")
+        histogram.observe(5, route="/a")
+
+        lines = histogram.render()
+
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="0.1"} 1', lines)
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="1.0"} 2', lines)
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="+Inf"} 3', lines)
+        self.assertIn('test_latency_seconds_count{route="/a"} 3', lines)
+        self.assertIn('test_latency_seconds_sum{route="/a"} 5.6', lines)
+
+
+    def test_counter_label_escaping(self):
+        counter = Counter("test_total", "Test counter.", ("path",))
+        counter.inc(path='say "hi"\n')
+
+        self.assertIn('test_total{path="say \\"hi\\"\\n"} 1', counter.render())
+
+
+    def test_request_metrics(self):
+        client = TestClient(app)
+        client.get("/items/1")
+        client.get("/items/2")
+
+        response = client.get("/metrics")
+        body = response.text
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn('http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2', body)
+        self.assertIn('http_request_db_queries_count{method="GET",route="/items/{item_id}"} 2', body)
+        self.assertIn('http_request_db_queries_sum{method="GET",route="/items/{item_id}"} 4', body)
+        self.assertIn('http_requests_in_flight 1', body)
+
+
+    async def test_storage_timer(self):
+        @storage_timer("test_upload")
+        async def upload():
+            return "url"
+
+        @storage_timer("test_upload")
+        async def broken_upload():
+            raise RuntimeError("down")
+
+        self.assertEqual(await upload(), "url")
+        with self.assertRaises(RuntimeError):
+            await broken_upload()
+
+        body = registry.render()
+        self.assertIn('storage_call_duration_seconds_count{operation="test_upload",outcome="ok"} 1', body)
+        self.assertIn('storage_call_duration_seconds_count{operation="test_upload",outcome="error"} 1', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.dependencies.db import Base
+from src.models.user import User
+from src.models.image import Image, Tag
+from src.services.query_inspector import QueryInspector, capture_queries, statement_shape
+
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class TestQueryInspector(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        Base.metadata.create_all(bind=engine)
+        db = TestingSessionLocal()
+        db.add(User(id=1, username="user", email="user@gmail.com", password="password"))
+        db.add_all([Image(user_id=1, url=f"www.ttt.com/{i}.jpeg", description="desc", identifier=str(i),
+                          tags=[Tag(name=f"tag{i}")])
+                    for i in range(6)])
+        db.commit()
+        db.close()
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=engine)
+
+
+    def setUp(self) -> None:
+        self.db = TestingSessionLocal()
+
+
+    def tearDown(self) -> None:
+        self.db.close()
+
+
+    def install(self, inspector: QueryInspector) -> QueryInspector:
+        # the engine is shared by the tests of the module, the inspector must not outlive the test
+        inspector.install(engine)
+        self.addCleanup(inspector.uninstall, engine)
+        return inspector
+
+
+    def test_statement_shape(self):
+        first = "SELECT * FROM tags WHERE tags.id IN (%(id_1_1)s, %(id_1_2)s)"
+        second = "SELECT  * FROM tags\nWHERE tags.id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s)"
+
+        self.assertEqual(statement_shape(first), statement_shape(second))
+        self.assertEqual(statement_shape("SELECT ? , ?"), "SELECT ?")
+
+
+    def test_detects_lazy_loads(self):
+        inspector = self.install(QueryInspector(slow_ms=10_000, repeat_threshold=5))
+
+        with inspector.track() as log:
+            for image in self.db.query(Image).all():
+                image.tags
+
+        self.assertEqual(len(log), 7)
+        repeated = log.repeated(inspector.repeat_threshold)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][1], 6)
+
+        with self.assertLogs("src.services.query_inspector", level="WARNING") as logs:
+            inspector.report(log, "GET /images/")
+        self.assertIn("Possible N+1 in GET /images/", logs.output[0])
+
+
+    def test_logs_slow_queries(self):
+        self.install(QueryInspector(slow_ms=0))
+
+        with self.assertLogs("src.services.query_inspector", level="WARNING") as logs:
+            self.db.query(User).filter(User.username == "user").first()
+
+        self.assertIn("Slow query", logs.output[0])
+        self.assertIn("'user'", logs.output[0])
+
+
+    def test_capture_queries(self):
+        with capture_queries(engine) as log:
+            self.db.query(User).all()
+            self.db.query(Image).all()
+
+        self.assertEqual(len(log), 2)
+        self.assertIn("2 queries", log.summary())
+
+
+    def test_uninstall(self):
+        inspector = self.install(QueryInspector(slow_ms=0))
+        inspector.uninstall(engine)
+
+        with self.assertNoLogs("src.services.query_inspector", level="WARNING"):
+            self.db.query(User).all()
+
+
+if __name__ == '__main__':
+    unittest.main()
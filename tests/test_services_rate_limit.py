@@ -0,0 +1,166 @@
+import unittest
+from unittest.mock import patch
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from src.conf.config import settings
+from src.dependencies.rate_limit import RateLimit, UserRateLimit
+from src.models.user import User
+from src.services.auth import get_current_user
+from src.services.rate_limit import Bucket, MemoryBuckets, RedisBuckets, TAKE_SCRIPT
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """
+    Local stand-in for redis.asyncio.Redis: runs TAKE_SCRIPT as Python over a dict.
+    """
+
+    def __init__(self, clock: FakeClock) -> None:
+        self.clock = clock
+        self.hashes = {}
+        self.ttl = {}
+        self.down = False
+
+    def register_script(self, script: str):
+        assert script == TAKE_SCRIPT
+
+        async def take(keys, args):
+            if self.down:
+                raise ConnectionError("Connection refused")
+            key, (capacity, rate) = keys[0], args
+            now = self.clock()
+            tokens, updated = self.hashes.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0, now - updated) * rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.hashes[key] = (tokens, now)
+            self.ttl[key] = capacity / rate
+            return str(wait).encode()
+
+        return take
+
+
+class TestBuckets(unittest.IsolatedAsyncioTestCase):
+
+    def test_parse(self):
+        self.assertEqual(Bucket.parse("10/60"), Bucket(10, 10 / 60))
+        for value in ("10", "0/60", "10/0", "ten/60"):
+            with self.assertRaises(ValueError):
+                Bucket.parse(value)
+
+
+    async def assertRefills(self, buckets, clock) -> None:
+        bucket = Bucket(3, 1.0)
+        waits = [await buckets.take("signin:ip:1", bucket) for _ in range(4)]
+        self.assertEqual(waits, [0, 0, 0, 1.0])
+
+        # other clients have their own bucket
+        self.assertEqual(await buckets.take("signin:ip:2", bucket), 0)
+
+        clock.now += 0.5
+        self.assertEqual(await buckets.take("signin:ip:1", bucket), 0.5)
+        clock.now += 0.5
+        self.assertEqual(await buckets.take("signin:ip:1", bucket), 0)
+
+        # never refilled above the capacity
+        clock.now += 100
+        waits = [await buckets.take("signin:ip:1", bucket) for _ in range(4)]
+        self.assertEqual(waits, [0, 0, 0, 1.0])
+
+
+    async def test_memory(self):
+        clock = FakeClock()
+        await self.assertRefills(MemoryBuckets(100, clock=clock), clock)
+
+
+    async def test_memory_drops_least_recently_used(self):
+        buckets = MemoryBuckets(2, clock=FakeClock())
+        bucket = Bucket(1, 0.1)
+        for key in ("a", "b", "a", "c"):
+            await buckets.take(key, bucket)
+
+        self.assertEqual(list(buckets._buckets), ["a", "c"])
+
+
+    async def test_redis(self):
+        clock = FakeClock()
+        redis = FakeRedis(clock)
+        await self.assertRefills(RedisBuckets(redis, "rate_limit"), clock)
+        self.assertEqual(set(redis.hashes), {"rate_limit:signin:ip:1", "rate_limit:signin:ip:2"})
+        self.assertEqual(redis.ttl["rate_limit:signin:ip:1"], 3)
+
+
+    async def test_redis_down_lets_requests_through(self):
+        redis = FakeRedis(FakeClock())
+        redis.down = True
+        buckets = RedisBuckets(redis, "rate_limit")
+
+        self.assertEqual([await buckets.take("signin:ip:1", Bucket(1, 0.1)) for _ in range(3)], [0, 0, 0])
+
+
+class TestRateLimitDependency(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        patcher = patch("src.dependencies.rate_limit.get_buckets", return_value=MemoryBuckets(100, clock=self.clock))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        app = FastAPI()
+        app.get("/shared", dependencies=[Depends(RateLimit("shared"))])(lambda: {})
+        app.post("/upload", dependencies=[Depends(UserRateLimit("upload"))])(lambda: {})
+        self.users = iter([User(id=1), User(id=1), User(id=2)])
+        app.dependency_overrides[get_current_user] = lambda: next(self.users)
+        self.client = TestClient(app)
+
+
+    def test_per_ip(self):
+        with patch.object(settings.rate_limit, "shared", "2/10"):
+            codes = [self.client.get("/shared").status_code for _ in range(3)]
+            self.assertEqual(codes, [200, 200, 429])
+
+            response = self.client.get("/shared")
+            self.assertEqual(response.headers["Retry-After"], "5")
+
+            self.clock.now += 5
+            self.assertEqual(self.client.get("/shared").status_code, 200)
+
+
+    def test_forwarded_address(self):
+        with patch.object(settings.rate_limit, "shared", "1/10"), \
+             patch.object(settings.rate_limit, "trust_forwarded", True):
+            codes = [self.client.get("/shared", headers={"X-Forwarded-For": f"10.0.0.{i}, 10.0.1.1"}).status_code
+                     for i in (1, 2, 1)]
+
+        self.assertEqual(codes, [200, 200, 429])
+
+
+    def test_per_user(self):
+        with patch.object(settings.rate_limit, "upload", "1/60"):
+            codes = [self.client.post("/upload").status_code for _ in range(3)]
+
+        self.assertEqual(codes, [200, 429, 200])
+
+
+    def test_disabled(self):
+        with patch.object(settings.rate_limit, "shared", "1/10"), \
+             patch.object(settings.rate_limit, "enabled", False):
+            codes = [self.client.get("/shared").status_code for _ in range(3)]
+
+        self.assertEqual(codes, [200, 200, 200])
+
+
+if __name__ == '__main__':
+    unittest.main()
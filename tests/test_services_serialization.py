@@ -0,0 +1,58 @@
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from src.models.user import Role
+from src.repository.images import ImageRow
+from src.services import serialization
+from src.services.serialization import dumps, FastJSONResponse
+
+
+payload = [{"id": 1, "role": Role.admin, "created_at": datetime(2024, 1, 2, 3, 4, 5, 600),
+            "tags": [{"name": "sea", "id": 2}], "description": "море"}]
+expected = [{"id": 1, "role": "admin", "created_at": "2024-01-02T03:04:05.000600",
+             "tags": [{"name": "sea", "id": 2}], "description": "море"}]
+
+
+class TestSerialization(unittest.TestCase):
+
+    def test_dumps(self):
+        self.assertEqual(json.loads(dumps(payload)), expected)
+
+
+    def test_dumps_without_orjson(self):
+        with patch.object(serialization, "orjson", None):
+            self.assertEqual(json.loads(dumps(payload)), expected)
+
+
+    def test_dumps_dataclass(self):
+        row = ImageRow(1, "image1", "desc", "url", 640, 480, "jpeg", 1024, "landscape", "#336699",
+                       [{"format": "webp", "width": 160, "url": "url160"}],
+                       None, datetime(2024, 1, 2), datetime(2024, 1, 2), [])
+        expected = {"id": 1, "identifier": "image1", "description": "desc", "url": "url",
+                    "width": 640, "height": 480, "format": "jpeg", "byte_size": 1024,
+                    "orientation": "landscape", "placeholder": "#336699", "srcset": {"webp": "url160 160w"}, "tags": [],
+                    "created_at": "2024-01-02T00:00:00", "updated_at": "2024-01-02T00:00:00", "comments": []}
+
+        self.assertEqual(json.loads(dumps(row)), expected)
+        with patch.object(serialization, "orjson", None):
+            self.assertEqual(json.loads(dumps(row)), expected)
+
+
+    def test_dumps_unsupported(self):
+        with patch.object(serialization, "orjson", None):
+            with self.assertRaises(TypeError):
+                dumps({"value": object()})
+
+
+    def test_response(self):
+        response = FastJSONResponse(payload, headers={"X-Next-Cursor": "abc"})
+
+        self.assertEqual(json.loads(response.body), expected)
+        self.assertEqual(response.media_type, "application/json")
+        self.assertEqual(response.headers["X-Next-Cursor"], "abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
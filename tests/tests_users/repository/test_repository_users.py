@@ -1,4 +1,6 @@
+import asyncio
 import unittest
+from datetime import datetime
 # from aioresponses import aioresponses
 from unittest.mock import MagicMock, patch
 from src.repository.users import UserRepository
@@ -7,9 +9,12 @@ from src.models.image import Image
 from src.schemas.user import UserCreate, UserResponse
 from fastapi import HTTPException, status
 from src.routes.users import delete_user
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 import unittest.mock as mock
 from fastapi.datastructures import UploadFile
+from sqlalchemy import create_engine
+from src.dependencies.db import Base
+from src.services.revocation import MemoryRevocations
 
 
 class TestUserRepository(unittest.IsolatedAsyncioTestCase):
@@ -71,7 +76,7 @@ class TestUserRepository(unittest.IsolatedAsyncioTestCase):
 
         # Mocking the avatar_upload function
         avatar_url = 'https://example.com/avatar.jpg'
-        with patch('src.repository.users.storage.avatar_upload') as avatar_upload_mock:
+        with patch('src.services.media_storage.MediaCloud.avatar_upload') as avatar_upload_mock:
             avatar_upload_mock.return_value.url = avatar_url
 
             # Calling the update function and checking the results
@@ -115,7 +120,7 @@ class TestUserRepository(unittest.IsolatedAsyncioTestCase):
         user = User(id=1, username="testuser", email="test@example.com", password="testpassword", avatar=None)
 
         # Mocking the avatar_upload function to raise an exception
-        with patch('src.repository.users.storage.avatar_upload') as avatar_upload_mock:
+        with patch('src.services.media_storage.MediaCloud.avatar_upload') as avatar_upload_mock:
             avatar_upload_mock.side_effect = Exception("Avatar upload failed")
 
             # Calling the update function and expecting an HTTPException
@@ -200,18 +205,32 @@ class TestUserRepository(unittest.IsolatedAsyncioTestCase):
         user1 = User(id=1, username="user1", email="user1@example.com", password="testpassword1")
         user2 = User(id=2, username="user2", email="user2@example.com", password="testpassword2")
         db_mock_instance = db_mock.return_value
-        db_mock_instance.query.return_value.filter.return_value.all.return_value = [user1, user2]
+        db_mock_instance.query.return_value.filter.return_value.limit.return_value.all.return_value = []
+        db_mock_instance.query.return_value.filter.return_value.order_by.return_value.limit.return_value.all.return_value = [user1, user2]
         user_repo = UserRepository(db_mock_instance)
-        result = await user_repo.get_many("test")
+        result, next_cursor = await user_repo.get_many("test", limit=10)
         self.assertEqual(result, [user1, user2])
+        self.assertIsNone(next_cursor)
 
     async def test_ban_user(self):
         db_mock = MagicMock()
         user = User(id=1, username="testuser", email="test@example.com", password="testpassword", ban=False)
 
+        db_mock.query.return_value.filter.return_value.first.return_value = user
+        revocations = MemoryRevocations(ttl=60)
+
+        db_mock.info = {}
         user_repo = UserRepository(db_mock)
-        result = await user_repo.ban(1)
-        self.assertEqual(result.ban, user.ban)
+        with patch('src.repository.users.get_revocations', return_value=revocations):
+            result = await user_repo.ban(1)
+        # revoked once the request transaction commits
+        self.assertIsNone(await revocations.min_version(1))
+        db_mock.commit.assert_not_called()
+        for callback in db_mock.info["on_commit"]:
+            await asyncio.wrap_future(callback())
+        self.assertTrue(result.ban)
+        self.assertEqual(result.token_version, 1)
+        self.assertEqual(await revocations.min_version(1), 1)
 
     from unittest.mock import MagicMock
 
@@ -219,11 +238,102 @@ class TestUserRepository(unittest.IsolatedAsyncioTestCase):
         db_mock = MagicMock()
         user = User(id=1, username="testuser", email="test@example.com", password="testpassword", role=Role.user)
 
+        db_mock.query.return_value.filter.return_value.first.return_value = user
+        revocations = MemoryRevocations(ttl=60)
+
+        db_mock.info = {}
         user_repo = UserRepository(db_mock)
-        result = await user_repo.change_role(1, Role.moderator)
+        with patch('src.repository.users.get_revocations', return_value=revocations):
+            result = await user_repo.change_role(1, Role.moderator)
+        # revoked once the request transaction commits
+        self.assertIsNone(await revocations.min_version(1))
+        db_mock.commit.assert_not_called()
+        for callback in db_mock.info["on_commit"]:
+            await asyncio.wrap_future(callback())
         self.assertEqual(result.role, Role.moderator.value)
+        self.assertEqual(await revocations.min_version(1), 1)
+
+
+
+class TestUserSearch(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=cls.engine)
+        cls.Session = sessionmaker(autocommit=False, autoflush=False, bind=cls.engine)
+        db = cls.Session()
+        db.add_all([User(username=name, email=f"{name}@example.com", password="password", role=Role.user)
+                    for name in ("Anna", "anne", "joanna", "bob", "ann", "han_na", "hanna")])
+        # marked for the purge, hidden from the search
+        db.add(User(username="gone_anna", email="gone@deleted.org", password="password", role=Role.user,
+                    deleted_at=datetime.utcnow()))
+        db.commit()
+        db.close()
+
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Base.metadata.drop_all(bind=cls.engine)
+
+
+    def setUp(self) -> None:
+        self.db = self.Session()
+        self.repo = UserRepository(self.db)
+
+
+    def tearDown(self) -> None:
+        self.db.close()
+
+
+    async def test_exact_match(self):
+        users, next_cursor = await self.repo.get_many("ANN", limit=10)
+        self.assertEqual([user.username for user in users], ["ann"])
+        self.assertIsNone(next_cursor)
+
+        users, _ = await self.repo.get_many("bob@example.com", limit=10, projection=True)
+        self.assertEqual(users, [{"id": 4, "username": "bob", "email": "bob@example.com", "role": Role.user}])
+
+
+    async def test_prefix_for_short_query(self):
+        users, _ = await self.repo.get_many("an", limit=10)
+        self.assertEqual([user.username for user in users], ["Anna", "anne", "ann"])
+
+
+    async def test_substring(self):
+        users, _ = await self.repo.get_many("nna", limit=10)
+        self.assertEqual([user.username for user in users], ["Anna", "joanna", "hanna"])
+
+
+    async def test_wildcards_are_literal(self):
+        users, _ = await self.repo.get_many("n_n", limit=10)
+        self.assertEqual([user.username for user in users], ["han_na"])
+
+
+    async def test_pages(self):
+        names, cursor = [], None
+        while True:
+            users, cursor = await self.repo.get_many("example", limit=3, cursor=cursor, projection=True)
+            names.extend(user["username"] for user in users)
+            if cursor is None:
+                break
+
+        self.assertEqual(names, ["Anna", "anne", "joanna", "bob", "ann", "han_na", "hanna"])
+
+
+    async def test_deleted_hidden(self):
+        users, _ = await self.repo.get_many("gone_anna", limit=10)
+        self.assertEqual(users, [])
+
+        users, _ = await self.repo.get_many("gone@deleted.org", limit=10)
+        self.assertEqual(users, [])
+
+
+    async def test_invalid_cursor(self):
+        with self.assertRaises(HTTPException) as err:
+            await self.repo.get_many("example", limit=3, cursor="not a cursor")
+        self.assertEqual(err.exception.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
 
 
 if __name__ == '__main__':
     unittest.main()
-
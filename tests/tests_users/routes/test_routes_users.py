@@ -1,3 +1,4 @@
+import json
 import tracemalloc
 import unittest
 from unittest.mock import MagicMock, AsyncMock, patch
@@ -16,20 +17,22 @@ class TestRoutes(unittest.IsolatedAsyncioTestCase):
     async def test_get_users(self):
         tracemalloc.start()
         db_mock = MagicMock()
-        user_repo_mock = UserRepository(db_mock)
         users_data = [
-            {"id": 1, "username": "user1", "email": "user1@example.com", "role": "user"},
-            {"id": 2, "username": "user2", "email": "user2@example.com", "role": "admin"}
+            {"id": 1, "username": "user1", "email": "user1@example.com", "role": Role.user},
+            {"id": 2, "username": "user2", "email": "user2@example.com", "role": Role.admin}
         ]
-        user_repo_mock.get_many = MagicMock(return_value=[
-            UserResponse(**user_data) for user_data in users_data
-        ])
-        db_mock.query.return_value.filter.return_value.all.return_value = user_repo_mock.get_many()
+        get_many = AsyncMock(return_value=(users_data, "next"))
 
-        users = await get_users(query="test", db=db_mock)
+        with patch.object(UserRepository, "get_many", get_many):
+            response = await get_users(query="test", limit=500, cursor=None, db=db_mock)
+
+        get_many.assert_awaited_once_with("test", limit=100, cursor=None, projection=True)
+        self.assertEqual(response.headers["X-Next-Cursor"], "next")
+        users = json.loads(response.body)
         self.assertEqual(len(users), 2)
-        self.assertEqual(users[0].username, "user1")
-        self.assertEqual(users[1].username, "user2")
+        self.assertEqual(users[0]["username"], "user1")
+        self.assertEqual(users[1]["username"], "user2")
+        self.assertEqual(users[1]["role"], "admin")
         tracemalloc.stop()
 
     async def test_update_user_avatar(self):
@@ -43,7 +46,7 @@ class TestRoutes(unittest.IsolatedAsyncioTestCase):
         # Mocking the avatar_upload function
         avatar_url = 'https://example.com/avatar.jpg'
         avatar_data = MagicMock(file=b"123")
-        with patch('src.repository.users.storage.avatar_upload') as avatar_upload_mock:
+        with patch('src.services.media_storage.MediaCloud.avatar_upload') as avatar_upload_mock:
             # Mocking the return value of the avatar_upload function
             avatar_upload_mock.return_value.url = avatar_url
 
@@ -0,0 +1,143 @@
+import asyncio
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.conf.config import DuplicatesSettings, PurgeSettings
+from src.dependencies.db import Base
+from src.models.comment import Comment
+from src.models.image import Image, ImageDerivative, Tag
+from src.models.outbox import StorageTask, StorageAction
+from src.models.user import User
+from src.repository.users import UserRepository
+from src.services.duplicate_index import DuplicateIndex
+from src.services.media_storage import MediaCloud
+from src.services.purge import AccountPurger
+from src.services.revocation import MemoryRevocations
+
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class TestAccountPurge(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        Base.metadata.create_all(bind=engine)
+        self.db = TestingSessionLocal()
+        self.owner = User(username="owner", email="owner@example.com", password="password", avatar="url")
+        self.other = User(username="other", email="other@example.com", password="password")
+        shared, own = Tag(name="shared"), Tag(name="own")
+        images = [Image(user=self.owner, url=f"url{i}", identifier=f"image{i}", description="d",
+                        tags=[shared, own] if i == 0 else [],
+                        derivatives=[ImageDerivative(format="webp", width=160, url=f"url{i}.webp")])
+                  for i in range(5)]
+        others = Image(user=self.other, url="url", identifier="others", description="d", tags=[shared])
+        self.db.add_all([*images, others,
+                         Comment(body="on others", image=others, user=self.owner),
+                         Comment(body="on owners", image=images[0], user=self.other)])
+        self.db.commit()
+        self.storage = MediaCloud()
+        self.storage.remove_media_by_prefix = AsyncMock(return_value={})
+        self.storage.remove_media_many = AsyncMock(return_value=[])
+        self.purger = AccountPurger(TestingSessionLocal, self.storage, DuplicateIndex(TestingSessionLocal, DuplicatesSettings()),
+                                    PurgeSettings(batch_size=2))
+
+
+    def tearDown(self) -> None:
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+    async def mark(self, user: User) -> None:
+        revocations = MemoryRevocations(60)
+        with patch("src.repository.users.get_revocations", return_value=revocations):
+            repo = UserRepository(self.db)
+            await repo.delete(user)
+            revoke, = self.db.info.pop("on_commit")
+            self.db.commit()
+            # what the commit would have scheduled on the loop
+            await asyncio.wrap_future(revoke())
+
+        self.assertEqual(await revocations.min_version(user.id), user.token_version)
+
+
+    async def test_delete_hides_account(self):
+        await self.mark(self.owner)
+        repo = UserRepository(self.db)
+
+        self.assertIsNotNone(self.owner.deleted_at)
+        self.assertIsNone(await repo.get_single(self.owner.id))
+        self.assertIsNone(await repo.get_username("owner"))
+        self.assertIsNone(await repo.get_email("owner@example.com"))
+        # still taken for sign up until the purge
+        self.assertEqual(await repo.get_username("owner", include_deleted=True), self.owner)
+        self.assertEqual(await repo.get_email("owner@example.com", include_deleted=True), self.owner)
+        # nothing is removed within the request
+        self.assertEqual(self.db.query(Image).filter(Image.user_id == self.owner.id).count(), 5)
+
+
+    async def test_purge(self):
+        await self.mark(self.owner)
+        owner_id = self.owner.id
+
+        self.assertEqual(await self.purger.purge_once(), 1)
+
+        self.db.expire_all()
+        self.assertIsNone(self.db.get(User, owner_id))
+        self.assertEqual(self.db.query(Image).count(), 1)
+        self.assertEqual(self.db.query(ImageDerivative).count(), 0)
+        self.assertEqual([comment.body for comment in self.db.query(Comment)], ["on owners"])
+        self.assertIsNone(self.db.query(Comment).one().image_id)
+        self.assertEqual([tag.name for tag in self.db.query(Tag)], ["shared"])
+        self.assertEqual(self.db.query(StorageTask).count(), 0)
+        self.storage.remove_media_by_prefix.assert_awaited_once_with(f"{self.storage.folder}/owner/")
+        self.storage.remove_media_many.assert_awaited_once_with([f"{self.storage.folder}/avatar/owner"])
+        self.assertEqual(await self.purger.purge_once(), 0)
+
+
+    async def test_storage_failure_keeps_the_account(self):
+        await self.mark(self.owner)
+        self.storage.remove_media_by_prefix.side_effect = ConnectionError("storage down")
+
+        with self.assertRaises(ConnectionError):
+            await self.purger.purge_once()
+
+        self.db.expire_all()
+        # the username stays taken until the folder is removed by the next poll
+        self.assertIsNotNone(await UserRepository(self.db).get_username("owner", include_deleted=True))
+        self.assertEqual(self.db.query(Image).filter(Image.user_id == self.owner.id).count(), 0)
+        # the tags of the deleted images are not left behind for the retry
+        self.assertEqual([tag.name for tag in self.db.query(Tag)], ["shared"])
+        self.storage.remove_media_by_prefix.side_effect = None
+        self.assertEqual(await self.purger.purge_once(), 1)
+        self.assertIsNone(await UserRepository(self.db).get_username("owner", include_deleted=True))
+
+
+    async def test_unmarked_accounts_are_kept(self):
+        await self.purger.purge(self.owner.id)
+
+        self.db.expire_all()
+        self.assertIsNotNone(self.db.get(User, self.owner.id))
+        self.assertEqual(self.db.query(Image).count(), 6)
+
+
+    async def test_avatar_folder_is_never_removed_by_prefix(self):
+        self.owner.username = "avatar"
+        self.db.commit()
+        await self.mark(self.owner)
+
+        await self.purger.purge_once()
+
+        tasks = {(task.action, task.target) for task in self.db.query(StorageTask)}
+        self.assertNotIn(StorageAction.remove_prefix, {action for action, _ in tasks})
+        self.assertIn((StorageAction.remove, f"{self.storage.folder}/avatar/image4"), tasks)
+        self.assertEqual(len(tasks), 5)
+        self.storage.remove_media_by_prefix.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()